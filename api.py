@@ -1,11 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, send_from_directory
+from werkzeug.security import safe_join
+from werkzeug.exceptions import HTTPException
 import os
 import uuid
+import hashlib
 import threading
 import time
 import sys
 import subprocess
 import json
+import multiprocessing
+import mimetypes
+import queue
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+from scheduler import JobScheduler, QueueFullError
+from job_store import create_job_store, current_owner, ACTIVE_STATUSES
+from download_cache import DownloadCache, normalize_url, link_or_copy
+from archive_stream import ARCHIVE_FORMATS, iter_archive
+from zygote import Zygote, ZygoteError
+from janitor import Janitor
+from dedup_index import DedupIndex
+from metrics import Registry
+from media_probe import probe_file
 
 app = Flask(__name__)
 
@@ -18,15 +36,424 @@ def after_request(response):
     return response
 
 # Diretórios
-BASE_DIR = '/home/contavideostt700/video_downloader'
+BASE_DIR = os.environ.get('VIDEOBOX_BASE_DIR', '/home/contavideostt700/video_downloader')
 DOWNLOADS_DIR = os.path.join(BASE_DIR, 'downloads')
 SCRIPT_PATH = os.path.join(BASE_DIR, 'universal_downloader_aac.py')
 
 # Garantir que pasta downloads existe
 os.makedirs(DOWNLOADS_DIR, exist_ok=True)
 
-# Jobs em andamento
-active_jobs = {}
+# Jobs: SQLite (WAL), que sobrevive a restart do worker, ou 'memory'
+JOB_STORE_BACKEND = os.environ.get('VIDEOBOX_JOB_STORE', 'sqlite')
+JOB_STORE_PATH = os.environ.get('VIDEOBOX_JOB_DB', os.path.join(BASE_DIR, 'jobs.db'))
+
+job_store = create_job_store(JOB_STORE_BACKEND, JOB_STORE_PATH)
+
+# Cache de downloads por extrator + id do vídeo (0 bytes desativa)
+CACHE_DIR = os.environ.get('VIDEOBOX_CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+CACHE_MAX_BYTES = int(os.environ.get('VIDEOBOX_CACHE_BYTES', str(10 * 1024 ** 3)))
+CACHE_CONFIG = (CACHE_DIR, CACHE_MAX_BYTES)
+
+download_cache = DownloadCache(CACHE_DIR, CACHE_MAX_BYTES) if CACHE_MAX_BYTES > 0 else None
+
+# Índice de conteúdo (tamanho -> hash parcial -> BLAKE2) para deduplicar entre jobs
+DEDUP_DB = os.environ.get('VIDEOBOX_DEDUP_DB', os.path.join(BASE_DIR, 'dedup.db'))
+
+# Limpeza em segundo plano: expiração por TTL e evicção LRU (por último
+# download) quando o disco passa do high-water mark (% usado)
+JOB_TTL = int(os.environ.get('VIDEOBOX_JOB_TTL', '3600'))
+DISK_HIGH_WATER = float(os.environ.get('VIDEOBOX_DISK_HIGH_WATER', '90'))
+DISK_LOW_WATER = float(os.environ.get('VIDEOBOX_DISK_LOW_WATER', '80'))
+JANITOR_INTERVAL = float(os.environ.get('VIDEOBOX_JANITOR_INTERVAL', '60'))
+
+janitor = Janitor(job_store, DOWNLOADS_DIR, ttl=JOB_TTL, high_water=DISK_HIGH_WATER,
+                  low_water=DISK_LOW_WATER, interval=JANITOR_INTERVAL, dedup=DedupIndex(DEDUP_DB))
+
+# Executor dos jobs: 'pool' (processos aquecidos, yt-dlp já importado),
+# 'zygote' (um fork por job de um processo pré-aquecido: isolamento de
+# subprocesso sem o custo do import) ou 'subprocess' (um interpretador novo
+# por job, comportamento antigo)
+EXECUTOR_MODE = os.environ.get('VIDEOBOX_EXECUTOR', 'pool')
+EXECUTOR_WORKERS = int(os.environ.get('VIDEOBOX_EXECUTOR_WORKERS', '2'))
+EXECUTOR_MODES = ('pool', 'zygote', 'subprocess')
+
+_executor = None
+_executor_lock = threading.Lock()
+_progress_queue = None
+# Pools aposentados por um job travado: pool -> fila de progresso e futures
+# que passaram do timeout (o pool morre quando só sobrarem eles)
+_retired_executors = {}
+_zygote = None
+# Espera máxima por um evento de progresso antes de olhar a fila de novo
+PROGRESS_WAIT = 1.0
+
+# Orçamento global de conexões de download, compartilhado pelos processos do pool
+# (no modo zygote cada job tem o seu, limitado por VIDEOBOX_SEGMENTOS_POR_HOST)
+MAX_CONNECTIONS = int(os.environ.get('VIDEOBOX_MAX_CONEXOES', '16'))
+MAX_CONNECTIONS_PER_JOB = 16
+# Conversões AAC (ffmpeg) simultâneas, somando todos os processos do pool
+MAX_TRANSCODES = int(os.environ.get('VIDEOBOX_MAX_TRANSCODIFICACOES', str(max(1, (os.cpu_count() or 2) // 2))))
+
+# Latências de inicialização observadas por modo (para /api/health)
+startup_stats = {mode: {"jobs": 0, "total_ms": 0.0} for mode in EXECUTOR_MODES}
+
+# Entrega de arquivos: 'direct' (sendfile do gunicorn), 'x-sendfile' (Apache/
+# lighttpd) ou 'x-accel' (nginx, com location interna apontando para DOWNLOADS_DIR)
+SENDFILE_MODE = os.environ.get('VIDEOBOX_SENDFILE', 'direct')
+ACCEL_REDIRECT_PREFIX = os.environ.get('VIDEOBOX_ACCEL_PREFIX', '/protected-downloads/')
+app.config['USE_X_SENDFILE'] = SENDFILE_MODE == 'x-sendfile'
+
+# Streaming durante o download: bytes mínimos antes de começar a responder
+STREAM_MIN_BYTES = int(os.environ.get('VIDEOBOX_STREAM_MIN_BYTES', str(1024 * 1024)))
+STREAM_POLL_INTERVAL = 0.25
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# Server-Sent Events: intervalo de leitura do job e de keep-alive
+SSE_POLL_INTERVAL = float(os.environ.get('VIDEOBOX_SSE_INTERVAL', '0.5'))
+SSE_HEARTBEAT = 15
+
+# Fila de jobs: limite de downloads simultâneos e de jobs aguardando. A fila,
+# o pool, os semáforos de conexões/conversões e a divisão por cliente são do
+# processo: a API roda com um único worker do gunicorn (Procfile). Com mais,
+# os limites se multiplicam e o /api/status de um job da fila de outro worker
+# fica sem posição; o worker gevent atende as conexões sem precisar de mais.
+MAX_CONCURRENT_JOBS = int(os.environ.get('VIDEOBOX_MAX_CONCURRENT', str(EXECUTOR_WORKERS)))
+MAX_PENDING_JOBS = int(os.environ.get('VIDEOBOX_MAX_PENDING', '20'))
+
+# Ordem da fila: custo estimado (segundos) com divisão justa por cliente (API
+# key ou IP) e aging: cada segundo de espera vale QUEUE_AGING segundos de custo
+QUEUE_AGING = float(os.environ.get('VIDEOBOX_QUEUE_AGING', '1.0'))
+
+scheduler = JobScheduler(max_concurrent=MAX_CONCURRENT_JOBS, max_pending=MAX_PENDING_JOBS,
+                         aging=QUEUE_AGING)
+
+# Estimativa de custo em segundo plano, só para jobs que ficaram esperando:
+# extração do yt-dlp (reaproveitada pelo job) ou contagem de imagens da
+# galeria, num fork do zygote (fora do processo da API: o parse de páginas e
+# JSON não trava as conexões do worker gevent). Com as extrações ocupadas,
+# vale o que a própria URL diz
+ESTIMATE_COSTS = os.environ.get('VIDEOBOX_ESTIMATE_COST', '1') == '1'
+ESTIMATE_WORKERS = int(os.environ.get('VIDEOBOX_ESTIMATE_WORKERS', '2'))
+ESTIMATE_TIMEOUT = 30
+# A estimativa custa uma extração: só vale para jobs com espera prevista maior
+ESTIMATE_MIN_WAIT = float(os.environ.get('VIDEOBOX_ESTIMATE_MIN_WAIT', '10'))
+JOB_OVERHEAD_SECONDS = 2.0
+BYTES_PER_VIDEO_SECOND = 625_000  # ~5 Mbit/s quando só a duração é conhecida
+BYTES_PER_IMAGE = 400 * 1024
+# Estimativa só pela URL: trecho do caminho -> tamanho típico
+URL_ESTIMATES = (
+    ('/shorts/', {"duration": 60}),
+    ('erome.com/a/', {"images": 20}),
+)
+
+estimator = ThreadPoolExecutor(max_workers=ESTIMATE_WORKERS)
+estimate_slots = threading.BoundedSemaphore(ESTIMATE_WORKERS)
+# Vazão de download observada (média móvel), para converter bytes em segundos
+download_throughput = {"bytes_per_second": 8 * 1024 * 1024}
+
+# Lotes (/api/batch): tamanho máximo e quantos filhos de um lote rodam juntos
+BATCH_MAX_URLS = int(os.environ.get('VIDEOBOX_BATCH_MAX_URLS', '500'))
+BATCH_CONCURRENCY = int(os.environ.get('VIDEOBOX_BATCH_CONCURRENCY', str(MAX_CONCURRENT_JOBS)))
+BATCH_POLL_INTERVAL = 1.0
+
+# Métricas no formato texto do Prometheus (/api/metrics). No caminho quente
+# só há observações por fase/job; filas, workers e limpeza são lidos no scrape.
+# Pool e zygote devolvem os números no resultado do job: o único worker da
+# API é o único exportador
+metrics = Registry()
+
+# Label host: só os sites da lista (por sufixo, os subdomínios de CDN somam no
+# site); o resto vira "other", para as séries não crescerem com as URLs enviadas
+METRICS_HOSTS = tuple(host.strip().lower() for host in os.environ.get(
+    'VIDEOBOX_METRICS_HOSTS',
+    'googlevideo.com,youtube.com,erome.com,tiktok.com,instagram.com,twitter.com,x.com,vimeo.com'
+).split(',') if host.strip())
+PHASE_SECONDS = metrics.histogram(
+    'videobox_phase_seconds', 'Tempo gasto em cada fase dos jobs', ('phase',))
+JOB_SECONDS = metrics.histogram(
+    'videobox_job_seconds', 'Duração dos jobs, da saída da fila ao fim', ('executor', 'outcome'))
+JOBS_TOTAL = metrics.counter(
+    'videobox_jobs_total', 'Jobs finalizados por caminho (universal ou fallback ytdlp)', ('path', 'outcome'))
+HOST_BYTES = metrics.counter(
+    'videobox_downloaded_bytes_total', 'Bytes baixados por host', ('host',))
+HOST_SECONDS = metrics.counter(
+    'videobox_download_seconds_total', 'Tempo de transferência por host', ('host',))
+CACHE_REQUESTS = metrics.counter(
+    'videobox_cache_requests_total', 'Jobs servidos pelo cache, acompanhando outro job ou baixados', ('result',))
+metrics.gauge('videobox_queue_depth', 'Jobs aguardando na fila',
+              collect=lambda: scheduler.stats()["pending"])
+metrics.gauge('videobox_jobs_running', 'Jobs em execução',
+              collect=lambda: scheduler.stats()["running"])
+metrics.gauge('videobox_workers', 'Máximo de jobs simultâneos',
+              collect=lambda: scheduler.max_concurrent)
+metrics.counter('videobox_worker_busy_seconds_total', 'Tempo somado com jobs rodando (utilização)',
+                collect=lambda: scheduler.busy_seconds)
+metrics.counter('videobox_queue_rejected_total', 'Jobs recusados com a fila cheia (429)',
+                collect=lambda: scheduler.rejected)
+metrics.counter('videobox_janitor_evictions_total', 'Jobs apagados pela limpeza', ('reason',),
+                collect=lambda: {(reason,): count for reason, count in janitor.evictions.items()})
+metrics.counter('videobox_janitor_reclaimed_bytes_total', 'Bytes liberados pela limpeza',
+                collect=lambda: janitor.bytes_reclaimed)
+metrics.gauge('videobox_disk_usage_percent', 'Uso do disco da pasta de downloads',
+              collect=lambda: janitor.stats()["disk_usage_percent"])
+
+def _init_executor_worker(script_path, progress_queue=None, connection_slots=None, transcode_slots=None):
+    """Inicializa um processo do pool: importa o downloader e o yt-dlp uma vez"""
+    global _progress_queue
+    _progress_queue = progress_queue
+    script_dir = os.path.dirname(script_path)
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+    import universal_downloader_aac  # (yt_dlp, requests)
+    if connection_slots is not None:
+        universal_downloader_aac.conexoes_globais = connection_slots
+    if transcode_slots is not None:
+        universal_downloader_aac.transcodificacoes_globais = transcode_slots
+    from yt_dlp.extractor import gen_extractor_classes
+    gen_extractor_classes()
+
+def _warmup_executor_worker():
+    """Tarefa vazia usada só para subir os processos do pool"""
+    return os.getpid()
+
+def _progress_reporter(job_id):
+    """Callback de progresso dentro do pool: envia (job_id, campos) ao processo da API"""
+    if _progress_queue is None or job_id is None:
+        return None
+    return lambda fields: _progress_queue.put((job_id, fields))
+
+def _run_job_in_executor(url, job_dir, dispatch_ts, cache_config=None, info_file=None, job_id=None,
+                         connections=None, dedup_db=None):
+    """Executado dentro do pool: script universal in-process"""
+    import universal_downloader_aac
+    return universal_downloader_aac.executar_job(url, job_dir, dispatch_ts, cache_config, info_file,
+                                                 _progress_reporter(job_id), connections, dedup_db)
+
+def _expand_in_executor(url):
+    """Executado dentro do pool: URLs dos itens de uma playlist"""
+    import universal_downloader_aac
+    return universal_downloader_aac.expandir_playlist(url)
+
+def _run_ytdlp_in_executor(url, job_dir, dispatch_ts, info_file=None, job_id=None):
+    """Executado dentro do pool: fallback yt-dlp in-process"""
+    import universal_downloader_aac
+    return universal_downloader_aac.executar_ytdlp(url, job_dir, dispatch_ts, info_file,
+                                                   _progress_reporter(job_id))
+
+def get_executor():
+    """Pool de processos aquecidos (criado e pré-aquecido na primeira chamada)"""
+    global _executor, _progress_queue
+    with _executor_lock:
+        if _executor is None:
+            _progress_queue = multiprocessing.Queue()
+            _executor = ProcessPoolExecutor(
+                max_workers=EXECUTOR_WORKERS,
+                initializer=_init_executor_worker,
+                initargs=(SCRIPT_PATH, _progress_queue, multiprocessing.BoundedSemaphore(MAX_CONNECTIONS),
+                          multiprocessing.BoundedSemaphore(MAX_TRANSCODES))
+            )
+            for _ in range(EXECUTOR_WORKERS):
+                _executor.submit(_warmup_executor_worker)
+            # Thread que aplica no job store o progresso vindo do pool
+            threading.Thread(target=drain_progress, args=(_progress_queue,), daemon=True).start()
+        return _executor
+
+def reset_executor(broken=None):
+    """Descarta um pool quebrado (ex.: processo morto pelo OOM killer)
+
+    Com `broken`, só descarta se ele ainda for o pool atual (outro job pode
+    já ter trocado o pool).
+    """
+    global _executor, _progress_queue
+    with _executor_lock:
+        if _executor is not None and broken in (None, _executor):
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+            _progress_queue.put(None)
+            _progress_queue = None
+
+def retire_executor(executor, stuck):
+    """Tira o pool de circulação (os jobs novos vão para um pool novo) e
+    marca o future que passou do timeout; devolve o registro do pool
+    aposentado, ou None se ele já foi descartado como quebrado"""
+    global _executor, _progress_queue
+    with _executor_lock:
+        if _executor is executor:
+            # O shutdown esquece os processos: a referência fica para matá-los.
+            # Sem cancel_futures: os jobs já enviados a ele terminam nele
+            _retired_executors[executor] = {"progress_queue": _progress_queue, "stuck": set(),
+                                            "processes": executor._processes}
+            executor.shutdown(wait=False)
+            _executor = None
+            _progress_queue = None
+        retired = _retired_executors.get(executor)
+        if retired is not None:
+            retired["stuck"].add(stuck)
+        return retired
+
+def kill_executor(executor, stuck):
+    """Mata o pool de um job que passou do timeout, sem derrubar os outros
+
+    O ProcessPoolExecutor não interrompe uma tarefa em andamento; sem matar o
+    processo, o job travado seguiria ocupando a vaga e escrevendo na pasta do
+    job enquanto o fallback roda. Matar um processo quebra o pool inteiro
+    (BrokenProcessPool em todos os jobs dele), então o pool é aposentado e
+    só morre quando os outros jobs dele terminam; até lá, os jobs novos vão
+    para um pool novo.
+    """
+    retired = retire_executor(executor, stuck)
+    processes = retired["processes"] if retired is not None else executor._processes
+    while retired is not None:
+        with _executor_lock:
+            others = [item.future for item in list(executor._pending_work_items.values())
+                      if item.future not in retired["stuck"] and not item.future.done()]
+        if not others:
+            break
+        # Em rodadas: outro job do pool pode passar do timeout enquanto
+        # isso, e esse também não é esperado
+        wait(others, timeout=PROGRESS_WAIT)
+    
+    processes = list((processes or {}).values())
+    for process in processes:
+        process.kill()
+    for process in processes:
+        process.join()
+    with _executor_lock:
+        retired = _retired_executors.pop(executor, None)
+    if retired is not None:
+        retired["progress_queue"].put(None)
+    reset_executor(executor)
+
+def get_zygote():
+    """Zygote pré-aquecido (sobe na primeira chamada e de novo se cair)"""
+    global _zygote
+    with _executor_lock:
+        if _zygote is None:
+            _zygote = Zygote(SCRIPT_PATH, on_progress=apply_progress)
+        return _zygote.start()
+
+def drain_progress(progress_queue):
+    """Consome as atualizações de progresso dos processos do pool
+
+    O get() sem timeout fica parado num read() do pipe; no worker gevent isso
+    trava o processo inteiro. Com timeout, a espera passa por um select, que
+    o gevent troca por uma versão cooperativa.
+    """
+    while True:
+        try:
+            item = progress_queue.get(timeout=PROGRESS_WAIT)
+        except queue.Empty:
+            continue
+        if item is None:
+            return
+        try:
+            apply_progress(*item)
+        except Exception as e:
+            print(f"Erro ao aplicar progresso: {e}")
+
+def apply_progress(job_id, fields):
+    """Atualiza o job com um evento dos hooks do yt-dlp"""
+    job = job_store.get(job_id)
+    if job is None or job["status"] not in ACTIVE_STATUSES:
+        return
+    
+    phase = fields.pop("phase", None)
+    if phase == "stream":
+        # Arquivo progressivo único: /api/download já pode servi-lo
+        job_store.update(job_id, stream=dict(
+            fields, download_url=f"/api/download/{job_id}/{fields['filename']}"))
+        return
+    
+    update = {"phase": phase}
+    
+    if phase in ("downloading", "downloaded"):
+        update["download"] = fields
+        downloaded, total = fields.get("downloaded_bytes"), fields.get("total_bytes")
+        if downloaded and total:
+            percent = min(downloaded / total, 1.0)
+            # O download ocupa a faixa 30-95% do progresso do job
+            update["progress"] = max(job["progress"], min(95, 30 + int(percent * 65)))
+            update["message"] = f"Baixando... {percent * 100:.0f}%"
+    elif phase == "merging":
+        update["message"] = "Juntando áudio e vídeo..."
+    elif phase == "postprocessing":
+        update["message"] = "Pós-processando..."
+    elif phase == "images":
+        update["images"] = {"done": fields.get("images_done"), "total": fields.get("images_total")}
+        update["message"] = f"Baixando imagens ({fields.get('images_done')}/{fields.get('images_total')})..."
+    elif phase == "extracting":
+        update["message"] = "Obtendo informações do vídeo..."
+    
+    job_store.update(job_id, **update)
+
+def record_startup(job_id, mode, startup_ms):
+    """Registra a latência de inicialização do job"""
+    job_store.update(job_id, executor=mode, startup_ms=startup_ms)
+    if startup_ms is not None:
+        startup_stats[mode]["jobs"] += 1
+        startup_stats[mode]["total_ms"] += startup_ms
+
+def observe_job_result(result):
+    """Métricas de um resultado do downloader: fases, bytes por host"""
+    if not result:
+        return
+    if result.get("startup_ms") is not None:
+        PHASE_SECONDS.observe(result["startup_ms"] / 1000, phase="startup")
+    for phase, seconds in (result.get("timings") or {}).items():
+        PHASE_SECONDS.observe(seconds, phase=phase)
+    for host, (size, seconds) in (result.get("bytes_per_host") or {}).items():
+        HOST_BYTES.inc(size, host=host_label(host))
+        HOST_SECONDS.inc(seconds, host=host_label(host))
+    
+    transfers = (result.get("bytes_per_host") or {}).values()
+    size, seconds = sum(t[0] for t in transfers), sum(t[1] for t in transfers)
+    if seconds >= 0.5:
+        download_throughput["bytes_per_second"] = (0.8 * download_throughput["bytes_per_second"]
+                                                   + 0.2 * size / seconds)
+
+def host_label(host):
+    """Host de um download como label das métricas (sufixo da lista ou "other")"""
+    host = (host or '').lower()
+    for suffix in METRICS_HOSTS:
+        if host == suffix or host.endswith('.' + suffix):
+            return suffix
+    return 'other'
+
+def run_in_executor(job_id, func, url, job_dir, *extra, timeout=300):
+    """Executa um job no pool aquecido e devolve o resultado (ou None)
+
+    Só volta depois que a tentativa terminou de fato: no timeout, o processo
+    do job é morto antes de retornar (como o subprocess.run(timeout=...)).
+    """
+    executor = get_executor()
+    try:
+        future = executor.submit(func, url, job_dir, time.time(), *extra)
+        result = future.result(timeout=timeout)
+    except BrokenProcessPool as e:
+        print(f"Pool de execução quebrado: {e}")
+        reset_executor(executor)
+        return None
+    except FutureTimeoutError:
+        print(f"Job {job_id} excedeu {timeout}s no pool; trocando o pool quando os outros jobs dele terminarem")
+        kill_executor(executor, future)
+        return None
+    
+    record_startup(job_id, 'pool', result.get("startup_ms"))
+    observe_job_result(result)
+    return result
+
+def run_in_zygote(job_id, func_name, url, job_dir, *extra, timeout=300, **kwargs):
+    """Executa universal_downloader_aac.<func_name> num fork do zygote (ou None)"""
+    try:
+        result = get_zygote().run(job_id, func_name, (url, job_dir, time.time(), *extra),
+                                  kwargs, timeout=timeout)
+    except ZygoteError as e:
+        print(f"Job {job_id} falhou no zygote: {e}")
+        return None
+    
+    record_startup(job_id, 'zygote', result.get("startup_ms"))
+    observe_job_result(result)
+    return result
 
 @app.route('/api/health')
 def health_check():
@@ -39,10 +466,25 @@ def health_check():
         "python_version": sys.version.split()[0],
         "script_found": script_exists,
         "script_path": SCRIPT_PATH if script_exists else "Not found",
-        "active_jobs": len(active_jobs),
+        "active_jobs": job_store.count(),
+        "job_store": JOB_STORE_BACKEND,
+        "executor": EXECUTOR_MODE,
+        "queue": scheduler.stats(),
+        "cache": download_cache.stats() if download_cache else None,
+        "zygote": _zygote.stats() if _zygote else None,
+        "janitor": janitor.stats(),
+        "startup_latency_ms": {
+            mode: round(stats["total_ms"] / stats["jobs"], 1) if stats["jobs"] else None
+            for mode, stats in startup_stats.items()
+        },
         "features": ["yt-dlp", "real_downloads", "universal_script"] if script_exists else ["yt-dlp", "real_downloads"]
     })
 
+@app.route('/api/metrics')
+def metrics_endpoint():
+    """Métricas no formato texto do Prometheus"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/process', methods=['POST'])
 def process_video():
     """Processar URL de vídeo"""
@@ -55,73 +497,393 @@ def process_video():
         if not url:
             return jsonify({"error": "URL vazia"}), 400
         
+        try:
+            executor, connections = read_job_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         # Gerar ID único para o job
         job_id = str(uuid.uuid4())[:8]
         
-        # Registrar job
-        active_jobs[job_id] = {
-            "status": "processing",
-            "url": url,
-            "progress": 0,
-            "created_at": time.time(),
-            "files": []
-        }
+        # Registrar job; se a mesma URL já está em andamento, o job apenas
+        # acompanha aquele download (single-flight) com id e expiração próprios
+        client = client_id()
+        leader_id = create_job(job_id, url, executor, connections, client=client)
+        
+        if leader_id:
+            return jsonify({
+                "success": True,
+                "job_id": job_id,
+                "message": "Mesma URL já em processamento, acompanhando o download existente",
+                "executor": executor,
+                "coalesced": True,
+                "status_url": f"/api/status/{job_id}"
+            })
         
-        # Iniciar processamento em thread separada
-        thread = threading.Thread(target=process_video_worker, args=(job_id, url))
-        thread.daemon = True
-        thread.start()
+        # Enfileirar (o scheduler limita quantos rodam ao mesmo tempo)
+        try:
+            position = enqueue_job(job_id, url, executor, client)
+        except QueueFullError as e:
+            job_store.update(job_id, status="error", message="Fila de processamento cheia")
+            settle_followers(job_id)
+            job_store.delete(job_id)
+            response = jsonify({
+                "error": "Fila de processamento cheia, tente novamente mais tarde",
+                "retry_after": e.retry_after
+            })
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
         
         return jsonify({
             "success": True,
             "job_id": job_id,
-            "message": "Processamento iniciado",
+            "message": "Processamento enfileirado",
+            "executor": executor,
+            "queue_position": position,
+            "eta_seconds": scheduler.eta(position),
             "status_url": f"/api/status/{job_id}"
         })
         
     except Exception as e:
         return jsonify({"error": f"Erro no processamento: {str(e)}"}), 500
 
-def process_video_worker(job_id, url):
+def client_id():
+    """Quem pediu o job, para a divisão justa da fila: API key (hash) ou IP"""
+    api_key = request.headers.get('X-Api-Key')
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+    return request.remote_addr or ""
+
+def enqueue_job(job_id, url, executor, client=None):
+    """Enfileira o job com o custo médio; o custo real é estimado em segundo plano"""
+    position = scheduler.submit(job_id, process_video_worker, url, executor, client=client)
+    if ESTIMATE_COSTS and os.path.exists(SCRIPT_PATH) and worth_estimating(job_id):
+        if estimate_slots.acquire(False):
+            estimator.submit(estimate_job_cost, job_id, url)
+        else:
+            apply_estimate(job_id, url_estimate(url))
+    return position
+
+def worth_estimating(job_id):
+    """Só vale estimar job que vai esperar: sem vaga livre e espera longa"""
+    position = scheduler.position(job_id)
+    queue = scheduler.stats()
+    return (position is not None and queue["running"] >= queue["max_concurrent"]
+            and scheduler.eta(position) >= ESTIMATE_MIN_WAIT)
+
+def url_estimate(url):
+    """Tamanho típico pelo formato da URL, sem rede ({} se nada se sabe)"""
+    lowered = url.lower()
+    for fragment, estimate in URL_ESTIMATES:
+        if fragment in lowered:
+            return dict(estimate, source="url")
+    return {}
+
+def estimate_job_cost(job_id, url):
+    """Estima o custo do job (segundos) num fork do zygote e reposiciona-o na fila"""
+    try:
+        estimate = get_zygote().run(None, 'estimar_job', (url, job_info_file(job_id)),
+                                    timeout=ESTIMATE_TIMEOUT)
+    except Exception as e:
+        print(f"Erro ao estimar o job {job_id}: {e}")
+        estimate = url_estimate(url)
+    finally:
+        estimate_slots.release()
+    apply_estimate(job_id, estimate)
+
+def apply_estimate(job_id, estimate):
+    """Converte bytes/duração/imagens em segundos e reposiciona o job na fila"""
+    size = estimate.get("bytes") or (estimate.get("duration") or 0) * BYTES_PER_VIDEO_SECOND
+    size += estimate.get("images", 0) * BYTES_PER_IMAGE
+    if not size or scheduler.position(job_id) is None:
+        return
+    cost = JOB_OVERHEAD_SECONDS + size / download_throughput["bytes_per_second"]
+    job_store.update(job_id, estimate=dict(estimate, cost_seconds=round(cost, 1)))
+    scheduler.set_cost(job_id, cost)
+
+def read_job_options(data):
+    """Executor e conexões pedidos (comuns a /api/process e /api/batch)"""
+    # Permite comparar os executores por job (antes/depois)
+    executor = data.get('executor', EXECUTOR_MODE)
+    if executor not in EXECUTOR_MODES:
+        raise ValueError(f"Executor inválido: {executor}")
+    
+    # Conexões paralelas por download (opcional, limitado por host e globalmente)
+    connections = data.get('connections')
+    if connections is not None:
+        if not isinstance(connections, int) or not 1 <= connections <= MAX_CONNECTIONS_PER_JOB:
+            raise ValueError(f"connections deve ser um inteiro entre 1 e {MAX_CONNECTIONS_PER_JOB}")
+    
+    return executor, connections
+
+def create_job(job_id, url, executor, connections, **extra):
+    """Registra um job de download; devolve o id do líder se a URL já está em andamento"""
+    created_at = time.time()
+    janitor.track(job_id, created_at + JOB_TTL)
+    leader_id = job_store.create_or_follow(job_id, {
+        "status": "queued",
+        "url": url,
+        "progress": 0,
+        "message": "Aguardando na fila...",
+        "created_at": created_at,
+        "executor": executor,
+        "connections": connections,
+        "startup_ms": None,
+        "files": [],
+        **extra
+    }, normalize_url(url))
+    if leader_id:
+        CACHE_REQUESTS.inc(result="coalesced")
+    return leader_id
+
+@app.route('/api/batch', methods=['POST'])
+def process_batch():
+    """Processar uma lista de URLs: um job pai com um job filho por item"""
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('urls'), list):
+            return jsonify({"error": "Lista de URLs não fornecida"}), 400
+        
+        urls = [url.strip() for url in data['urls'] if isinstance(url, str) and url.strip()]
+        if not urls:
+            return jsonify({"error": "Lista de URLs vazia"}), 400
+        if len(urls) > BATCH_MAX_URLS:
+            return jsonify({"error": f"Máximo de {BATCH_MAX_URLS} URLs por lote"}), 400
+        
+        try:
+            executor, connections = read_job_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        concurrency = data.get('concurrency', BATCH_CONCURRENCY)
+        if not isinstance(concurrency, int) or not 1 <= concurrency <= max(1, BATCH_CONCURRENCY):
+            return jsonify({"error": f"concurrency deve ser um inteiro entre 1 e {max(1, BATCH_CONCURRENCY)}"}), 400
+        
+        batch_id = str(uuid.uuid4())[:8]
+        created_at = time.time()
+        janitor.track(batch_id, created_at + JOB_TTL)
+        job_store.create(batch_id, {
+            "kind": "batch",
+            "status": "queued",
+            "progress": 0,
+            "message": "Preparando o lote...",
+            "created_at": created_at,
+            "executor": executor,
+            "connections": connections,
+            "urls": urls,
+            "client": client_id(),
+            "expand_playlists": bool(data.get('expand_playlists')),
+            "concurrency": concurrency,
+            "children": [],
+            "files": []
+        })
+        start_batch(batch_id)
+        
+        return jsonify({
+            "success": True,
+            "job_id": batch_id,
+            "message": f"Lote com {len(urls)} URL(s) enfileirado",
+            "executor": executor,
+            "concurrency": concurrency,
+            "status_url": f"/api/status/{batch_id}"
+        })
+        
+    except Exception as e:
+        return jsonify({"error": f"Erro no processamento: {str(e)}"}), 500
+
+def start_batch(batch_id):
+    threading.Thread(target=run_batch, args=(batch_id,), daemon=True).start()
+
+def expand_playlist(url, executor):
+    """URLs dos itens de uma playlist (ou a própria URL)"""
+    try:
+        if executor == 'pool' and os.path.exists(SCRIPT_PATH):
+            return get_executor().submit(_expand_in_executor, url).result(timeout=120)
+        if executor == 'zygote' and os.path.exists(SCRIPT_PATH):
+            return get_zygote().run(None, 'expandir_playlist', (url,), timeout=120)
+        
+        cmd = [sys.executable, "-m", "yt_dlp", "--flat-playlist", "--dump-single-json", url]
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        info = json.loads(proc.stdout) if proc.returncode == 0 else {}
+        if info.get("_type") == "playlist":
+            urls = [entry.get("webpage_url") or entry.get("url")
+                    for entry in info.get("entries") or [] if entry]
+            return [item for item in urls if item] or [url]
+    except Exception as e:
+        print(f"Erro ao expandir playlist {url}: {e}")
+    return [url]
+
+def run_batch(batch_id):
+    """Conduz um lote: expande playlists, cria os filhos e os enfileira aos poucos
+
+    No máximo `concurrency` filhos do lote ficam ativos ao mesmo tempo; o
+    resto espera aqui, fora da fila do scheduler (que tem tamanho limitado).
+    """
+    try:
+        batch = job_store.get(batch_id)
+        executor = batch.get("executor") or EXECUTOR_MODE
+        children = batch.get("children") or []
+        
+        if not children:
+            job_store.update(batch_id, status="processing", phase="expanding",
+                             message="Expandindo playlists..." if batch.get("expand_playlists") else "Criando jobs do lote...")
+            urls = batch["urls"]
+            if batch.get("expand_playlists"):
+                # Expande as playlists em paralelo, mantendo a ordem do pedido
+                with ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS) as expander:
+                    expanded = expander.map(lambda url: expand_playlist(url, executor), urls)
+                    urls = [item for items in expanded for item in items]
+            
+            for url in urls[:BATCH_MAX_URLS]:
+                child_id = str(uuid.uuid4())[:8]
+                create_job(child_id, url, executor, batch.get("connections"), parent=batch_id,
+                           client=batch.get("client"))
+                children.append(child_id)
+            job_store.update(batch_id, children=children, phase="running",
+                             message=f"Processando {len(children)} item(ns)...")
+        
+        submitted = set()
+        while True:
+            states = job_store.get_many(children)
+            active = [child_id for child_id in children
+                      if child_id in states and states[child_id]["status"] in ACTIVE_STATUSES]
+            if not active:
+                break
+            
+            # Seguidores não ocupam vaga: terminam junto com o líder
+            running = sum(1 for child_id in active if child_id in submitted)
+            waiting = [child_id for child_id in active
+                       if child_id not in submitted and not states[child_id].get("follows")]
+            for child_id in waiting[:max(0, batch["concurrency"] - running)]:
+                try:
+                    enqueue_job(child_id, states[child_id]["url"], executor, batch.get("client"))
+                except QueueFullError:
+                    break
+                submitted.add(child_id)
+            
+            time.sleep(BATCH_POLL_INTERVAL)
+        
+        finished = job_store.get_many(children)
+        completed = sum(1 for child in finished.values() if child["status"] == "completed")
+        job_store.update(batch_id, status="completed" if completed else "error", progress=100,
+                         phase="finished",
+                         message=f"Lote concluído: {completed} de {len(children)} item(ns) baixado(s)")
+    except Exception as e:
+        job_store.update(batch_id, status="error", message=f"Erro no lote: {str(e)}")
+
+def process_video_worker(job_id, url, executor=EXECUTOR_MODE):
     """Worker para processar vídeo em background"""
+    started = time.time()
+    path, success = 'universal', False
     try:
+        job = job_store.get(job_id)
+        PHASE_SECONDS.observe(started - job["created_at"], phase="queue")
+        
         # Atualizar progresso
-        active_jobs[job_id]["progress"] = 10
-        active_jobs[job_id]["message"] = "Iniciando download..."
+        job_store.update(job_id, status="processing", progress=10, message="Iniciando download...")
         
         # Tentar usar script universal primeiro
         if os.path.exists(SCRIPT_PATH):
-            success = try_universal_script(job_id, url)
+            success = try_universal_script(job_id, url, executor)
             if success:
                 return
         
         # Fallback: usar yt-dlp diretamente
-        success = try_ytdlp(job_id, url)
+        path = 'ytdlp'
+        success = try_ytdlp(job_id, url, executor)
         
         if not success:
-            active_jobs[job_id]["status"] = "error"
-            active_jobs[job_id]["message"] = "Falha no download"
+            job_store.update(job_id, status="error", message="Falha no download")
             
     except Exception as e:
-        active_jobs[job_id]["status"] = "error"
-        active_jobs[job_id]["message"] = f"Erro: {str(e)}"
+        job_store.update(job_id, status="error", message=f"Erro: {str(e)}")
+    finally:
+        outcome = 'success' if success else 'failure'
+        JOBS_TOTAL.inc(path=path, outcome=outcome)
+        JOB_SECONDS.observe(time.time() - started, executor=executor, outcome=outcome)
+        settle_followers(job_id)
+        remove_job_info_file(job_id)
+
+def job_info_file(job_id):
+    """Info dict extraído pelo script universal (reaproveitado no fallback)"""
+    return os.path.join(DOWNLOADS_DIR, f"{job_id}.info.json")
 
-def try_universal_script(job_id, url):
+def remove_job_info_file(job_id):
+    # O info dict e os cookies da extração gravados ao lado dele
+    for path in (job_info_file(job_id), job_info_file(job_id) + '.cookies'):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def settle_followers(leader_id):
+    """Repassa o resultado do job líder aos jobs que acompanhavam a mesma URL"""
+    leader = job_store.get(leader_id)
+    if leader is None:
+        return
+    
+    leader_dir = os.path.join(DOWNLOADS_DIR, leader_id)
+    for follower_id, follower in job_store.followers(leader_id):
+        if follower["status"] not in ACTIVE_STATUSES:
+            continue
+        
+        if leader["status"] != "completed":
+            job_store.update(follower_id, status="error", progress=leader["progress"],
+                             message=leader.get("message", "Falha no download"))
+            continue
+        
+        # Hardlinks: cada job tem a sua pasta e expira de forma independente
+        follower_dir = os.path.join(DOWNLOADS_DIR, follower_id)
+        os.makedirs(follower_dir, exist_ok=True)
+        files = []
+        for file_info in leader.get("files", []):
+            name = file_info["name"]
+            link_or_copy(os.path.join(leader_dir, name), os.path.join(follower_dir, name))
+            files.append(dict(file_info, download_url=f"/api/download/{follower_id}/{name}"))
+        
+        job_store.update(follower_id, status="completed", progress=100,
+                         message=leader.get("message", "Download concluído"),
+                         cache_hit=leader.get("cache_hit", False), files=files)
+
+def try_universal_script(job_id, url, executor=EXECUTOR_MODE):
     """Tentar usar script universal"""
     try:
-        active_jobs[job_id]["progress"] = 30
-        active_jobs[job_id]["message"] = "Usando script universal..."
+        job_store.update(job_id, progress=30, message="Usando script universal...")
         
         # Criar pasta para este job
         job_dir = os.path.join(DOWNLOADS_DIR, job_id)
         os.makedirs(job_dir, exist_ok=True)
         
-        # Executar script universal
-        cmd = [sys.executable, SCRIPT_PATH, url, job_dir]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+        if executor == 'pool':
+            # Executar script universal no pool aquecido
+            result = run_in_executor(job_id, _run_job_in_executor, url, job_dir,
+                                     CACHE_CONFIG, job_info_file(job_id), job_id,
+                                     job_store.get(job_id).get("connections"), DEDUP_DB)
+            success = bool(result and result["success"])
+        elif executor == 'zygote':
+            # Executar script universal num fork do zygote
+            result = run_in_zygote(job_id, 'executar_job', url, job_dir,
+                                   CACHE_CONFIG, job_info_file(job_id),
+                                   segmentos=job_store.get(job_id).get("connections"),
+                                   indice_dedup=DEDUP_DB)
+            success = bool(result and result["success"])
+        else:
+            # Executar script universal num interpretador novo
+            cmd = [sys.executable, SCRIPT_PATH, url, job_dir]
+            env = dict(os.environ, VIDEOBOX_DISPATCH_TS=repr(time.time()),
+                       VIDEOBOX_CACHE_DIR=CACHE_DIR, VIDEOBOX_CACHE_BYTES=str(CACHE_MAX_BYTES),
+                       VIDEOBOX_INFO_FILE=job_info_file(job_id),
+                       VIDEOBOX_JOB_SEGMENTOS=str(job_store.get(job_id).get("connections") or ''),
+                       VIDEOBOX_DEDUP_DB=DEDUP_DB)
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=300, env=env)
+            result = parse_script_result(proc.stdout)
+            record_startup(job_id, 'subprocess', result.get("startup_ms"))
+            observe_job_result(result)
+            success = proc.returncode == 0
         
-        if result.returncode == 0:
+        if success:
             # Sucesso - listar arquivos baixados
+            listing_started = time.perf_counter()
             files = []
             if os.path.exists(job_dir):
                 for filename in os.listdir(job_dir):
@@ -132,13 +894,17 @@ def try_universal_script(job_id, url):
                             "name": filename,
                             "size": format_size(size),
                             "download_url": f"/api/download/{job_id}/{filename}",
-                            "type": get_file_type(filename)
+                            "type": get_file_type(filename),
+                            "media": file_media(filepath, result.get("media") if result else None)
                         })
+            PHASE_SECONDS.observe(time.perf_counter() - listing_started, phase="listing")
             
-            active_jobs[job_id]["status"] = "completed"
-            active_jobs[job_id]["progress"] = 100
-            active_jobs[job_id]["message"] = "Download concluído"
-            active_jobs[job_id]["files"] = files
+            cache_hit = bool(result and result.get("cache_hit"))
+            if download_cache:
+                CACHE_REQUESTS.inc(result="hit" if cache_hit else "miss")
+            job_store.update(job_id, status="completed", progress=100, phase="finished",
+                             message="Download concluído (cache)" if cache_hit else "Download concluído",
+                             cache_hit=cache_hit, files=files)
             return True
             
     except Exception as e:
@@ -146,29 +912,40 @@ def try_universal_script(job_id, url):
     
     return False
 
-def try_ytdlp(job_id, url):
+def try_ytdlp(job_id, url, executor=EXECUTOR_MODE):
     """Fallback usando yt-dlp"""
     try:
-        active_jobs[job_id]["progress"] = 50
-        active_jobs[job_id]["message"] = "Usando yt-dlp..."
+        job_store.update(job_id, progress=50, message="Usando yt-dlp...")
         
         # Criar pasta para este job
         job_dir = os.path.join(DOWNLOADS_DIR, job_id)
         os.makedirs(job_dir, exist_ok=True)
         
-        # Comando yt-dlp
-        cmd = [
-            sys.executable, "-m", "yt_dlp",
-            "--format", "best[height<=1080]",
-            "--output", os.path.join(job_dir, "%(title)s.%(ext)s"),
-            "--no-playlist",
-            url
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+        if executor == 'pool' and os.path.exists(SCRIPT_PATH):
+            result = run_in_executor(job_id, _run_ytdlp_in_executor, url, job_dir,
+                                     job_info_file(job_id), job_id)
+            success = bool(result and result["success"])
+        elif executor == 'zygote' and os.path.exists(SCRIPT_PATH):
+            result = run_in_zygote(job_id, 'executar_ytdlp', url, job_dir, job_info_file(job_id))
+            success = bool(result and result["success"])
+        else:
+            # Comando yt-dlp (reaproveita a extração do script universal, se houver)
+            info_file = job_info_file(job_id)
+            source = ["--load-info-json", info_file] if os.path.exists(info_file) else [url]
+            cmd = [
+                sys.executable, "-m", "yt_dlp",
+                "--format", "best[height<=1080]",
+                "--output", os.path.join(job_dir, "%(title)s.%(ext)s"),
+                "--no-playlist",
+                *source
+            ]
+            
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+            success = result.returncode == 0
         
-        if result.returncode == 0:
+        if success:
             # Listar arquivos baixados
+            listing_started = time.perf_counter()
             files = []
             if os.path.exists(job_dir):
                 for filename in os.listdir(job_dir):
@@ -179,13 +956,13 @@ def try_ytdlp(job_id, url):
                             "name": filename,
                             "size": format_size(size),
                             "download_url": f"/api/download/{job_id}/{filename}",
-                            "type": "video"
+                            "type": "video",
+                            "media": file_media(filepath)
                         })
+            PHASE_SECONDS.observe(time.perf_counter() - listing_started, phase="listing")
             
-            active_jobs[job_id]["status"] = "completed"
-            active_jobs[job_id]["progress"] = 100
-            active_jobs[job_id]["message"] = "Download concluído com yt-dlp"
-            active_jobs[job_id]["files"] = files
+            job_store.update(job_id, status="completed", progress=100, phase="finished",
+                             message="Download concluído com yt-dlp", files=files)
             return True
             
     except Exception as e:
@@ -196,53 +973,342 @@ def try_ytdlp(job_id, url):
 @app.route('/api/status/<job_id>')
 def get_status(job_id):
     """Verificar status do job"""
-    if job_id not in active_jobs:
+    job = job_store.get(job_id)
+    if job is None:
         return jsonify({"error": "Job não encontrado"}), 404
     
-    job = active_jobs[job_id]
-    
-    # Limpar jobs antigos (mais de 1 hora)
-    if time.time() - job["created_at"] > 3600:
-        cleanup_job(job_id)
+    # Jobs antigos expiram (o janitor também os apaga em segundo plano); jobs
+    # ativos (ex.: itens de um lote longo ainda na fila) e pastas sendo
+    # servidas não expiram
+    if time.time() - job["created_at"] > JOB_TTL and cleanup_job(job_id):
         return jsonify({"error": "Job expirado"}), 404
     
-    return jsonify({
+    return jsonify(build_status(job_id, job))
+
+def build_status(job_id, job, jobs=None, positions=None):
+    """Resposta de status do job (usada por /api/status e /api/events)
+
+    `jobs` e `positions`, quando vêm do status de um lote, já trazem os
+    líderes e as posições na fila, lidos uma vez para o lote inteiro.
+    """
+    if job.get("kind") == "batch":
+        return build_batch_status(job_id, job)
+    
+    # Job anexado a outro da mesma URL: o progresso vem do líder
+    queue_id = job_id
+    if job.get("follows") and job["status"] in ACTIVE_STATUSES:
+        leader = jobs.get(job["follows"]) if jobs is not None else job_store.get(job["follows"])
+        if leader and leader["status"] in ACTIVE_STATUSES:
+            job.update(status=leader["status"], progress=leader["progress"],
+                       message=leader.get("message", ""), phase=leader.get("phase"),
+                       download=leader.get("download"), images=leader.get("images"),
+                       stream=leader.get("stream"))
+            queue_id = job["follows"]
+    
+    response = {
         "job_id": job_id,
         "status": job["status"],
         "progress": job["progress"],
         "message": job.get("message", ""),
         "completed": job["status"] in ["completed", "error"],
-        "files": job.get("files", [])
+        "executor": job.get("executor"),
+        "startup_ms": job.get("startup_ms"),
+        "cache_hit": job.get("cache_hit", False),
+        "follows": job.get("follows"),
+        "phase": job.get("phase"),
+        "download": job.get("download"),
+        "images": job.get("images"),
+        "estimate": job.get("estimate"),
+        "stream": job.get("stream") if job["status"] in ACTIVE_STATUSES else None,
+        "files": job.get("files", []),
+        "archive_url": f"/api/download/{job_id}/all" if job["status"] == "completed" and job.get("files") else None
+    }
+    
+    # Jobs na fila: posição e estimativa de início
+    if job["status"] == "queued":
+        position = positions.get(queue_id) if positions is not None else scheduler.position(queue_id)
+        if position is not None:
+            response["queue_position"] = position
+            response["eta_seconds"] = scheduler.eta(position)
+    
+    return response
+
+def build_batch_status(batch_id, batch):
+    """Status de um lote: progresso agregado e o status de cada item"""
+    children = batch.get("children", [])
+    jobs = job_store.get_many(children)
+    # Líderes de fora do lote numa segunda consulta; posições numa passada só
+    leaders = {child["follows"] for child in jobs.values()
+               if child.get("follows") and child["status"] in ACTIVE_STATUSES} - jobs.keys()
+    if leaders:
+        jobs.update(job_store.get_many(leaders))
+    positions = scheduler.positions(job_id for job_id, job in jobs.items() if job["status"] == "queued")
+    
+    items = []
+    summary = dict.fromkeys(("queued", "processing", "completed", "error"), 0)
+    for child_id in children:
+        child = jobs.get(child_id)
+        if child is None:
+            item = {"job_id": child_id, "status": "error", "progress": 0,
+                    "message": "Job expirado", "files": []}
+        else:
+            status = build_status(child_id, child, jobs, positions)
+            item = {key: status[key] for key in ("job_id", "status", "progress", "message", "files")}
+            item["url"] = child.get("url")
+        summary[item["status"]] = summary.get(item["status"], 0) + 1
+        items.append(item)
+    
+    progress = batch["progress"]
+    if batch["status"] in ACTIVE_STATUSES and items:
+        progress = sum(item["progress"] for item in items) // len(items)
+    
+    return {
+        "job_id": batch_id,
+        "kind": "batch",
+        "status": batch["status"],
+        "progress": progress,
+        "message": batch.get("message", ""),
+        "completed": batch["status"] in ["completed", "error"],
+        "executor": batch.get("executor"),
+        "phase": batch.get("phase"),
+        "concurrency": batch.get("concurrency"),
+        "total": len(items),
+        "summary": summary,
+        "items": items
+    }
+
+@app.route('/api/events/<job_id>')
+def job_events(job_id):
+    """Progresso do job via Server-Sent Events (substitui o polling de /api/status)"""
+    if job_store.get(job_id) is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    
+    def stream():
+        last_payload = None
+        last_sent = time.time()
+        while True:
+            job = job_store.get(job_id)
+            if job is None:
+                yield "event: gone\ndata: {}\n\n"
+                return
+            
+            status = build_status(job_id, job)
+            payload = json.dumps(status)
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload, last_sent = payload, time.time()
+            elif time.time() - last_sent > SSE_HEARTBEAT:
+                # Comentário SSE: mantém a conexão viva através de proxies
+                yield ": ping\n\n"
+                last_sent = time.time()
+            
+            if status["completed"]:
+                return
+            time.sleep(SSE_POLL_INTERVAL)
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
+@app.route('/api/download/<job_id>/all')
+def download_all(job_id):
+    """Todos os arquivos do job num único ZIP (stored) ou TAR, gerado em streaming"""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    if job["status"] != "completed":
+        return jsonify({"error": "Job ainda não concluído"}), 409
+    
+    archive_format = request.args.get('format', 'zip')
+    if archive_format not in ARCHIVE_FORMATS:
+        return jsonify({"error": f"Formato inválido: {archive_format} (use zip ou tar)"}), 400
+    
+    job_dir = os.path.join(DOWNLOADS_DIR, job_id)
+    names = sorted(
+        name for name in (os.listdir(job_dir) if os.path.isdir(job_dir) else [])
+        if not name.endswith('.part') and os.path.isfile(os.path.join(job_dir, name))
+    )
+    if not names:
+        return jsonify({"error": "Nenhum arquivo no job"}), 404
+    
+    # Sem arquivo temporário: os bytes saem enquanto os arquivos são lidos
+    mimetype, extension = ARCHIVE_FORMATS[archive_format]
+    response = Response(iter_archive(archive_format, job_dir, names), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{job_id}.{extension}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # A pasta não é apagada pelo janitor até o fim do envio
+    return release_on_close(response, janitor.lease(job_id))
+
 @app.route('/api/download/<job_id>/<filename>')
 def download_file(job_id, filename):
     """Download de arquivo"""
     try:
-        if job_id not in active_jobs:
+        if job_store.get(job_id) is None:
             return jsonify({"error": "Job não encontrado"}), 404
         
-        filepath = os.path.join(DOWNLOADS_DIR, job_id, filename)
-        if not os.path.exists(filepath):
+        job_dir = os.path.join(DOWNLOADS_DIR, job_id)
+        filepath = safe_join(job_dir, filename)
+        if filepath is None:
+            return jsonify({"error": "Arquivo não encontrado"}), 404
+        if not os.path.isfile(filepath):
+            if is_streaming(job_id, filename) and os.path.isfile(filepath + '.part'):
+                return stream_partial_file(job_id, filename, filepath + '.part')
             return jsonify({"error": "Arquivo não encontrado"}), 404
         
-        return send_file(filepath, as_attachment=True)
+        # A pasta não é apagada pelo janitor até o fim do envio
+        release = janitor.lease(job_id)
+        try:
+            if SENDFILE_MODE == 'x-accel':
+                # O nginx entrega o arquivo (Range, ETag e 304 inclusos)
+                response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+                response.headers['X-Accel-Redirect'] = f"{ACCEL_REDIRECT_PREFIX}{job_id}/{quote(filename)}"
+                response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+            else:
+                # conditional=True: Range/206, ETag/Last-Modified e 304; sem Range o
+                # gunicorn usa wsgi.file_wrapper com sendfile() (sem cópia em Python)
+                response = send_from_directory(job_dir, filename, as_attachment=True,
+                                               conditional=True, etag=True, max_age=3600)
+        except Exception:
+            release()
+            raise
+        return release_on_close(response, release)
         
+    except HTTPException:
+        # 416 de um Range fora do arquivo, etc.: resposta do próprio werkzeug
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def release_on_close(response, release):
+    """Chama release() quando o servidor terminar de enviar a resposta"""
+    if request.method == 'HEAD' or response.status_code in (204, 304):
+        # Sem corpo: o servidor não fecha o iterável da resposta
+        release()
+    elif response.direct_passthrough and hasattr(response.response, 'close'):
+        # send_file: o servidor recebe o wsgi.file_wrapper direto (sendfile)
+        # e fecha só ele, sem passar por response.close()
+        close = response.response.close
+        
+        def close_and_release():
+            try:
+                close()
+            finally:
+                release()
+        
+        response.response.close = close_and_release
+    else:
+        response.call_on_close(release)
+    return response
+
+def is_streaming(job_id, filename):
+    """O job está baixando este arquivo como progressivo único (sem merge)?"""
+    job = job_store.get(job_id)
+    return (job is not None and job["status"] in ACTIVE_STATUSES
+            and (job.get("stream") or {}).get("filename") == filename)
+
+def stream_partial_file(job_id, filename, partial_path):
+    """Serve o .part enquanto o download escreve (tail-follow, chunked)
+
+    Só envia os bytes que o downloader já gravou em sequência desde o
+    início. Se o job falhar, ou a tentativa recomeçar noutro arquivo (o .part
+    apagado ou truncado, o fallback gravando um arquivo novo), a conexão é
+    abortada antes do fim, e o cliente percebe a resposta incompleta. A
+    deduplicação entre jobs pode trocar o arquivo final por um hardlink de
+    outro igual: aí o fd segue no inode antigo, com o mesmo conteúdo.
+    """
+    final_path = partial_path.removesuffix('.part')
+    source = open(partial_path, 'rb')
+    opened = os.fstat(source.fileno())
+    
+    def generate():
+        sent = 0
+        with source:
+            while True:
+                job = job_store.get(job_id)
+                if job is None or job["status"] == "error":
+                    raise IOError(f"Download do job {job_id} interrompido")
+                
+                # O fd segue o inode aberto: ele precisa ainda ser o .part ou o
+                # arquivo final (rename no fim, talvez trocado pela deduplicação),
+                # e sem encolher
+                finished = job["status"] == "completed"
+                current = os.fstat(source.fileno())
+                renamed = same_file(opened, final_path) or replaced_by_duplicate(current, final_path)
+                if (current.st_size < sent or not renamed
+                        and (finished or not same_file(opened, partial_path))):
+                    raise IOError(f"Download do job {job_id} recomeçou em outro arquivo")
+                
+                if finished:
+                    # O .part virou o arquivo final (mesmo inode): lê até o fim
+                    available = current.st_size
+                else:
+                    download = job.get("download") or {}
+                    available = 0
+                    if download.get("filename") == filename:
+                        available = download.get("contiguous_bytes") or 0
+                    total = (job.get("stream") or {}).get("total_bytes") or download.get("total_bytes")
+                    # Segura o início da resposta até haver dados suficientes
+                    if not sent and available < min(STREAM_MIN_BYTES, total or STREAM_MIN_BYTES):
+                        available = 0
+                
+                while sent < available:
+                    chunk = source.read(min(STREAM_CHUNK_SIZE, available - sent))
+                    if not chunk:
+                        break
+                    sent += len(chunk)
+                    yield chunk
+                
+                if finished:
+                    return
+                time.sleep(STREAM_POLL_INTERVAL)
+    
+    response = Response(stream_with_context(generate()),
+                        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def same_file(opened, path):
+    """`path` ainda aponta para o arquivo aberto (mesmo inode)?"""
+    try:
+        current = os.stat(path)
+    except OSError:
+        return False
+    return (current.st_ino, current.st_dev) == (opened.st_ino, opened.st_dev)
+
+def replaced_by_duplicate(current, path):
+    """`path` é outro inode com o conteúdo do arquivo aberto?
+
+    link_duplicate troca o arquivo final por um hardlink de um arquivo igual
+    de outro job (mesmo hash completo): o inode aberto fica sem nenhum nome
+    e com o tamanho do novo.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return current.st_nlink == 0 and stat.st_size == current.st_size
+
 def cleanup_job(job_id):
-    """Limpar arquivos do job"""
+    """Limpar arquivos do job (e dos itens, se for um lote); False se ativo ou em uso"""
     try:
-        if job_id in active_jobs:
-            del active_jobs[job_id]
-        
-        job_dir = os.path.join(DOWNLOADS_DIR, job_id)
-        if os.path.exists(job_dir):
-            import shutil
-            shutil.rmtree(job_dir)
-    except:
-        pass
+        return janitor.evict(job_id, 'ttl')
+    except Exception as e:
+        print(f"Erro ao limpar job {job_id}: {e}")
+        return False
+
+def parse_script_result(stdout):
+    """Lê o resultado JSON impresso pelo script universal (última linha)"""
+    for line in reversed((stdout or '').strip().splitlines()):
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(result, dict):
+            return result
+    return {}
 
 def format_size(bytes_size):
     """Formatar tamanho em bytes"""
@@ -252,6 +1318,13 @@ def format_size(bytes_size):
         bytes_size /= 1024.0
     return f"{bytes_size:.1f} TB"
 
+def file_media(filepath, known=None):
+    """Dimensões, duração e codecs de vídeo/áudio: os do job (info do yt-dlp)
+    ou lidos do cabeçalho do arquivo, sem abrir um ffprobe"""
+    if get_file_type(filepath) not in ('video', 'audio'):
+        return None
+    return (known or {}).get(os.path.basename(filepath)) or probe_file(filepath) or None
+
 def get_file_type(filename):
     """Determinar tipo do arquivo"""
     ext = filename.lower().split('.')[-1]
@@ -264,6 +1337,40 @@ def get_file_type(filename):
     else:
         return 'unknown'
 
+# Sobe o pool já no import (antes de existirem threads de jobs, seguro para
+# fork) para o primeiro job não pagar o import do yt-dlp
+if EXECUTOR_MODE == 'pool' and os.path.exists(SCRIPT_PATH):
+    get_executor()
+elif EXECUTOR_MODE == 'zygote' and os.path.exists(SCRIPT_PATH):
+    get_zygote()
+
+janitor.start()
+
+def resume_orphan_jobs():
+    """Reenfileira jobs interrompidos por restart/morte do worker dono
+
+    O yt-dlp retoma os arquivos .part já presentes na pasta do job.
+    """
+    for job_id, job in job_store.claim_orphans(current_owner()):
+        if job.get("kind") == "batch":
+            # O lote volta a conduzir os seus itens
+            start_batch(job_id)
+            continue
+        if job.get("parent"):
+            # Itens de lote são reenfileirados pelo lote
+            job_store.update(job_id, status="queued", message="Retomando após reinício...")
+            continue
+        if job.get("follows"):
+            # Seguidores são resolvidos quando o líder terminar
+            continue
+        job_store.update(job_id, status="queued", message="Retomando após reinício...")
+        try:
+            enqueue_job(job_id, job["url"], job.get("executor") or EXECUTOR_MODE, job.get("client"))
+        except QueueFullError:
+            job_store.update(job_id, status="error", message="Fila cheia ao retomar o job")
+
+resume_orphan_jobs()
+
 # Para PythonAnywhere
 application = app
 
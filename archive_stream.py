@@ -0,0 +1,96 @@
+import os
+import tarfile
+import zipfile
+
+ARCHIVE_CHUNK_SIZE = 256 * 1024
+
+ARCHIVE_FORMATS = {
+    'zip': ('application/zip', 'zip'),
+    'tar': ('application/x-tar', 'tar'),
+}
+
+
+class _ChunkSink:
+    """Destino só de escrita: guarda os bytes até o gerador entregá-los"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _read_chunks(path, size):
+    """Lê no máximo `size` bytes do arquivo, em blocos"""
+    with open(path, 'rb') as source:
+        remaining = size
+        while remaining > 0:
+            chunk = source.read(min(ARCHIVE_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise IOError(f"{path} encolheu durante o envio")
+            remaining -= len(chunk)
+            yield chunk
+
+
+def iter_zip(directory, names):
+    """ZIP sem compressão (stored) gerado aos pedaços, sem arquivo temporário
+
+    A saída não é "seekable", então o zipfile grava CRC e tamanhos num data
+    descriptor depois de cada arquivo; a memória usada fica em um bloco.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        for name in names:
+            path = os.path.join(directory, name)
+            info = zipfile.ZipInfo.from_file(path, name)
+            with archive.open(info, 'w') as dest:
+                for chunk in _read_chunks(path, info.file_size):
+                    dest.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_tar(directory, names):
+    """TAR (formato PAX, nomes UTF-8 longos) gerado aos pedaços"""
+    written = 0
+    for name in names:
+        path = os.path.join(directory, name)
+        stat = os.stat(path)
+        info = tarfile.TarInfo(name)
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = 0o644
+
+        header = info.tobuf(tarfile.PAX_FORMAT)
+        written += len(header)
+        yield header
+        for chunk in _read_chunks(path, info.size):
+            written += len(chunk)
+            yield chunk
+
+        padding = -info.size % tarfile.BLOCKSIZE
+        written += padding
+        yield tarfile.NUL * padding
+
+    # Fim do arquivo: dois blocos zerados, completando o último registro
+    trailer = 2 * tarfile.BLOCKSIZE
+    trailer += -(written + trailer) % tarfile.RECORDSIZE
+    yield tarfile.NUL * trailer
+
+
+def iter_archive(archive_format, directory, names):
+    """Bytes do arquivo ZIP/TAR, sem blocos vazios (fim do chunked)"""
+    generator = iter_zip if archive_format == 'zip' else iter_tar
+    for chunk in generator(directory, names):
+        if chunk:
+            yield chunk
@@ -0,0 +1,222 @@
+"""Benchmark de clientes lentos: /api/status com centenas de downloads e SSE abertos
+
+Sobe o servidor de mídia sintética e o api.py no gunicorn numa pasta
+temporária, conclui um job (o arquivo que os clientes lentos baixam) e
+deixa outro rodando devagar (o que os clientes de SSE acompanham). Abre
+então N conexões que leem poucos KiB/s e mede, enquanto elas estão
+abertas, a latência de /api/status de um cliente rápido.
+
+Roda uma vez por classe de worker, com um worker só: no sync a primeira
+conexão lenta ocupa o worker e o status espera na fila; no gevent cada
+conexão é uma greenlet e o status responde na hora.
+
+Com --max-p95-ms, termina com código 1 se o p95 do status (sem resposta
+conta como o timeout) passar do limite em algum modo.
+
+    python benchmarks/bench_clientes_lentos.py [--modos sync,gevent] [--clientes 200]
+        [--kbps-cliente 32] [--duracao 10] [--max-p95-ms 0]
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import requests
+
+from bench_e2e import AQUI, porta_livre, esperar, preparar_base, percentil
+
+# Janela de recepção pequena: o servidor não consegue despejar o arquivo no buffer
+BUFFER_CLIENTE = 16 * 1024
+
+
+def subir_api(base_dir, porta, modo, args):
+    env = dict(os.environ, VIDEOBOX_BASE_DIR=base_dir, VIDEOBOX_EXECUTOR="pool",
+               VIDEOBOX_CACHE_BYTES="0", VIDEOBOX_MAX_CONCURRENT="2")
+    # Como o Procfile: timeout de 300 s; um worker para comparar um processo com outro
+    comando = [sys.executable, "-m", "gunicorn", "--workers", "1", "--worker-class", modo,
+               "--timeout", "300", "--graceful-timeout", "5",
+               "--bind", f"127.0.0.1:{porta}", "--log-level", "warning", "api:application"]
+    if modo == "gthread":
+        comando += ["--threads", str(args.threads)]
+    elif modo == "gevent":
+        comando += ["--worker-connections", str(args.clientes * 2 + 100)]
+    # Sessão própria: no fim, o grupo inteiro (pool de downloads incluso) é encerrado
+    processo = subprocess.Popen(comando, cwd=base_dir, env=env, start_new_session=True,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    esperar(f"http://127.0.0.1:{porta}/api/health", processo, "gunicorn")
+    return processo
+
+
+def encerrar(processo):
+    processo.terminate()
+    try:
+        processo.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        pass
+    try:
+        os.killpg(processo.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    processo.wait()
+
+
+def preparar_jobs(api, origem, args):
+    """(URL de download de um job concluído, caminho de SSE de um job em andamento)"""
+    resposta = requests.post(f"{api}/api/process", timeout=30,
+                             json={"url": f"{origem}/video/pronto.mp4?mb={args.tamanho_mb}"})
+    job_id = resposta.json()["job_id"]
+    while True:
+        status = requests.get(f"{api}/api/status/{job_id}", timeout=30).json()
+        if status.get("completed"):
+            break
+        time.sleep(0.1)
+    if status["status"] != "completed" or not status.get("files"):
+        raise RuntimeError(f"job de preparo falhou: {status.get('message')}")
+    download = status["files"][0]["download_url"]
+
+    # Banda baixa na origem: o job continua rodando durante toda a medida
+    resposta = requests.post(f"{api}/api/process", timeout=30,
+                             json={"url": f"{origem}/video/lento.mp4?mb=64&kbps=64"})
+    return download, f"/api/events/{resposta.json()['job_id']}"
+
+
+def cliente_lento(porta, caminho, kbps, inicio, parar, resultados):
+    """Pede `caminho` e lê a resposta a `kbps` KiB/s até `parar`"""
+    resultado = {"primeiro_byte": None, "bytes": 0, "erro": None}
+    resultados.append(resultado)
+    bloco = max(1024, kbps * 1024 // 10)
+    try:
+        with socket.socket() as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, BUFFER_CLIENTE)
+            s.settimeout(5)
+            s.connect(("127.0.0.1", porta))
+            s.sendall(f"GET {caminho} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode())
+            s.settimeout(0.2)
+            while not parar.is_set():
+                try:
+                    dados = s.recv(bloco)
+                except socket.timeout:
+                    continue
+                if not dados:
+                    break
+                if resultado["primeiro_byte"] is None:
+                    resultado["primeiro_byte"] = time.perf_counter() - inicio
+                resultado["bytes"] += len(dados)
+                time.sleep(0.1)
+    except OSError as e:
+        resultado["erro"] = str(e)
+
+
+def medir_status(api, caminho, duracao, timeout):
+    """Latências de /api/status durante `duracao` s; sem resposta conta como `timeout`"""
+    latencias, falhas = [], 0
+    fim = time.perf_counter() + duracao
+    while time.perf_counter() < fim:
+        comeco = time.perf_counter()
+        try:
+            requests.get(f"{api}{caminho}", timeout=timeout).raise_for_status()
+            latencias.append(time.perf_counter() - comeco)
+        except requests.RequestException:
+            latencias.append(timeout)
+            falhas += 1
+        time.sleep(0.1)
+    return sorted(latencias), falhas
+
+
+def medir(modo, args):
+    with tempfile.TemporaryDirectory() as base_dir:
+        preparar_base(base_dir)
+        porta_midia = porta_livre()
+        midia = subprocess.Popen(
+            [sys.executable, os.path.join(AQUI, "servidor_midia.py"), "--porta", str(porta_midia),
+             "--latencia-ms", "0"], stdout=subprocess.DEVNULL)
+        gunicorn = None
+        parar = threading.Event()
+        try:
+            origem = f"http://127.0.0.1:{porta_midia}"
+            esperar(f"{origem}/video/aquecimento.mp4?mb=0.01", midia, "servidor de mídia")
+            porta = porta_livre()
+            gunicorn = subir_api(base_dir, porta, modo, args)
+            api = f"http://127.0.0.1:{porta}"
+            download, eventos = preparar_jobs(api, origem, args)
+            status = eventos.replace("/api/events/", "/api/status/")
+
+            # Metade baixa o arquivo pronto, metade acompanha o job por SSE
+            resultados = []
+            inicio = time.perf_counter()
+            clientes = []
+            for i in range(args.clientes):
+                caminho = eventos if i % 2 else download
+                cliente = threading.Thread(target=cliente_lento, daemon=True, args=(
+                    porta, caminho, args.kbps_cliente, inicio, parar, resultados))
+                cliente.start()
+                clientes.append(cliente)
+            time.sleep(1)
+
+            latencias, falhas = medir_status(api, status, args.duracao, args.timeout_status)
+            parar.set()
+            for cliente in clientes:
+                cliente.join(timeout=5)
+        finally:
+            parar.set()
+            if gunicorn:
+                encerrar(gunicorn)
+            midia.terminate()
+            midia.wait()
+
+    atendidos = [r["primeiro_byte"] for r in resultados if r["primeiro_byte"] is not None]
+    return {
+        "modo": modo,
+        "status_pedidos": len(latencias),
+        "status_falhas": falhas,
+        "status_p50_ms": round(percentil(latencias, 50) * 1000, 1),
+        "status_p95_ms": round(percentil(latencias, 95) * 1000, 1),
+        "status_max_ms": round(max(latencias, default=0) * 1000, 1),
+        "atendidos": len(atendidos),
+        "primeiro_byte_p95_s": round(percentil(sorted(atendidos), 95), 2),
+        "erros": sum(1 for r in resultados if r["erro"]),
+        "mib_recebidos": round(sum(r["bytes"] for r in resultados) / 1024 ** 2, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modos", type=lambda texto: texto.split(","), default=["sync", "gevent"],
+                        help="classes de worker do gunicorn (sync, gthread, gevent)")
+    parser.add_argument("--clientes", type=int, default=200, help="conexões lentas abertas ao mesmo tempo")
+    parser.add_argument("--kbps-cliente", type=int, default=32, help="leitura de cada conexão lenta em KiB/s")
+    parser.add_argument("--duracao", type=float, default=10, help="segundos medindo o /api/status")
+    parser.add_argument("--timeout-status", type=float, default=5)
+    parser.add_argument("--tamanho-mb", type=float, default=16, help="arquivo baixado pelos clientes lentos")
+    parser.add_argument("--threads", type=int, default=8, help="threads do worker gthread")
+    parser.add_argument("--max-p95-ms", type=float, default=0, help="limite do p95 do status (0 = sem limite)")
+    args = parser.parse_args()
+
+    print(f"{args.clientes} clientes lentos ({args.kbps_cliente} KiB/s, metade download, metade SSE), "
+          f"{args.duracao:g} s medindo /api/status")
+    reprovados = []
+    for modo in args.modos:
+        r = medir(modo, args)
+        print(f"  {modo}:")
+        print(f"    /api/status: p50 {r['status_p50_ms']:.0f} ms  p95 {r['status_p95_ms']:.0f} ms  "
+              f"máx {r['status_max_ms']:.0f} ms  ({r['status_pedidos']} pedidos, "
+              f"{r['status_falhas']} sem resposta em {args.timeout_status:g} s)")
+        print(f"    clientes lentos atendidos {r['atendidos']}/{args.clientes}  "
+              f"primeiro byte p95 {r['primeiro_byte_p95_s']:.2f} s  "
+              f"recebido {r['mib_recebidos']:.1f} MiB  erros {r['erros']}")
+        if args.max_p95_ms and r["status_p95_ms"] > args.max_p95_ms:
+            reprovados.append(modo)
+
+    if reprovados:
+        print(f"ACIMA DO LIMITE ({args.max_p95_ms:g} ms): {', '.join(reprovados)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Benchmark: entrega de arquivos por /api/download (sendfile vs. cópia em Python)
+
+Sobe o api.py no gunicorn (1 worker sync) apontando para uma pasta
+temporária, cria um job com um arquivo grande e baixa esse arquivo várias
+vezes, com sendfile() ligado e com --no-sendfile. Mostra a vazão, o tempo
+de worker ocupado por GB e o CPU gasto pelo worker por GB; no fim confere
+que Range (206) e If-None-Match (304) funcionam.
+
+    python benchmarks/bench_download.py [--tamanho-mb 256] [--repeticoes 4]
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+
+import requests
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def cpu_do_processo(pid):
+    """utime + stime (segundos) de /proc/<pid>/stat"""
+    with open(f"/proc/{pid}/stat") as f:
+        campos = f.read().rsplit(")", 1)[1].split()
+    return (int(campos[11]) + int(campos[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def pid_do_worker(pid_master):
+    with open(f"/proc/{pid_master}/task/{pid_master}/children") as f:
+        return int(f.read().split()[0])
+
+
+def criar_job(base_dir, job_id, nome, tamanho):
+    """Grava o registro do job no SQLite e o arquivo na pasta do job"""
+    sys.path.insert(0, RAIZ)
+    from job_store import SQLiteJobStore
+
+    store = SQLiteJobStore(os.path.join(base_dir, "jobs.db"))
+    if store.get(job_id) is None:
+        store.create(job_id, {"status": "completed", "progress": 100, "files": [nome]})
+
+    pasta = os.path.join(base_dir, "downloads", job_id)
+    os.makedirs(pasta, exist_ok=True)
+    with open(os.path.join(pasta, nome), "wb") as f:
+        bloco = os.urandom(1024 * 1024)
+        for _ in range(tamanho // len(bloco)):
+            f.write(bloco)
+
+
+def subir_gunicorn(base_dir, porta, sendfile):
+    env = dict(os.environ, VIDEOBOX_BASE_DIR=base_dir, VIDEOBOX_EXECUTOR="subprocess")
+    comando = [sys.executable, "-m", "gunicorn", "--workers", "1", "--timeout", "600",
+               "--bind", f"127.0.0.1:{porta}", "--log-level", "warning"]
+    if not sendfile:
+        comando.append("--no-sendfile")
+    processo = subprocess.Popen(comando + ["api:application"], cwd=RAIZ, env=env)
+
+    for _ in range(200):
+        try:
+            requests.get(f"http://127.0.0.1:{porta}/api/health", timeout=1)
+            return processo
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    processo.kill()
+    raise RuntimeError("gunicorn não subiu")
+
+
+def medir(url, pid_worker, repeticoes):
+    cpu_inicio = cpu_do_processo(pid_worker)
+    ocupado = 0.0
+    total = 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        with requests.get(url, stream=True) as resposta:
+            resposta.raise_for_status()
+            for pedaco in resposta.iter_content(1024 * 1024):
+                total += len(pedaco)
+        # Worker sync: fica preso à requisição do começo ao fim
+        ocupado += time.perf_counter() - inicio
+    cpu = cpu_do_processo(pid_worker) - cpu_inicio
+    gb = total / 1024 ** 3
+    return {"mib_s": total / 1024 ** 2 / ocupado, "ocupado_s_gb": ocupado / gb, "cpu_s_gb": cpu / gb}
+
+
+def conferir_condicionais(url, tamanho):
+    parcial = requests.get(url, headers={"Range": "bytes=1000-1999"})
+    assert parcial.status_code == 206 and len(parcial.content) == 1000, parcial.status_code
+    assert parcial.headers["Content-Range"] == f"bytes 1000-1999/{tamanho}"
+
+    etag = requests.head(url).headers["ETag"]
+    assert requests.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanho-mb", type=int, default=256)
+    parser.add_argument("--repeticoes", type=int, default=4)
+    args = parser.parse_args()
+
+    tamanho = args.tamanho_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory() as base_dir:
+        criar_job(base_dir, "bench", "video.mp4", tamanho)
+
+        print(f"Arquivo: {args.tamanho_mb} MiB x {args.repeticoes} downloads, 1 worker sync")
+        for sendfile in (False, True):
+            porta = porta_livre()
+            gunicorn = subir_gunicorn(base_dir, porta, sendfile)
+            try:
+                url = f"http://127.0.0.1:{porta}/api/download/bench/video.mp4"
+                medida = medir(url, pid_do_worker(gunicorn.pid), args.repeticoes)
+                if sendfile:
+                    conferir_condicionais(url, tamanho)
+            finally:
+                gunicorn.terminate()
+                gunicorn.wait()
+
+            nome = "sendfile()" if sendfile else "cópia em Python"
+            print(f"  {nome:16s} {medida['mib_s']:8.1f} MiB/s  "
+                  f"worker ocupado {medida['ocupado_s_gb']:5.2f}s/GB  "
+                  f"CPU do worker {medida['cpu_s_gb']:5.2f}s/GB")
+
+        print("  Range 206 e If-None-Match 304: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Benchmark ponta a ponta: /api/process -> worker -> downloader -> /api/download
+
+Sobe o servidor de mídia sintética (servidor_midia.py) e o api.py no
+gunicorn numa pasta temporária, e dispara jobs (MP4 progressivo, HLS e
+galeria) com vários clientes ao mesmo tempo. Cada cliente envia a URL,
+acompanha /api/status e baixa os arquivos pela API. Mostra jobs/s, p50/p95/
+p99 do tempo até o job terminar (com os arquivos baixados), bytes/s
+entregues e o pico de RSS da árvore de processos do gunicorn.
+
+Com --baseline, compara com os números gravados (que dependem da máquina:
+grave-os com --salvar-baseline no mesmo ambiente) e termina com código 1 se
+alguma métrica piorar além da tolerância.
+
+    python benchmarks/bench_e2e.py [--jobs 24] [--clientes 4] [--executor pool]
+        [--worker-class gthread] [--latencia-ms 20] [--kbps 0] [--baseline benchmarks/baselines/e2e.json]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+AQUI = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PADRAO = os.path.join(AQUI, "baselines", "e2e.json")
+
+# Métrica -> True se maior é melhor
+METRICAS = {
+    "jobs_por_s": True,
+    "p50_s": False,
+    "p95_s": False,
+    "p99_s": False,
+    "mib_por_s": True,
+    "pico_rss_mb": False,
+}
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar(url, processo, nome):
+    for _ in range(400):
+        if processo.poll() is not None:
+            raise RuntimeError(f"{nome} terminou ao subir")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{nome} não subiu")
+
+
+def preparar_base(base_dir):
+    """Pasta da API com o código (symlinks): o api.py procura o script em BASE_DIR"""
+    for nome in os.listdir(RAIZ):
+        if nome.endswith(".py"):
+            os.symlink(os.path.abspath(os.path.join(RAIZ, nome)), os.path.join(base_dir, nome))
+
+
+def subir_gunicorn(base_dir, porta, args):
+    env = dict(os.environ, VIDEOBOX_BASE_DIR=base_dir, VIDEOBOX_EXECUTOR=args.executor,
+               VIDEOBOX_CACHE_BYTES="0", VIDEOBOX_MAX_PENDING=str(args.jobs),
+               VIDEOBOX_MAX_CONCURRENT=str(args.simultaneos))
+    comando = [sys.executable, "-m", "gunicorn", "--workers", str(args.workers),
+               "--worker-class", args.worker_class, "--timeout", "600",
+               "--bind", f"127.0.0.1:{porta}", "--log-level", "warning", "api:application"]
+    if args.worker_class == "gthread":
+        comando += ["--threads", str(args.clientes * 2)]
+    elif args.worker_class == "gevent":
+        comando += ["--worker-connections", "1000"]
+    # cwd = base: o log do downloader e o jobs.db ficam na pasta temporária
+    processo = subprocess.Popen(comando, cwd=base_dir, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    esperar(f"http://127.0.0.1:{porta}/api/health", processo, "gunicorn")
+    return processo
+
+
+def rss_da_arvore(pid):
+    """Soma do VmRSS (MB) do processo e de todos os descendentes"""
+    total = 0
+    pendentes = [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        try:
+            with open(f"/proc/{atual}/status") as f:
+                for linha in f:
+                    if linha.startswith("VmRSS:"):
+                        total += int(linha.split()[1])
+            for tarefa in os.listdir(f"/proc/{atual}/task"):
+                with open(f"/proc/{atual}/task/{tarefa}/children") as f:
+                    pendentes.extend(int(filho) for filho in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total / 1024
+
+
+class AmostradorRSS(threading.Thread):
+    def __init__(self, pid, intervalo=0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.intervalo = intervalo
+        self.pico = 0.0
+        self.parar = threading.Event()
+
+    def run(self):
+        while not self.parar.is_set():
+            self.pico = max(self.pico, rss_da_arvore(self.pid))
+            self.parar.wait(self.intervalo)
+
+
+def urls_do_mix(origem, mix, quantidade, args):
+    """URLs únicas por job (nada de cache ou single-flight entre eles)"""
+    modelos = {
+        "mp4": lambda i: f"{origem}/video/clipe{i}.mp4?mb={args.tamanho_mb}",
+        "hls": lambda i: f"{origem}/hls/fluxo{i}/index.m3u8?segmentos={args.segmentos}&kb={args.kb_segmento}",
+        "galeria": lambda i: f"{origem}/erome.com/a/gal{i}?imagens={args.imagens}",
+    }
+    return [modelos[mix[i % len(mix)]](i) for i in range(quantidade)]
+
+
+def rodar_job(api, url, intervalo=0.1):
+    """Envia, acompanha e baixa os arquivos de um job: (sucesso, segundos, bytes)"""
+    inicio = time.perf_counter()
+    resposta = requests.post(f"{api}/api/process", json={"url": url}, timeout=30)
+    resposta.raise_for_status()
+    job_id = resposta.json()["job_id"]
+
+    while True:
+        status = requests.get(f"{api}/api/status/{job_id}", timeout=30).json()
+        if status.get("completed"):
+            break
+        time.sleep(intervalo)
+
+    recebidos = 0
+    for arquivo in status.get("files", []):
+        with requests.get(f"{api}{arquivo['download_url']}", stream=True, timeout=60) as download:
+            download.raise_for_status()
+            for pedaco in download.iter_content(1024 * 1024):
+                recebidos += len(pedaco)
+    sucesso = status["status"] == "completed" and bool(status.get("files"))
+    return sucesso, time.perf_counter() - inicio, recebidos
+
+
+def percentil(valores, p):
+    """Percentil por posição mais próxima (valores ordenados)"""
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, round(p / 100 * len(valores) + 0.5) - 1))
+    return valores[indice]
+
+
+def medir(args):
+    with tempfile.TemporaryDirectory() as base_dir:
+        preparar_base(base_dir)
+
+        porta_midia = porta_livre()
+        midia = subprocess.Popen(
+            [sys.executable, os.path.join(AQUI, "servidor_midia.py"), "--porta", str(porta_midia),
+             "--latencia-ms", str(args.latencia_ms), "--kbps", str(args.kbps)],
+            stdout=subprocess.DEVNULL)
+        gunicorn = None
+        try:
+            origem = f"http://127.0.0.1:{porta_midia}"
+            esperar(f"{origem}/video/aquecimento.mp4?mb=0.01", midia, "servidor de mídia")
+            porta = porta_livre()
+            gunicorn = subir_gunicorn(base_dir, porta, args)
+            api = f"http://127.0.0.1:{porta}"
+
+            # Aquecimento: um job de cada tipo fora da medida (import, pool, extratores)
+            for url in urls_do_mix(origem, args.mix, len(args.mix), args):
+                rodar_job(api, url.replace("/clipe", "/aquece").replace("/fluxo", "/aquece")
+                          .replace("/gal", "/aquece"))
+
+            amostrador = AmostradorRSS(gunicorn.pid)
+            amostrador.start()
+            urls = urls_do_mix(origem, args.mix, args.jobs, args)
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clientes) as clientes:
+                resultados = list(clientes.map(lambda url: rodar_job(api, url), urls))
+            total = time.perf_counter() - inicio
+            amostrador.parar.set()
+            amostrador.join()
+        finally:
+            if gunicorn:
+                gunicorn.terminate()
+                gunicorn.wait()
+            midia.terminate()
+            midia.wait()
+
+    tempos = sorted(segundos for _, segundos, _ in resultados)
+    falhas = sum(1 for sucesso, _, _ in resultados if not sucesso)
+    recebidos = sum(quantidade for _, _, quantidade in resultados)
+    return {
+        "jobs": len(resultados),
+        "falhas": falhas,
+        "jobs_por_s": round((len(resultados) - falhas) / total, 3),
+        "p50_s": round(percentil(tempos, 50), 3),
+        "p95_s": round(percentil(tempos, 95), 3),
+        "p99_s": round(percentil(tempos, 99), 3),
+        "mib_por_s": round(recebidos / 1024 ** 2 / total, 2),
+        "pico_rss_mb": round(amostrador.pico, 1),
+    }
+
+
+def configuracao(args):
+    """Parâmetros que precisam bater para comparar com a baseline"""
+    return {chave: getattr(args, chave) for chave in (
+        "jobs", "clientes", "executor", "workers", "worker_class", "simultaneos", "mix", "tamanho_mb",
+        "segmentos", "kb_segmento", "imagens", "latencia_ms", "kbps")}
+
+
+def comparar(resultado, baseline, tolerancia):
+    """Lista de regressões (métrica pior que a baseline além da tolerância)"""
+    regressoes = []
+    for metrica, maior_melhor in METRICAS.items():
+        antes, agora = baseline.get(metrica), resultado[metrica]
+        if not antes:
+            continue
+        variacao = (agora - antes) / antes
+        if (-variacao if maior_melhor else variacao) > tolerancia:
+            regressoes.append(f"{metrica}: {antes} -> {agora} ({variacao:+.0%})")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=24)
+    parser.add_argument("--clientes", type=int, default=4, help="clientes enviando jobs ao mesmo tempo")
+    parser.add_argument("--executor", default="pool", choices=("pool", "zygote", "subprocess"))
+    parser.add_argument("--workers", type=int, default=1, help="workers do gunicorn")
+    parser.add_argument("--worker-class", default="gthread", choices=("sync", "gthread", "gevent"))
+    parser.add_argument("--simultaneos", type=int, default=2, help="VIDEOBOX_MAX_CONCURRENT")
+    parser.add_argument("--mix", type=lambda texto: texto.split(","), default=["mp4", "hls", "galeria"])
+    parser.add_argument("--tamanho-mb", type=float, default=4)
+    parser.add_argument("--segmentos", type=int, default=8, help="segmentos por playlist HLS")
+    parser.add_argument("--kb-segmento", type=int, default=256)
+    parser.add_argument("--imagens", type=int, default=12, help="imagens por galeria")
+    parser.add_argument("--latencia-ms", type=float, default=20)
+    parser.add_argument("--kbps", type=int, default=0, help="banda por conexão do servidor (0 = sem limite)")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE_PADRAO,
+                        help=f"compara com a baseline (padrão {os.path.relpath(BASELINE_PADRAO, RAIZ)})")
+    parser.add_argument("--salvar-baseline", nargs="?", const=BASELINE_PADRAO)
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="piora aceita (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    print(f"{args.jobs} jobs ({'/'.join(args.mix)}), {args.clientes} clientes, executor {args.executor}, "
+          f"latência {args.latencia_ms:g} ms, banda {f'{args.kbps} KiB/s' if args.kbps else 'sem limite'}")
+    resultado = medir(args)
+    print(f"  jobs/s {resultado['jobs_por_s']:.2f}  falhas {resultado['falhas']}")
+    print(f"  até concluir: p50 {resultado['p50_s']:.2f}s  p95 {resultado['p95_s']:.2f}s  "
+          f"p99 {resultado['p99_s']:.2f}s")
+    print(f"  entregue pela API {resultado['mib_por_s']:.1f} MiB/s  pico de RSS {resultado['pico_rss_mb']:.0f} MB")
+
+    if args.salvar_baseline:
+        os.makedirs(os.path.dirname(args.salvar_baseline), exist_ok=True)
+        with open(args.salvar_baseline, "w") as f:
+            json.dump({"configuracao": configuracao(args), "resultado": resultado}, f, indent=2)
+            f.write("\n")
+        print(f"  baseline gravada em {args.salvar_baseline}")
+
+    if resultado["falhas"]:
+        print(f"FALHA: {resultado['falhas']} job(s) sem sucesso")
+        return 1
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["configuracao"] != configuracao(args):
+            print("  aviso: configuração diferente da baseline, comparação pode não valer")
+        regressoes = comparar(resultado, baseline["resultado"], args.tolerancia)
+        if regressoes:
+            print("REGRESSÃO em relação à baseline:")
+            for linha in regressoes:
+                print(f"  {linha}")
+            return 1
+        print(f"  dentro da baseline (tolerância {args.tolerancia:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Benchmark: extração das imagens de uma galeria (BeautifulSoup vs. HTMLParser)
+
+Compara a varredura antiga (árvore completa do BeautifulSoup + find_all em
+todos os elementos + dedup em lista) com extrair_imagens_galeria, que lê o
+HTML numa passada só. Usa páginas salvas passadas na linha de comando ou,
+sem argumentos, uma galeria sintética no formato do erome.
+
+    python benchmarks/bench_html.py [pagina.html ...] [--galeria ID] [--repeticoes 20]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from universal_downloader_aac import EXTENSOES_IMAGEM, extrair_imagens_galeria  # noqa: E402
+
+
+def pagina_sintetica(galeria_id, imagens=400):
+    """Galeria com scripts, thumbs, posters e links para outros álbuns"""
+    partes = ["<html><head>"]
+    partes += [f'<script>var x{i} = "<div>{i}</div>";</script><meta name="m{i}" content="c">'
+               for i in range(50)]
+    partes.append("</head><body>")
+    for i in range(imagens):
+        src = f"https://s{i % 9}.erome.com/1/{galeria_id}/p{i}.jpg?v=1"
+        partes.append(
+            f'<div class="media-group" id="g{i}"><div class="img" data-src="{src}">'
+            f'<img class="img-front lasyload" data-src="{src}" src="/x.gif">'
+            f'<img class="img-back" data-src="https://s.erome.com/thumbs/{galeria_id}/p{i}.jpg"></div>'
+            f'<video data-poster="https://s.erome.com/{galeria_id}/v{i}.jpg"><source src="v{i}.mp4"></video>'
+            f'<a href="/a/outro{i}" data-id="{i}"><span>álbum {i}</span></a>'
+            f'<p>{"lorem ipsum " * 30}</p></div>'
+        )
+    partes.append("</body></html>")
+    return "".join(partes)
+
+
+def extrair_com_beautifulsoup(html, galeria_id):
+    """Implementação anterior de baixar_imagens_da_pagina (referência)"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    imagens_galeria = []
+    for img in soup.find_all("img", class_=["img-front", "img-back"]):
+        data_src = img.get("data-src")
+        if data_src and galeria_id in data_src:
+            imagens_galeria.append(data_src)
+    for element in soup.find_all():
+        for attr, value in element.attrs.items():
+            if (attr.startswith("data-") and isinstance(value, str) and galeria_id in value and
+                    any(ext in value.lower() for ext in EXTENSOES_IMAGEM) and
+                    "/thumbs/" not in value.lower() and "poster" not in attr.lower()):
+                imagens_galeria.append(value)
+
+    imagens_unicas = []
+    for img in imagens_galeria:
+        if img and img not in imagens_unicas:
+            imagens_unicas.append(img)
+    return imagens_unicas
+
+
+def medir(funcao, html, galeria_id, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao(html, galeria_id)
+    return (time.perf_counter() - inicio) / repeticoes * 1000, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paginas", nargs="*", help="HTML salvos de galerias (ex.: erome.com/a/<id>)")
+    parser.add_argument("--galeria", help="ID da galeria (padrão: tirado de <link rel=canonical> ou 'Ab12Cd')")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.paginas:
+        amostras = []
+        for caminho in args.paginas:
+            with open(caminho, encoding="utf-8", errors="replace") as f:
+                html = f.read()
+            encontrado = re.search(r'erome\.com/a/([^/?"\']+)', html)
+            galeria_id = args.galeria or (encontrado.group(1) if encontrado else None)
+            if not galeria_id:
+                parser.error(f"não achei o ID da galeria em {caminho}; use --galeria")
+            amostras.append((os.path.basename(caminho), html, galeria_id))
+    else:
+        galeria_id = args.galeria or "Ab12Cd"
+        amostras = [("sintética", pagina_sintetica(galeria_id), galeria_id)]
+
+    try:
+        import bs4  # noqa: F401
+        com_referencia = True
+    except ImportError:
+        com_referencia = False
+        print("beautifulsoup4 não instalado: medindo só a extração nova")
+
+    for nome, html, galeria_id in amostras:
+        novo_ms, novo = medir(extrair_imagens_galeria, html, galeria_id, args.repeticoes)
+        linha = f"  {nome} ({len(html) // 1024} KiB, {len(novo)} imagens): HTMLParser {novo_ms:7.1f} ms"
+        if com_referencia:
+            antigo_ms, antigo = medir(extrair_com_beautifulsoup, html, galeria_id, args.repeticoes)
+            assert antigo == novo, "as duas extrações deram resultados diferentes"
+            linha += f"  BeautifulSoup {antigo_ms:7.1f} ms  {antigo_ms / novo_ms:4.1f}x"
+        print(linha)
+
+
+if __name__ == "__main__":
+    main()
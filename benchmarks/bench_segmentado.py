@@ -0,0 +1,92 @@
+"""Benchmark: download numa conexão vs. segmentado (N requisições Range)
+
+Sobe um servidor HTTP local que limita a banda POR CONEXÃO (como muitos
+CDNs fazem) e baixa o mesmo arquivo com baixar_arquivo_simples e com
+baixar_segmentado em 2, 4 e 8 conexões.
+
+    python benchmarks/bench_segmentado.py [--tamanho-mb 32] [--kbps-por-conexao 4096]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import universal_downloader_aac  # noqa: E402
+
+
+def criar_servidor(dados, bytes_por_segundo):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            inicio, fim = 0, len(dados) - 1
+            match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if match:
+                inicio = int(match.group(1))
+                fim = int(match.group(2)) if match.group(2) else fim
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {inicio}-{fim}/{len(dados)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(fim - inicio + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", '"bench"')
+            self.end_headers()
+
+            # Limite de banda por conexão: blocos de 64 KiB espaçados no tempo
+            bloco = 64 * 1024
+            for posicao in range(inicio, fim + 1, bloco):
+                try:
+                    self.wfile.write(dados[posicao:min(posicao + bloco, fim + 1)])
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                time.sleep(bloco / bytes_por_segundo)
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanho-mb", type=int, default=32)
+    parser.add_argument("--kbps-por-conexao", type=int, default=4096)
+    args = parser.parse_args()
+
+    dados = os.urandom(args.tamanho_mb * 1024 * 1024)
+    servidor = criar_servidor(dados, args.kbps_por_conexao * 1024)
+    url = f"http://127.0.0.1:{servidor.server_address[1]}/video.mp4"
+
+    with tempfile.TemporaryDirectory() as pasta:
+        downloader = universal_downloader_aac.MultiSiteDownloader(pasta)
+        downloader.logger.setLevel("WARNING")
+
+        print(f"Arquivo: {args.tamanho_mb} MiB, limite {args.kbps_por_conexao} KiB/s por conexão")
+        base = None
+        for conexoes in (1, 2, 4, 8):
+            destino = Path(pasta) / f"video_{conexoes}.mp4"
+            inicio = time.perf_counter()
+            if conexoes == 1:
+                ok = downloader.baixar_arquivo_simples(url, destino)
+            else:
+                ok = downloader.baixar_segmentado(url, destino, len(dados), conexoes, {})
+            duracao = time.perf_counter() - inicio
+            assert ok and destino.read_bytes() == dados, f"download com {conexoes} conexão(ões) falhou"
+
+            base = base or duracao
+            mib_s = args.tamanho_mb / duracao
+            print(f"  {conexoes} conexão(ões): {duracao:6.2f}s  {mib_s:6.2f} MiB/s  {base / duracao:4.1f}x")
+            destino.unlink()
+
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Servidor local que imita os sites: MP4 progressivo, HLS e galeria de imagens
+
+Tudo é sintético e gerado em memória (nada de rede externa):
+
+    /video/<nome>.mp4?mb=4            MP4 (ftyp + moov/tkhd + mdat), com Range
+    /hls/<nome>/index.m3u8?segmentos=8&kb=256   playlist HLS e os .ts
+    /erome.com/a/<id>?imagens=12      página de galeria (só "erome.com" no caminho)
+    /img/<id>/p<i>.jpg?kb=128         imagens da galeria
+    /ffmpeg/<nome>.mp4?segundos=2     mídia de verdade, gerada pelo ffmpeg
+    /ffmpeg/<nome>.wav?segundos=2     (vídeo sem áudio / áudio PCM), se houver
+
+Latência antes da resposta e banda por conexão são configuráveis, para
+simular CDNs lentos; ?kbps=N em qualquer URL muda a banda só daquela resposta.
+
+    python benchmarks/servidor_midia.py [--porta 8790] [--latencia-ms 20] [--kbps 0]
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import struct
+import subprocess
+import tempfile
+import zlib
+import argparse
+from functools import lru_cache
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BLOCO_ENVIO = 64 * 1024
+
+
+def caixa(tipo, conteudo):
+    """Box MP4: tamanho (32 bits) + tipo + conteúdo"""
+    return struct.pack(">I4s", 8 + len(conteudo), tipo) + conteudo
+
+
+def caixa_completa(tipo, versao, conteudo):
+    """Full box: versão + flags antes do conteúdo"""
+    return caixa(tipo, struct.pack(">I", versao << 24) + conteudo)
+
+
+def matriz_identidade():
+    return struct.pack(">9I", 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+
+
+def trilha(track_id, duracao, largura=0, altura=0, handler=b"vide", codec=b"avc1"):
+    """trak com tkhd (dimensões), mdhd (duração) e hdlr/stsd (tipo e codec)"""
+    tkhd = caixa_completa(b"tkhd", 0, struct.pack(
+        ">IIIII8xhhh2x", 0, 0, track_id, 0, duracao, 0, 0, 0x100 if handler == b"soun" else 0
+    ) + matriz_identidade() + struct.pack(">II", largura << 16, altura << 16))
+    mdhd = caixa_completa(b"mdhd", 0, struct.pack(">IIIIHH", 0, 0, 1000, duracao, 0x55c4, 0))
+    hdlr = caixa_completa(b"hdlr", 0, struct.pack(">I4s12x", 0, handler) + b"\0")
+    entrada = caixa(codec, b"\0" * 6 + struct.pack(">H", 1) + b"\0" * 70)
+    stsd = caixa_completa(b"stsd", 0, struct.pack(">I", 1) + entrada)
+    minf = caixa(b"minf", caixa(b"stbl", stsd))
+    return caixa(b"trak", tkhd + caixa(b"mdia", mdhd + hdlr + minf))
+
+
+@lru_cache(maxsize=32)
+def mp4_sintetico(nome, tamanho, largura=1280, altura=720, duracao_ms=60000):
+    """MP4 válido na estrutura (moov antes do mdat), com payload pseudoaleatório"""
+    ftyp = caixa(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2avc1mp41")
+    mvhd = caixa_completa(b"mvhd", 0, struct.pack(">IIII", 0, 0, 1000, duracao_ms)
+                          + struct.pack(">IH10x", 0x10000, 0x100) + matriz_identidade()
+                          + b"\0" * 24 + struct.pack(">I", 3))
+    moov = caixa(b"moov", mvhd + trilha(1, duracao_ms, largura, altura)
+                 + trilha(2, duracao_ms, handler=b"soun", codec=b"mp4a"))
+    cabecalho = ftyp + moov
+    resto = max(0, tamanho - len(cabecalho) - 8)
+    return cabecalho + struct.pack(">I4s", 8 + resto, b"mdat") + bytes_sinteticos(nome, resto)
+
+
+def bytes_sinteticos(semente, tamanho):
+    """Bytes determinísticos (e pouco compressíveis) a partir de um nome"""
+    bloco = b"".join(zlib.crc32(f"{semente}:{i}".encode()).to_bytes(4, "big") for i in range(4096))
+    vezes, sobra = divmod(tamanho, len(bloco))
+    return bloco * vezes + bloco[:sobra]
+
+
+@lru_cache(maxsize=256)
+def segmento_ts(nome, tamanho):
+    """Segmento MPEG-TS sintético: pacotes de 188 bytes com o byte de sync"""
+    pacotes = max(1, tamanho // 188)
+    corpo = bytes_sinteticos(nome, pacotes * 187)
+    return b"".join(b"\x47" + corpo[i * 187:(i + 1) * 187] for i in range(pacotes))
+
+
+@lru_cache(maxsize=256)
+def imagem_jpeg(nome, tamanho):
+    return b"\xff\xd8\xff\xe0" + bytes_sinteticos(nome, max(0, tamanho - 6)) + b"\xff\xd9"
+
+
+@lru_cache(maxsize=8)
+def midia_ffmpeg(ext, segundos):
+    """Vídeo MPEG-4 sem áudio (mp4) ou áudio PCM (wav) gerado pelo ffmpeg,
+    para testar o merge e a conversão AAC; None sem ffmpeg"""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+    if ext == "mp4":
+        argumentos = ["-f", "lavfi", "-i", f"testsrc=size=320x240:rate=25:duration={segundos}",
+                      "-c:v", "mpeg4", "-an", "-movflags", "+faststart"]
+    else:
+        argumentos = ["-f", "lavfi", "-i", f"sine=frequency=440:duration={segundos}", "-c:a", "pcm_s16le"]
+    with tempfile.TemporaryDirectory() as pasta:
+        saida = os.path.join(pasta, f"midia.{ext}")
+        subprocess.run([ffmpeg, "-hide_banner", "-nostdin", "-loglevel", "error", *argumentos, saida],
+                       check=True, capture_output=True)
+        with open(saida, "rb") as f:
+            return f.read()
+
+
+def pagina_galeria(galeria_id, imagens):
+    """HTML parecido com o do erome: imagens principais, thumbs e posters (ignorados)"""
+    linhas = ["<html><head><title>Galeria</title></head><body>"]
+    for i in range(imagens):
+        linhas.append(f'<div class="media-group"><img class="img-front" '
+                      f'data-src="/img/{galeria_id}/p{i}.jpg">'
+                      f'<img class="thumb" data-src="/img/{galeria_id}/thumbs/p{i}.jpg"></div>')
+    linhas.append(f'<video data-poster="/img/{galeria_id}/poster.jpg"></video>')
+    linhas.append("</body></html>")
+    return "\n".join(linhas).encode()
+
+
+def criar_handler(latencia, bytes_por_segundo):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_HEAD(self):
+            self.do_GET(corpo=False)
+
+        def do_GET(self, corpo=True):
+            partes = urlsplit(self.path)
+            parametros = {k: v[0] for k, v in parse_qs(partes.query).items()}
+            if latencia:
+                time.sleep(latencia)
+            self.bytes_por_segundo = float(parametros.get("kbps", bytes_por_segundo / 1024)) * 1024
+
+            if m := re.fullmatch(r"/video/([\w-]+)\.mp4", partes.path):
+                tamanho = int(float(parametros.get("mb", 4)) * 1024 * 1024)
+                return self.responder(mp4_sintetico(m.group(1), tamanho), "video/mp4", corpo)
+            if m := re.fullmatch(r"/hls/([\w-]+)/index\.m3u8", partes.path):
+                segmentos = int(parametros.get("segmentos", 8))
+                kb = int(parametros.get("kb", 256))
+                linhas = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4",
+                          "#EXT-X-MEDIA-SEQUENCE:0"]
+                for i in range(segmentos):
+                    linhas += ["#EXTINF:4.0,", f"seg{i}.ts?kb={kb}"]
+                linhas.append("#EXT-X-ENDLIST")
+                return self.responder("\n".join(linhas).encode(), "application/vnd.apple.mpegurl", corpo)
+            if m := re.fullmatch(r"/hls/([\w-]+)/seg(\d+)\.ts", partes.path):
+                tamanho = int(parametros.get("kb", 256)) * 1024
+                return self.responder(segmento_ts(f"{m.group(1)}-{m.group(2)}", tamanho), "video/mp2t", corpo)
+            if m := re.fullmatch(r"/erome\.com/a/([\w-]+)/?", partes.path):
+                imagens = int(parametros.get("imagens", 12))
+                return self.responder(pagina_galeria(m.group(1), imagens), "text/html; charset=utf-8", corpo)
+            if m := re.fullmatch(r"/img/([\w-]+)/(?:thumbs/)?([\w-]+)\.jpg", partes.path):
+                tamanho = int(parametros.get("kb", 128)) * 1024
+                return self.responder(imagem_jpeg(f"{m.group(1)}/{m.group(2)}", tamanho), "image/jpeg", corpo)
+            if m := re.fullmatch(r"/ffmpeg/[\w-]+\.(mp4|wav)", partes.path):
+                dados = midia_ffmpeg(m.group(1), float(parametros.get("segundos", 2)))
+                if dados is None:
+                    return self.send_error(501, "ffmpeg não instalado")
+                return self.responder(dados, "video/mp4" if m.group(1) == "mp4" else "audio/wav", corpo)
+
+            self.send_error(404)
+
+        def responder(self, dados, tipo, corpo=True):
+            """200 ou 206 (Range), com a banda limitada por conexão"""
+            inicio, fim = 0, len(dados) - 1
+            faixa = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if faixa:
+                inicio = int(faixa.group(1))
+                fim = min(int(faixa.group(2) or fim), fim)
+                if inicio > fim:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(dados)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {inicio}-{fim}/{len(dados)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(fim - inicio + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", f'"{zlib.crc32(dados[:4096])}-{len(dados)}"')
+            self.end_headers()
+            if not corpo:
+                return
+
+            vista = memoryview(dados)[inicio:fim + 1]
+            comeco = time.perf_counter()
+            enviados = 0
+            try:
+                while enviados < len(vista):
+                    bloco = vista[enviados:enviados + BLOCO_ENVIO]
+                    self.wfile.write(bloco)
+                    enviados += len(bloco)
+                    if self.bytes_por_segundo:
+                        atraso = enviados / self.bytes_por_segundo - (time.perf_counter() - comeco)
+                        if atraso > 0:
+                            time.sleep(atraso)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+class ServidorMidia(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Cliente que fecha a conexão no meio (yt-dlp, fim do benchmark) não é erro
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def criar_servidor(porta=0, latencia_ms=0, kbps=0):
+    """Servidor em 127.0.0.1 (porta 0 = livre); chame serve_forever()"""
+    handler = criar_handler(latencia_ms / 1000, kbps * 1024)
+    return ServidorMidia(("127.0.0.1", porta), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--porta", type=int, default=8790)
+    parser.add_argument("--latencia-ms", type=float, default=20)
+    parser.add_argument("--kbps", type=int, default=0, help="banda por conexão em KiB/s (0 = sem limite)")
+    args = parser.parse_args()
+
+    servidor = criar_servidor(args.porta, args.latencia_ms, args.kbps)
+    print(f"Servindo em http://127.0.0.1:{servidor.server_address[1]}", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import os
+import hashlib
+import threading
+
+from job_store import sqlite_connect, off_hub
+
+# Bytes do começo e do fim usados no hash parcial
+PARTIAL_BYTES = 64 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def new_hasher():
+    """Hash de conteúdo do índice (BLAKE2b, 256 bits)"""
+    return hashlib.blake2b(digest_size=32)
+
+
+def hash_file(path, hasher=None):
+    """Alimenta o hasher com o arquivo inteiro, em blocos; devolve o hasher"""
+    hasher = hasher or new_hasher()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher
+
+
+def partial_hash(path, size):
+    """Hash do tamanho + primeiros e últimos PARTIAL_BYTES (no máximo 128 KiB lidos)"""
+    hasher = new_hasher()
+    hasher.update(str(size).encode())
+    with open(path, 'rb') as f:
+        hasher.update(f.read(PARTIAL_BYTES))
+        if size > 2 * PARTIAL_BYTES:
+            f.seek(-PARTIAL_BYTES, os.SEEK_END)
+        hasher.update(f.read(PARTIAL_BYTES))
+    return hasher.hexdigest()
+
+
+class DedupIndex:
+    """Índice persistente de conteúdo dos arquivos baixados
+
+    Um arquivo novo só é comparado com os de mesmo tamanho; entre esses, o
+    hash parcial (começo + fim) descarta quase todos, e o hash completo só é
+    calculado quando o parcial colide (ou já veio pronto do download). Os
+    hashes ficam guardados, então cada arquivo é lido no máximo uma vez.
+    Sem caminho, o índice fica em memória (só vale para o processo). Pode
+    ser usado por várias threads (listas processadas em paralelo).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite_connect(path or ':memory:', check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                partial_hash TEXT,
+                full_hash TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_size ON files (size)")
+
+    def register(self, path, full_hash=None):
+        """Inclui (ou atualiza) um arquivo no índice sem procurar duplicatas"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        self._execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, partial_hash, full_hash) "
+            "VALUES (?, ?, ?, NULL, ?)",
+            (path, stat.st_size, stat.st_mtime_ns, full_hash)
+        )
+
+    def forget(self, path):
+        self._execute("DELETE FROM files WHERE path = ?", (os.path.abspath(path),))
+
+    @off_hub
+    def forget_tree(self, directory):
+        """Tira do índice os arquivos de uma pasta apagada (ex.: job expirado)"""
+        prefix = os.path.join(os.path.abspath(directory), '')
+        # Faixa da chave primária: [prefixo, prefixo com o último caractere + 1)
+        cursor = self._execute("DELETE FROM files WHERE path >= ? AND path < ?",
+                               (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+        return cursor.rowcount
+
+    def find_duplicate(self, path, full_hash=None):
+        """Registra o arquivo e devolve o caminho de outro com o mesmo conteúdo (ou None)
+
+        `full_hash` é o hash calculado durante o download, se houver.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        size = stat.st_size
+        self.register(path, full_hash)
+
+        candidates = []
+        for other, mtime_ns, other_partial, other_full in self._execute(
+            "SELECT path, mtime_ns, partial_hash, full_hash FROM files WHERE size = ? AND path != ?",
+            (size, path)
+        ).fetchall():
+            try:
+                other_stat = os.stat(other)
+            except OSError:
+                # Apagado por fora (ex.: job expirado): sai do índice
+                self.forget(other)
+                continue
+            if other_stat.st_size != size or other_stat.st_mtime_ns != mtime_ns:
+                self.forget(other)
+                continue
+            if os.path.samestat(stat, other_stat):
+                # Já é um hardlink do mesmo conteúdo
+                return other
+            candidates.append((other, other_partial, other_full))
+
+        if not candidates:
+            return None
+
+        partial = self._store_hash(path, 'partial_hash', partial_hash(path, size))
+        for other, other_partial, other_full in candidates:
+            if other_partial is None:
+                other_partial = self._store_hash(other, 'partial_hash', partial_hash(other, size))
+            if other_partial != partial:
+                continue
+
+            if full_hash is None:
+                full_hash = self._store_hash(path, 'full_hash', hash_file(path).hexdigest())
+            if other_full is None:
+                other_full = self._store_hash(other, 'full_hash', hash_file(other).hexdigest())
+            if other_full == full_hash:
+                return other
+        return None
+
+    def link_duplicate(self, path, original):
+        """Troca `path` por um hardlink de `original` (mesmo conteúdo)
+
+        A troca é atômica (o nome nunca deixa de existir) e o índice herda os
+        hashes do original. Levanta OSError se o hardlink não for possível.
+        """
+        path, original = os.path.abspath(path), os.path.abspath(original)
+        temporary = path + '.dedup'
+        os.link(original, temporary)
+        os.replace(temporary, path)
+        self._execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, partial_hash, full_hash) "
+            "SELECT ?, size, mtime_ns, partial_hash, full_hash FROM files WHERE path = ?",
+            (path, original)
+        )
+
+    def _store_hash(self, path, column, value):
+        self._execute(f"UPDATE files SET {column} = ? WHERE path = ?", (value, path))
+        return value
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def close(self):
+        self._conn.close()
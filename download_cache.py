@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from job_store import sqlite_connect, off_hub
+
+# Parâmetros de rastreamento que não mudam o conteúdo da URL
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'igshid', 'si', 'feature', 'ref', 'ref_src', 'ref_url',
+    'mc_cid', 'mc_eid', 'spm',
+}
+TRACKING_PREFIXES = ('utm_',)
+
+# Extratores genéricos: o "id" vem do nome do arquivo e não é único entre sites
+GENERIC_EXTRACTORS = ('Generic',)
+
+
+def normalize_url(url):
+    """Normaliza a URL: host em minúsculas, sem www./m., sem rastreamento e fragmento"""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    for prefix in ('www.', 'm.', 'mobile.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if parts.port:
+        host = f"{host}:{parts.port}"
+
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    )
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit(((parts.scheme or 'https').lower(), host, path, urlencode(query), ''))
+
+
+# Extratores que já reconheceram URLs de cada host ([] = nenhum): o próximo
+# job do mesmo host testa só eles, sem varrer os ~1800 _VALID_URL do yt-dlp
+MAX_MEMO_HOSTS = 1024
+_extractors_by_host = {}
+
+
+def _scan_extractors(url):
+    """Primeiro extrator (não genérico) que aceita a URL, na ordem do yt-dlp"""
+    from yt_dlp.extractor import gen_extractor_classes
+
+    for ie in gen_extractor_classes():
+        if ie.ie_key() not in GENERIC_EXTRACTORS and ie.suitable(url):
+            return ie
+    return None
+
+
+def resolve_url_id(url):
+    """(extrator, id) a partir só da URL, sem acessar a rede (None se não der)
+
+    Cobre links curtos e hosts móveis que o próprio extrator reconhece
+    (ex.: youtu.be/ID e m.youtube.com/watch?v=ID viram ('Youtube', ID)).
+    Um host sem extrator próprio fica sem chave aqui; o cache ainda acha o
+    download pela chave do info dict, depois da extração.
+    """
+    host = (urlsplit(url).hostname or '').lower()
+    known = _extractors_by_host.get(host)
+    ie = next((ie for ie in known or () if ie.suitable(url)), None)
+    if ie is None and known != []:
+        ie = _scan_extractors(url)
+        if len(_extractors_by_host) >= MAX_MEMO_HOSTS:
+            _extractors_by_host.clear()
+        _extractors_by_host[host] = (known or []) + ([ie] if ie else [])
+    if ie is None:
+        return None
+    video_id = ie.get_temp_id(url)
+    return (ie.ie_key(), video_id) if video_id else None
+
+
+def make_key(extractor, video_id, format_spec):
+    return f"{extractor}:{video_id}:{format_spec}"
+
+
+class DownloadCache:
+    """Cache de downloads endereçado por extrator + id do vídeo + formato
+
+    Os arquivos ficam em <root>/objects/<hash da chave>/ e são ligados por
+    hardlink nas pastas dos jobs (cópia se o sistema de arquivos não deixar).
+    O índice em SQLite guarda tamanho e último uso para a evicção LRU por
+    orçamento de bytes.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, 'objects')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._db_path = os.path.join(root, 'index.db')
+        self._local = threading.local()
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key_hash TEXT PRIMARY KEY,
+                key TEXT NOT NULL,
+                files TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._connect().execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite_connect(self._db_path)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _hash(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+    def key_for_url(self, url, format_spec):
+        """Chave calculada sem rede (extrator conhecido) ou None"""
+        resolved = resolve_url_id(url)
+        if not resolved:
+            return None
+        return make_key(resolved[0], resolved[1], format_spec)
+
+    def key_for_info(self, info, format_spec):
+        """Chave a partir do info dict já extraído pelo yt-dlp"""
+        extractor = info.get('extractor_key') or info.get('ie_key')
+        video_id = info.get('id')
+        if not extractor or not video_id:
+            return None
+        if extractor in GENERIC_EXTRACTORS:
+            video_id = normalize_url(info.get('webpage_url') or info.get('original_url') or video_id)
+        return make_key(extractor, video_id, format_spec)
+
+    @off_hub
+    def materialize(self, key, dest_dir):
+        """Liga os arquivos da entrada em dest_dir; devolve os nomes ou None"""
+        key_hash = self._hash(key)
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT files FROM entries WHERE key_hash = ?", (key_hash,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        entry_dir = os.path.join(self.objects_dir, key_hash)
+        names = json.loads(row[0])
+        if not all(os.path.exists(os.path.join(entry_dir, name)) for name in names):
+            # Entrada corrompida (ex.: apagada por fora): descarta
+            self._remove(key_hash)
+            return None
+
+        os.makedirs(dest_dir, exist_ok=True)
+        for name in names:
+            dest = os.path.join(dest_dir, name)
+            if not os.path.exists(dest):
+                link_or_copy(os.path.join(entry_dir, name), dest)
+
+        conn.execute(
+            "UPDATE entries SET last_used = ?, hits = hits + 1 WHERE key_hash = ?",
+            (time.time(), key_hash)
+        )
+        return names
+
+    @off_hub
+    def store(self, key, paths):
+        """Guarda os arquivos de um download concluído e aplica o orçamento"""
+        paths = [p for p in map(str, paths) if os.path.isfile(p)]
+        if not paths or self.max_bytes <= 0:
+            return False
+
+        key_hash = self._hash(key)
+        entry_dir = os.path.join(self.objects_dir, key_hash)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for path in paths:
+            link_or_copy(path, os.path.join(tmp_dir, os.path.basename(path)))
+
+        conn = self._connect()
+        if os.path.isdir(entry_dir) and conn.execute(
+            "SELECT 1 FROM entries WHERE key_hash = ?", (key_hash,)
+        ).fetchone() is None:
+            # Sobra de um store interrompido antes de gravar o índice
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Outro job guardou a mesma chave antes
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+
+        names = [os.path.basename(p) for p in paths]
+        size = sum(os.path.getsize(p) for p in paths)
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key_hash, key, files, size, created_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key_hash, key, json.dumps(names), size, now, now)
+        )
+        self.evict()
+        return True
+
+    @off_hub
+    def evict(self):
+        """Remove as entradas menos usadas até caber no orçamento de bytes"""
+        conn = self._connect()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        for key_hash, size in conn.execute(
+            "SELECT key_hash, size FROM entries ORDER BY last_used ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._remove(key_hash)
+            total -= size
+            removed += 1
+        return removed
+
+    def _remove(self, key_hash):
+        self._connect().execute("DELETE FROM entries WHERE key_hash = ?", (key_hash,))
+        shutil.rmtree(os.path.join(self.objects_dir, key_hash), ignore_errors=True)
+
+    @off_hub
+    def stats(self):
+        entries, size, hits = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM entries"
+        ).fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "hits": hits}
+
+
+def link_or_copy(src, dest):
+    """Hardlink (sem duplicar bytes no disco) ou cópia entre sistemas de arquivos"""
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
@@ -0,0 +1,211 @@
+import os
+import time
+import fcntl
+import heapq
+import shutil
+import threading
+
+from job_store import ACTIVE_STATUSES
+
+EVICTION_REASONS = ('ttl', 'disk', 'orphan')
+
+
+def disk_usage_percent(path):
+    usage = shutil.disk_usage(path)
+    return (usage.total - usage.free) * 100.0 / usage.total if usage.total else 0.0
+
+
+def reclaimable_bytes(path):
+    """Bytes que somem do disco ao apagar a pasta (hardlinks compartilhados não contam)"""
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                stat = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            if stat.st_nlink == 1:
+                total += stat.st_size
+    return total
+
+
+class Janitor:
+    """Limpeza das pastas de jobs em segundo plano
+
+    Os jobs entram num heap de expiração (created_at + ttl) ao serem
+    criados; a thread retira do topo os vencidos, sem varrer o job store a
+    cada rodada. Se o disco passar de `high_water` (% usado), apaga os jobs
+    baixados há mais tempo (LRU por last_download) até voltar a `low_water`.
+    Pastas sendo servidas ficam protegidas por flock compartilhado; a
+    evicção só apaga com o lock exclusivo. Com `dedup`, os arquivos da pasta
+    apagada saem também do índice de conteúdo.
+    """
+
+    def __init__(self, job_store, downloads_dir, ttl=3600, high_water=90.0, low_water=80.0,
+                 interval=60.0, resync_interval=600.0, dedup=None):
+        self.job_store = job_store
+        self.dedup = dedup
+        self.downloads_dir = downloads_dir
+        self.ttl = ttl
+        self.high_water = high_water
+        self.low_water = min(low_water, high_water)
+        self.interval = interval
+        self.resync_interval = resync_interval
+        self.evictions = dict.fromkeys(EVICTION_REASONS, 0)
+        self.bytes_reclaimed = 0
+        self.skipped_in_use = 0
+        self.last_run = None
+        self._heap = []
+        self._tracked = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def track(self, job_id, expires_at):
+        """Agenda a verificação de expiração do job"""
+        with self._lock:
+            if job_id not in self._tracked:
+                self._tracked.add(job_id)
+                heapq.heappush(self._heap, (expires_at, job_id))
+
+    def lease(self, job_id):
+        """Protege a pasta do job enquanto um arquivo é servido; devolve a função que libera"""
+        self.job_store.update(job_id, last_download=time.time())
+        try:
+            fd = os.open(os.path.join(self.downloads_dir, job_id), os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            return lambda: None
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        return lambda: os.close(fd)
+
+    def evict(self, job_id, reason):
+        """Apaga o job e a pasta (e os itens, se for lote); False se ativo ou em uso"""
+        job = self.job_store.get(job_id)
+        if job is not None and job["status"] in ACTIVE_STATUSES:
+            return False
+        for child_id in (job or {}).get("children", []):
+            if not self.evict(child_id, reason):
+                return False
+
+        job_dir = os.path.join(self.downloads_dir, job_id)
+        try:
+            fd = os.open(job_dir, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            fd = None
+            if job is None:
+                # Já apagado (ex.: pelo TTL, antes do lote)
+                return True
+        try:
+            if fd is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    self.skipped_in_use += 1
+                    return False
+            reclaimed = reclaimable_bytes(job_dir) if fd is not None else 0
+            self.job_store.delete(job_id)
+            shutil.rmtree(job_dir, ignore_errors=True)
+            if self.dedup is not None:
+                self.dedup.forget_tree(job_dir)
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+        self.evictions[reason] += 1
+        self.bytes_reclaimed += reclaimed
+        return True
+
+    def expire(self, now=None):
+        """Evicção por TTL: retira do heap os jobs vencidos"""
+        now = now or time.time()
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now:
+                    return
+                _, job_id = heapq.heappop(self._heap)
+                self._tracked.discard(job_id)
+
+            job = self.job_store.get(job_id)
+            if job is None:
+                continue
+            # Ativo (ex.: item de lote na fila) ou sendo servido: olha de novo depois
+            if job["status"] in ACTIVE_STATUSES or not self.evict(job_id, 'ttl'):
+                self.track(job_id, now + self.interval)
+
+    def enforce_disk(self):
+        """Evicção por disco: LRU por último download acima do high-water mark"""
+        if disk_usage_percent(self.downloads_dir) < self.high_water:
+            return
+        candidates = sorted(
+            (job.get("last_download") or job.get("created_at", 0), job_id)
+            for job_id, job in self.job_store.finished()
+            if job.get("kind") != "batch"
+        )
+        for _, job_id in candidates:
+            if disk_usage_percent(self.downloads_dir) <= self.low_water:
+                return
+            self.evict(job_id, 'disk')
+
+    def resync(self):
+        """Agenda os jobs de antes do restart e apaga o que sobrou de jobs
+        interrompidos (pastas sem job, info dicts e os cookies ao lado)"""
+        for job_id, job in self.job_store.finished():
+            self.track(job_id, job.get("created_at", 0) + self.ttl)
+
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.downloads_dir):
+            path = os.path.join(self.downloads_dir, name)
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+            except OSError:
+                continue
+            if os.path.isdir(path):
+                if self.job_store.get(name) is None:
+                    self.evict(name, 'orphan')
+            elif name.endswith(('.info.json', '.info.json.cookies')) or (
+                    '.info.json.' in name and name.endswith('.tmp')):
+                # Info dict, cookies da extração ou temporário de um job
+                # interrompido antes de limpar
+                self.bytes_reclaimed += os.path.getsize(path)
+                os.remove(path)
+                self.evictions['orphan'] += 1
+
+    def run_once(self, resync=False):
+        if resync:
+            self.resync()
+        self.expire()
+        self.enforce_disk()
+        self.last_run = time.time()
+
+    def _loop(self):
+        last_resync = 0
+        while True:
+            resync = time.time() - last_resync >= self.resync_interval
+            try:
+                self.run_once(resync)
+            except Exception as e:
+                print(f"Erro na limpeza de jobs: {e}")
+            if resync:
+                last_resync = time.time()
+            time.sleep(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def stats(self):
+        with self._lock:
+            scheduled = len(self._heap)
+        return {
+            "ttl": self.ttl,
+            "disk_usage_percent": round(disk_usage_percent(self.downloads_dir), 1),
+            "high_water": self.high_water,
+            "low_water": self.low_water,
+            "scheduled": scheduled,
+            "evictions": dict(self.evictions),
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "skipped_in_use": self.skipped_in_use,
+            "last_run": self.last_run,
+        }
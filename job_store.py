@@ -0,0 +1,358 @@
+import os
+import sys
+import json
+import time
+import socket
+import functools
+import sqlite3
+import threading
+
+ACTIVE_STATUSES = ('queued', 'processing')
+
+
+def process_start_time(pid):
+    """Início do processo em ticks desde o boot (/proc), ou None fora do Linux
+
+    Depois de um restart do container o hostname e os pids baixos (os dos
+    workers do gunicorn) se repetem; o instante de início do processo não.
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Campo 22 do stat; o nome (campo 2, entre parênteses) pode ter espaços
+    return stat.rsplit(')', 1)[1].split()[19]
+
+
+def current_owner():
+    """Dono de um job: o processo que o tem na fila / em execução
+    (host:pid:início, para um pid reaproveitado não passar pelo dono antigo)"""
+    pid = os.getpid()
+    return f"{socket.gethostname()}:{pid}:{process_start_time(pid) or ''}"
+
+
+def owner_is_alive(owner):
+    """Verifica se o processo dono de um job ainda existe nesta máquina"""
+    try:
+        host, pid, *started = owner.split(':')
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        return False
+
+    # Outra máquina/container (ex.: redeploy): o processo antigo não existe mais
+    if host != socket.gethostname():
+        return False
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    # Mesmo pid, outro processo (restart do container com o mesmo hostname)
+    started = started[0] if started else ''
+    current = process_start_time(pid)
+    return not (started and current and current != started)
+
+
+def gevent_threadpool():
+    """Threadpool do hub do gevent, se o processo foi monkey-patched e esta é a
+    thread do hub; None fora do gevent ou já dentro de uma thread do pool"""
+    if 'gevent' not in sys.modules:
+        return None
+    from gevent import monkey, get_hub
+    if not monkey.is_module_patched('threading'):
+        return None
+    # Com o patch, get_ident() é o da greenlet; o id nativo é o da thread do SO
+    if threading.get_native_id() != threading.main_thread().native_id:
+        return None
+    return get_hub().threadpool
+
+
+def off_hub(method):
+    """Roda a chamada ao SQLite no threadpool do gevent
+
+    O sqlite3 espera por locks (busy_timeout) e pelo disco sem ceder ao hub:
+    no worker gevent, uma escrita concorrente pararia todas as conexões.
+    Numa thread do pool a espera só ocupa aquela thread; fora do gevent a
+    chamada é direta.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        pool = gevent_threadpool()
+        if pool is None:
+            return method(*args, **kwargs)
+        return pool.apply(method, args, kwargs)
+    return wrapper
+
+
+def sqlite_connect(path, check_same_thread=True):
+    """Abre uma conexão SQLite em modo WAL (autocommit, espera por locks)"""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+class JobStore:
+    """Interface do armazenamento de jobs"""
+
+    def create(self, job_id, job):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def get_many(self, job_ids):
+        """Vários jobs numa consulta só: {job_id: job}, sem os que não existem"""
+        raise NotImplementedError
+
+    def update(self, job_id, **fields):
+        raise NotImplementedError
+
+    def delete(self, job_id):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def create_or_follow(self, job_id, job, url_key):
+        """Cria o job; se já houver um líder ativo com a mesma URL normalizada,
+        o novo job passa a segui-lo. Devolve o id do líder ou None."""
+        raise NotImplementedError
+
+    def followers(self, leader_id):
+        """Jobs que seguem o líder: [(job_id, job)]"""
+        raise NotImplementedError
+
+    def finished(self):
+        """Jobs que não estão mais ativos: [(job_id, job)]"""
+        raise NotImplementedError
+
+    def claim_orphans(self, owner):
+        """Assume jobs ativos cujo dono morreu; devolve [(job_id, job)]"""
+        return []
+
+
+class MemoryJobStore(JobStore):
+    """Jobs num dict do processo (um único worker, nada sobrevive a restart)"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, job):
+        with self._lock:
+            self._jobs[job_id] = dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def get_many(self, job_ids):
+        with self._lock:
+            return {job_id: dict(self._jobs[job_id]) for job_id in job_ids if job_id in self._jobs}
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id not in self._jobs:
+                return False
+            self._jobs[job_id].update(fields)
+            return True
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def count(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def create_or_follow(self, job_id, job, url_key):
+        with self._lock:
+            leader_id = next((
+                other_id for other_id, other in self._jobs.items()
+                if other.get("url_key") == url_key and not other.get("follows")
+                and other.get("status") in ACTIVE_STATUSES
+            ), None)
+            self._jobs[job_id] = dict(job, url_key=url_key, follows=leader_id)
+            return leader_id
+
+    def followers(self, leader_id):
+        with self._lock:
+            return [(job_id, dict(job)) for job_id, job in self._jobs.items()
+                    if job.get("follows") == leader_id]
+
+    def finished(self):
+        with self._lock:
+            return [(job_id, dict(job)) for job_id, job in self._jobs.items()
+                    if job.get("status") not in ACTIVE_STATUSES]
+
+
+class SQLiteJobStore(JobStore):
+    """Jobs num SQLite em modo WAL: sobrevivem a restart e redeploy do worker
+
+    A fila e os limites continuam sendo do processo (um worker por instância);
+    o arquivo guarda o estado para o worker seguinte retomar os jobs ativos.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                owner TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+
+    def _connect(self):
+        """Uma conexão por thread e por processo (conexões não sobrevivem a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite_connect(self.path)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    @off_hub
+    def create(self, job_id, job, conn=None):
+        now = time.time()
+        (conn or self._connect()).execute(
+            "INSERT INTO jobs (job_id, status, owner, created_at, updated_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, job.get("status", "queued"), current_owner(),
+             job.get("created_at", now), now, json.dumps(job))
+        )
+
+    @off_hub
+    def get(self, job_id):
+        row = self._connect().execute(
+            "SELECT data FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @off_hub
+    def get_many(self, job_ids):
+        # A lista vai como um array JSON: sem limite de parâmetros do SQLite
+        rows = self._connect().execute(
+            "SELECT job_id, data FROM jobs WHERE job_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(job_ids)),)
+        ).fetchall()
+        return {job_id: json.loads(data) for job_id, data in rows}
+
+    @off_hub
+    def update(self, job_id, **fields):
+        conn = self._connect()
+        # BEGIN IMMEDIATE: leitura + escrita atômicas entre processos
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return False
+
+            job = json.loads(row[0])
+            job.update(fields)
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, data = ? WHERE job_id = ?",
+                (job.get("status", "queued"), time.time(), json.dumps(job), job_id)
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @off_hub
+    def delete(self, job_id):
+        self._connect().execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    @off_hub
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    @off_hub
+    def create_or_follow(self, job_id, job, url_key):
+        conn = self._connect()
+        placeholders = ','.join('?' * len(ACTIVE_STATUSES))
+        # Busca do líder + inserção na mesma transação: duas requisições não
+        # conseguem virar líderes da mesma URL ao mesmo tempo
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT job_id FROM jobs WHERE status IN ({placeholders}) "
+                "AND json_extract(data, '$.url_key') = ? "
+                "AND json_extract(data, '$.follows') IS NULL "
+                "ORDER BY created_at LIMIT 1",
+                (*ACTIVE_STATUSES, url_key)
+            ).fetchone()
+            leader_id = row[0] if row else None
+            self.create(job_id, dict(job, url_key=url_key, follows=leader_id), conn)
+            conn.execute("COMMIT")
+            return leader_id
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @off_hub
+    def followers(self, leader_id):
+        rows = self._connect().execute(
+            "SELECT job_id, data FROM jobs WHERE json_extract(data, '$.follows') = ?",
+            (leader_id,)
+        ).fetchall()
+        return [(job_id, json.loads(data)) for job_id, data in rows]
+
+    @off_hub
+    def finished(self):
+        placeholders = ','.join('?' * len(ACTIVE_STATUSES))
+        rows = self._connect().execute(
+            f"SELECT job_id, data FROM jobs WHERE status NOT IN ({placeholders})",
+            ACTIVE_STATUSES
+        ).fetchall()
+        return [(job_id, json.loads(data)) for job_id, data in rows]
+
+    @off_hub
+    def claim_orphans(self, owner):
+        conn = self._connect()
+        placeholders = ','.join('?' * len(ACTIVE_STATUSES))
+        rows = conn.execute(
+            f"SELECT job_id, owner FROM jobs WHERE status IN ({placeholders})",
+            ACTIVE_STATUSES
+        ).fetchall()
+
+        claimed = []
+        for job_id, old_owner in rows:
+            # Num reload do gunicorn o worker antigo termina os seus jobs
+            # enquanto o novo sobe: só os de dono morto são retomados
+            if old_owner == owner or owner_is_alive(old_owner):
+                continue
+            conn.execute(
+                "UPDATE jobs SET owner = ?, updated_at = ? WHERE job_id = ?",
+                (owner, time.time(), job_id)
+            )
+            claimed.append((job_id, self.get(job_id)))
+        return claimed
+
+
+def create_job_store(backend, path=None):
+    """Cria o armazenamento de jobs configurado ('sqlite' ou 'memory')"""
+    if backend == 'memory':
+        return MemoryJobStore()
+    if backend == 'sqlite':
+        return SQLiteJobStore(path)
+    raise ValueError(f"Armazenamento de jobs desconhecido: {backend}")
@@ -0,0 +1,254 @@
+import struct
+
+MEDIA_FIELDS = ('width', 'height', 'duration', 'vcodec', 'acodec')
+
+# moov maior que isso não é de um arquivo que servimos (índices de horas de vídeo têm poucos MB)
+MAX_MOOV_BYTES = 64 * 1024 * 1024
+# Cabeçalho EBML lido antes do primeiro Cluster (Info + Tracks)
+MAX_EBML_HEADER_BYTES = 1024 * 1024
+
+MP4_CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+# IDs EBML (Matroska/WebM)
+EBML_SEGMENT = 0x18538067
+EBML_INFO = 0x1549A966
+EBML_TIMECODE_SCALE = 0x2AD7B1
+EBML_DURATION = 0x4489
+EBML_TRACKS = 0x1654AE6B
+EBML_TRACK_ENTRY = 0xAE
+EBML_TRACK_TYPE = 0x83
+EBML_CODEC_ID = 0x86
+EBML_VIDEO = 0xE0
+EBML_PIXEL_WIDTH = 0xB0
+EBML_PIXEL_HEIGHT = 0xBA
+EBML_CLUSTER = 0x1F43B675
+
+
+def media_from_info(info):
+    """Campos de mídia de um item de requested_downloads (ou formato) do yt-dlp"""
+    media = {}
+    for field in MEDIA_FIELDS:
+        value = info.get(field)
+        if value in (None, 'none'):
+            continue
+        if field == 'duration':
+            value = round(float(value), 3)
+        media[field] = value
+    return media
+
+
+def is_complete(media):
+    return all(media.get(field) for field in ('width', 'height', 'duration'))
+
+
+def probe_file(path):
+    """Dimensões, duração e codecs lidos do cabeçalho do arquivo (MP4 ou WebM/MKV)
+
+    Lê só os boxes/elementos de cabeçalho, com alguns seeks; {} se o formato
+    não for reconhecido ou o arquivo estiver truncado.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(12)
+            f.seek(0)
+            if head[4:8] in (b'ftyp', b'moov', b'free', b'mdat', b'wide'):
+                return _probe_mp4(f)
+            if head[:4] == b'\x1a\x45\xdf\xa3':
+                return _probe_ebml(f)
+    except (OSError, ValueError, struct.error):
+        pass
+    return {}
+
+
+# --- MP4 (ISO BMFF) ---
+
+def _mp4_boxes(f, end):
+    """(tipo, início do conteúdo, fim) dos boxes entre a posição atual e `end`"""
+    while f.tell() + 8 <= end:
+        start = f.tell()
+        size, kind = struct.unpack('>I4s', f.read(8))
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+        elif size == 0:
+            size = end - start
+        if size < 8:
+            return
+        yield kind, f.tell(), start + size
+        f.seek(start + size)
+
+
+def _mp4_boxes_in(data):
+    """Mesmo que _mp4_boxes, sobre bytes já lidos: (tipo, conteúdo)"""
+    offset = 0
+    while offset + 8 <= len(data):
+        size, kind = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header:
+            return
+        yield kind, data[offset + header:offset + size]
+        offset += size
+
+
+def _probe_mp4(f):
+    f.seek(0, 2)
+    file_size = f.tell()
+    f.seek(0)
+    # Pula mdat e afins sem ler: o moov pode estar no começo ou no fim
+    for kind, start, end in _mp4_boxes(f, file_size):
+        if kind == b'moov':
+            if end - start > MAX_MOOV_BYTES or end > file_size:
+                return {}
+            f.seek(start)
+            return _parse_moov(f.read(end - start))
+    return {}
+
+
+def _parse_moov(moov):
+    media = {}
+    for kind, body in _mp4_boxes_in(moov):
+        if kind == b'mvhd':
+            timescale, duration = _mp4_time(body)
+            if timescale:
+                media['duration'] = round(duration / timescale, 3)
+        elif kind == b'trak':
+            track = _parse_trak(body)
+            if track.get('handler') == b'vide' and 'vcodec' not in media:
+                media['vcodec'] = track.get('codec')
+                if track.get('width'):
+                    media['width'], media['height'] = track['width'], track['height']
+            elif track.get('handler') == b'soun' and 'acodec' not in media:
+                media['acodec'] = track.get('codec')
+            if 'duration' not in media and track.get('duration'):
+                media['duration'] = track['duration']
+    return {field: value for field, value in media.items() if value}
+
+
+def _mp4_time(body):
+    """(timescale, duração) de mvhd/mdhd, versão 0 ou 1"""
+    if body[0] == 1:
+        return struct.unpack_from('>IQ', body, 20)
+    return struct.unpack_from('>II', body, 12)
+
+
+def _parse_trak(trak):
+    track = {}
+    for kind, body in _mp4_boxes_in(trak):
+        if kind == b'tkhd':
+            # Largura/altura (16.16) nos últimos 8 bytes, nas duas versões
+            width, height = struct.unpack_from('>II', body, len(body) - 8)
+            track['width'], track['height'] = width >> 16, height >> 16
+        elif kind in MP4_CONTAINERS:
+            track.update(_parse_trak(body))
+        elif kind == b'mdhd':
+            timescale, duration = _mp4_time(body)
+            if timescale:
+                track['duration'] = round(duration / timescale, 3)
+        elif kind == b'hdlr':
+            track['handler'] = body[8:12]
+        elif kind == b'stsd' and len(body) >= 16:
+            # Primeira entrada: tamanho (4) + formato (4), depois de versão/flags e contagem
+            track['codec'] = body[12:16].decode('latin-1').strip()
+    return track
+
+
+# --- Matroska / WebM (EBML) ---
+
+def _read_vint(f, keep_marker):
+    first = f.read(1)
+    if not first:
+        raise ValueError("EBML truncado")
+    byte = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not byte & mask:
+        length += 1
+        mask >>= 1
+    if length > 8:
+        raise ValueError("VINT inválido")
+    value = byte if keep_marker else byte & (mask - 1)
+    rest = f.read(length - 1)
+    for b in rest:
+        value = (value << 8) | b
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, unknown
+
+
+def _ebml_elements(f, end):
+    """(id, início do conteúdo, fim) dos elementos até `end`; fim None = tamanho desconhecido"""
+    while f.tell() < end:
+        element_id, _ = _read_vint(f, keep_marker=True)
+        size, unknown = _read_vint(f, keep_marker=False)
+        start = f.tell()
+        yield element_id, start, None if unknown else start + size
+
+
+def _ebml_uint(data):
+    return int.from_bytes(data, 'big')
+
+
+def _probe_ebml(f):
+    f.seek(0, 2)
+    file_size = f.tell()
+    f.seek(0)
+    media = {}
+    timecode_scale = 1_000_000
+    for element_id, start, end in _ebml_elements(f, file_size):
+        if element_id != EBML_SEGMENT:
+            if end is None:
+                break
+            f.seek(end)
+            continue
+        for child_id, child_start, child_end in _ebml_elements(f, end or file_size):
+            if child_id == EBML_CLUSTER or child_start > MAX_EBML_HEADER_BYTES:
+                break
+            if child_end is None:
+                break
+            if child_id == EBML_INFO:
+                duration = None
+                for info_id, info_start, info_end in _ebml_elements(f, child_end):
+                    data = f.read(info_end - info_start)
+                    if info_id == EBML_TIMECODE_SCALE:
+                        timecode_scale = _ebml_uint(data)
+                    elif info_id == EBML_DURATION:
+                        duration = struct.unpack('>f' if len(data) == 4 else '>d', data)[0]
+                if duration:
+                    media['duration'] = round(duration * timecode_scale / 1e9, 3)
+            elif child_id == EBML_TRACKS:
+                for entry_id, entry_start, entry_end in _ebml_elements(f, child_end):
+                    if entry_id == EBML_TRACK_ENTRY:
+                        _parse_track_entry(f, entry_end, media)
+                    f.seek(entry_end)
+            f.seek(child_end)
+        break
+    return {field: value for field, value in media.items() if value}
+
+
+def _parse_track_entry(f, end, media):
+    track = {}
+    for element_id, start, element_end in _ebml_elements(f, end):
+        if element_id == EBML_VIDEO:
+            for video_id, video_start, video_end in _ebml_elements(f, element_end):
+                data = f.read(video_end - video_start)
+                if video_id == EBML_PIXEL_WIDTH:
+                    track['width'] = _ebml_uint(data)
+                elif video_id == EBML_PIXEL_HEIGHT:
+                    track['height'] = _ebml_uint(data)
+        elif element_id in (EBML_TRACK_TYPE, EBML_CODEC_ID):
+            data = f.read(element_end - start)
+            if element_id == EBML_TRACK_TYPE:
+                track['type'] = _ebml_uint(data)
+            else:
+                track['codec'] = data.decode('ascii', 'replace').rstrip('\0')
+        f.seek(element_end)
+
+    # TrackType 1 = vídeo, 2 = áudio; CodecID como "V_VP9", "A_OPUS"
+    if track.get('type') == 1 and 'vcodec' not in media:
+        media['vcodec'] = track.get('codec', '').split('_', 1)[-1].lower() or None
+        media['width'], media['height'] = track.get('width'), track.get('height')
+    elif track.get('type') == 2 and 'acodec' not in media:
+        media['acodec'] = track.get('codec', '').split('_', 1)[-1].lower() or None
@@ -0,0 +1,192 @@
+import math
+import bisect
+import heapq
+import itertools
+import threading
+import time
+
+
+class QueueFullError(Exception):
+    """Fila de jobs cheia (a API responde 429)"""
+
+    def __init__(self, retry_after):
+        super().__init__("Fila de processamento cheia")
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """Fila limitada de jobs com limite de concorrência e divisão justa por cliente
+
+    Um número fixo de threads consome a fila em weighted fair queuing: cada
+    job recebe uma etiqueta de término virtual (início + custo estimado), e
+    o início nunca é antes do término do job anterior do mesmo cliente.
+    Jobs curtos passam na frente dos longos, e os dez vídeos longos de um
+    cliente não atrasam a galeria pequena de outro. Cada segundo na fila
+    desconta `aging` segundos da etiqueta, então job grande não fica parado
+    para sempre. Sem estimativa, o custo é a duração média dos jobs.
+
+    Quando a fila de espera está cheia, submit() levanta QueueFullError com
+    uma estimativa de quando tentar de novo.
+    """
+
+    def __init__(self, max_concurrent=2, max_pending=20, default_duration=60.0, aging=1.0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_pending = max(0, max_pending)
+        self.aging = aging
+        # job_id -> dados do job na fila; o heap guarda [chave, seq, job_id]
+        # (entradas substituídas por set_cost ficam com job_id None)
+        self._pending = {}
+        self._heap = []
+        self._seq = itertools.count()
+        # Tempo virtual (início do último job despachado) e término virtual
+        # do último job de cada cliente
+        self._virtual = 0.0
+        self._client_finish = {}
+        self._epoch = time.monotonic()
+        self._running = set()
+        self._cond = threading.Condition()
+        self._threads = []
+        # Média móvel da duração dos jobs (para ETA e Retry-After)
+        self.avg_duration = default_duration
+        self.completed = 0
+        self.rejected = 0
+        # Tempo total com job rodando (utilização = busy_seconds / tempo / max_concurrent)
+        self.busy_seconds = 0.0
+
+    def _ensure_threads(self):
+        """Sobe as threads consumidoras na primeira submissão"""
+        while len(self._threads) < self.max_concurrent:
+            thread = threading.Thread(target=self._worker_loop, daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def submit(self, job_id, func, *args, cost=None, client=None):
+        """Enfileira um job; levanta QueueFullError se a fila estiver cheia
+
+        `cost` é a estimativa em segundos (None = duração média) e `client`
+        identifica quem pediu, para a divisão justa. Devolve a posição na fila.
+        """
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self.rejected += 1
+                raise QueueFullError(self._retry_after())
+            entry = {
+                "func": func,
+                "args": args,
+                "client": client,
+                "cost": cost,
+                "start": max(self._virtual, self._client_finish.get(client, 0.0)),
+                "enqueued": time.monotonic(),
+            }
+            self._pending[job_id] = entry
+            self._push(job_id, entry)
+            self._client_finish[client] = entry["finish"]
+            self._ensure_threads()
+            self._cond.notify()
+            return self._position(job_id)
+
+    def _push(self, job_id, entry):
+        cost = self.avg_duration if entry["cost"] is None else entry["cost"]
+        entry["finish"] = entry["start"] + cost
+        # finish - aging * (agora - enqueued): o "agora" é comum a todos os
+        # jobs, então a ordem no heap não muda com o tempo
+        key = entry["finish"] + self.aging * (entry["enqueued"] - self._epoch)
+        entry["heap"] = [key, next(self._seq), job_id]
+        heapq.heappush(self._heap, entry["heap"])
+
+    def _pop(self):
+        while True:
+            _, _, job_id = heapq.heappop(self._heap)
+            if job_id is not None:
+                break
+        entry = self._pending.pop(job_id)
+        self._virtual = max(self._virtual, entry["start"])
+        if len(self._client_finish) > 1024:
+            # Clientes sem nada na fila voltam a começar do tempo virtual
+            self._client_finish = {client: finish for client, finish in self._client_finish.items()
+                                   if finish > self._virtual}
+        return job_id, entry
+
+    def set_cost(self, job_id, cost):
+        """Atualiza a estimativa de um job ainda na fila; False se já saiu"""
+        with self._cond:
+            entry = self._pending.get(job_id)
+            if entry is None:
+                return False
+            entry["heap"][2] = None
+            previous_finish = entry["finish"]
+            entry["cost"] = cost
+            self._push(job_id, entry)
+            if self._client_finish.get(entry["client"]) == previous_finish:
+                self._client_finish[entry["client"]] = entry["finish"]
+            return True
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job_id, entry = self._pop()
+                func, args = entry["func"], entry["args"]
+                self._running.add(job_id)
+
+            started = time.time()
+            try:
+                func(job_id, *args)
+            except Exception as e:
+                print(f"Erro no job {job_id}: {e}")
+            finally:
+                with self._cond:
+                    self._running.discard(job_id)
+                    self._record_duration(time.time() - started)
+
+    def _record_duration(self, duration):
+        """Atualiza a média móvel exponencial da duração dos jobs"""
+        self.completed += 1
+        self.busy_seconds += duration
+        # A duração padrão só vale até o primeiro job terminar
+        if self.completed == 1:
+            self.avg_duration = duration
+        else:
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration
+
+    def position(self, job_id):
+        """Posição na fila (1 = próximo a rodar) ou None se não está na fila"""
+        with self._cond:
+            return self._position(job_id)
+
+    def _position(self, job_id):
+        entry = self._pending.get(job_id)
+        if entry is None:
+            return None
+        return 1 + sum(1 for other in self._pending.values() if other["heap"][:2] < entry["heap"][:2])
+
+    def positions(self, job_ids):
+        """Posições de vários jobs numa passada só: {job_id: posição}, sem os
+        que não estão na fila"""
+        with self._cond:
+            keys = sorted(entry["heap"][:2] for entry in self._pending.values())
+            return {job_id: 1 + bisect.bisect_left(keys, self._pending[job_id]["heap"][:2])
+                    for job_id in job_ids if job_id in self._pending}
+
+    def eta(self, position):
+        """Segundos estimados até um job nessa posição começar a rodar"""
+        waves = math.ceil(position / self.max_concurrent)
+        return round(waves * self.avg_duration, 1)
+
+    def _retry_after(self):
+        return max(1, int(math.ceil(self.eta(len(self._pending) + 1))))
+
+    def stats(self):
+        with self._cond:
+            return {
+                "running": len(self._running),
+                "pending": len(self._pending),
+                "clients_waiting": len({entry["client"] for entry in self._pending.values()}),
+                "max_concurrent": self.max_concurrent,
+                "max_pending": self.max_pending,
+                "avg_duration": round(self.avg_duration, 1),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "busy_seconds": round(self.busy_seconds, 1),
+            }
@@ -0,0 +1,34 @@
+"""Apoio aos testes da API: importa o api.py com a base numa pasta temporária
+
+Sem o script do downloader na pasta, o pool não sobe no import; os testes
+criam os jobs direto no job_store e os arquivos em DOWNLOADS_DIR.
+"""
+import os
+import sys
+import uuid
+import atexit
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+BASE_DIR = tempfile.mkdtemp(prefix='videobox-testes-')
+atexit.register(shutil.rmtree, BASE_DIR, True)
+os.environ.update(VIDEOBOX_BASE_DIR=BASE_DIR, VIDEOBOX_LOG_FILE='', VIDEOBOX_CACHE_BYTES='0',
+                  VIDEOBOX_JANITOR_INTERVAL='3600')
+
+import api  # noqa: E402
+
+
+def criar_job(arquivos=None, **campos):
+    """Job no store com os arquivos {nome: bytes} na pasta dele; devolve o id"""
+    job_id = str(uuid.uuid4())
+    job = {"status": "completed", "progress": 100, "url": "https://example.com/v",
+           "created_at": 0, **campos}
+    api.job_store.create(job_id, job)
+    job_dir = os.path.join(api.DOWNLOADS_DIR, job_id)
+    os.makedirs(job_dir)
+    for nome, dados in (arquivos or {}).items():
+        with open(os.path.join(job_dir, nome), 'wb') as f:
+            f.write(dados)
+    return job_id
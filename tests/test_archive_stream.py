@@ -0,0 +1,69 @@
+import io
+import os
+import tarfile
+import zipfile
+import unittest
+
+from apoio import api, criar_job
+from archive_stream import ARCHIVE_CHUNK_SIZE, iter_archive
+
+ARQUIVOS = {
+    'video.mp4': os.urandom(3 * ARCHIVE_CHUNK_SIZE + 123),
+    'foto ç.jpg': os.urandom(1000),
+    'vazio.txt': b'',
+}
+
+
+class IterArchiveTest(unittest.TestCase):
+    """O que o gerador entrega abre no zipfile/tarfile com o mesmo conteúdo"""
+
+    def setUp(self):
+        self.job_id = criar_job(ARQUIVOS)
+        self.pasta = os.path.join(api.DOWNLOADS_DIR, self.job_id)
+
+    def test_zip(self):
+        dados = b''.join(iter_archive('zip', self.pasta, sorted(ARQUIVOS)))
+        with zipfile.ZipFile(io.BytesIO(dados)) as zip_:
+            self.assertIsNone(zip_.testzip())
+            self.assertEqual(sorted(zip_.namelist()), sorted(ARQUIVOS))
+            for nome, conteudo in ARQUIVOS.items():
+                self.assertEqual(zip_.read(nome), conteudo)
+                # Stored: vídeo e imagem já são comprimidos
+                self.assertEqual(zip_.getinfo(nome).compress_type, zipfile.ZIP_STORED)
+
+    def test_tar(self):
+        dados = b''.join(iter_archive('tar', self.pasta, sorted(ARQUIVOS)))
+        with tarfile.open(fileobj=io.BytesIO(dados)) as tar:
+            self.assertEqual(sorted(tar.getnames()), sorted(ARQUIVOS))
+            for nome, conteudo in ARQUIVOS.items():
+                self.assertEqual(tar.extractfile(nome).read(), conteudo)
+
+    def test_entrega_em_pedacos(self):
+        pedacos = list(iter_archive('zip', self.pasta, sorted(ARQUIVOS)))
+        self.assertGreater(len(pedacos), 3)
+        self.assertLessEqual(max(map(len, pedacos)), 2 * ARCHIVE_CHUNK_SIZE)
+
+
+class DownloadAllTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = api.app.test_client()
+
+    def test_zip_pela_api(self):
+        job_id = criar_job(dict(ARQUIVOS, **{'parcial.mp4.part': b'x'}))
+        resposta = self.client.get(f'/api/download/{job_id}/all')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.headers['Content-Disposition'], f'attachment; filename="{job_id}.zip"')
+        with zipfile.ZipFile(io.BytesIO(resposta.data)) as zip_:
+            self.assertEqual(sorted(zip_.namelist()), sorted(ARQUIVOS))
+        resposta.close()
+
+    def test_erros(self):
+        job_id = criar_job(ARQUIVOS)
+        self.assertEqual(self.client.get(f'/api/download/{job_id}/all?format=rar').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/download/{criar_job(status="processing")}/all').status_code, 409)
+        self.assertEqual(self.client.get(f'/api/download/{criar_job()}/all').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+import universal_downloader_aac as downloader
+from media_probe import probe_file
+from servidor_midia import criar_servidor
+
+
+class FfmpegTestCase(unittest.TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.pasta = pasta.name
+        with mock.patch.object(downloader, "ARQUIVO_LOG", ""):
+            self.downloader = downloader.MultiSiteDownloader(self.pasta, silencioso=True)
+        self.addCleanup(self.downloader.sessao.close)
+        self.ydl = downloader.criar_youtubedl({"outtmpl": os.path.join(self.pasta, "%(title)s.%(ext)s"),
+                                               "quiet": True})
+        self.addCleanup(self.ydl.close)
+
+    def selecionado(self, base="http://127.0.0.1:1"):
+        """Merge no estilo do YouTube: vídeo sem áudio + áudio que não é AAC"""
+        return {"id": "x", "title": "teste", "ext": "mp4", "requested_formats": [
+            {"url": f"{base}/ffmpeg/video.mp4", "protocol": "http", "ext": "mp4",
+             "vcodec": "mp4v", "acodec": "none"},
+            {"url": f"{base}/ffmpeg/audio.wav", "protocol": "http", "ext": "wav",
+             "vcodec": "none", "acodec": "pcm_s16le"},
+        ]}
+
+
+class PrazoTest(FfmpegTestCase):
+    """Opt-in e prazo do job, sem precisar do ffmpeg"""
+
+    def test_timeout_limitado_pelo_prazo(self):
+        self.assertEqual(self.downloader.timeout_ffmpeg(), downloader.TIMEOUT_FFMPEG)
+        self.downloader.prazo = time.time() + 100.5
+        self.assertEqual(self.downloader.timeout_ffmpeg(), 100)
+        self.downloader.prazo = time.time() - 1
+        self.assertEqual(self.downloader.timeout_ffmpeg(), 0)
+
+    def test_desligado_por_padrao(self):
+        self.downloader.ffmpeg = "ffmpeg"
+        with mock.patch.object(downloader.transcoder, "run") as run:
+            self.assertFalse(self.downloader.baixar_com_ffmpeg(self.ydl, self.selecionado()))
+        run.assert_not_called()
+
+    def test_sem_tempo_no_prazo_nao_comeca(self):
+        self.downloader.ffmpeg = "ffmpeg"
+        self.downloader.prazo = time.time() + 5
+        with mock.patch.object(downloader, "FFMPEG_DURANTE_DOWNLOAD", True), \
+                mock.patch.object(downloader.transcoder, "run") as run:
+            self.assertFalse(self.downloader.baixar_com_ffmpeg(self.ydl, self.selecionado()))
+        run.assert_not_called()
+
+    def test_conversao_depois_sem_tempo_mantem_o_original(self):
+        self.downloader.ffmpeg = "ffmpeg"
+        self.downloader.prazo = time.time() - 1
+        arquivo = Path(self.pasta) / "video.webm"
+        arquivo.write_bytes(b"x" * 100)
+        with mock.patch.object(downloader.transcoder, "run") as run:
+            convertidos = self.downloader.garantir_aac({arquivo: {"acodec": "opus"}})
+        run.assert_not_called()
+        self.assertEqual(convertidos, {arquivo: {"acodec": "opus"}})
+
+
+@unittest.skipUnless(downloader.transcoder.ffmpeg_path(), "ffmpeg não instalado")
+class BaixarComFfmpegTest(FfmpegTestCase):
+    """Merge + AAC lendo as URLs do benchmarks/servidor_midia com o ffmpeg de verdade"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.servidor = criar_servidor()
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.servidor.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+
+    def test_merge_com_audio_convertido(self):
+        self.downloader.prazo = time.time() + 120
+        with mock.patch.object(downloader, "FFMPEG_DURANTE_DOWNLOAD", True):
+            baixados = self.downloader.baixar_com_ffmpeg(self.ydl, self.selecionado(self.base))
+
+        destino = Path(self.pasta) / "teste.mp4"
+        self.assertEqual(list(baixados), [destino])
+        self.assertEqual(baixados[destino]["acodec"], "mp4a")
+        self.assertEqual(sorted(os.listdir(self.pasta)), ["teste.mp4"])
+        midia = probe_file(destino)
+        self.assertEqual((midia["width"], midia["height"]), (320, 240))
+        self.assertTrue(midia["acodec"].startswith("mp4a"))
+        self.assertAlmostEqual(midia["duration"], 2, delta=0.5)
+
+    def test_url_que_falha_volta_para_o_ytdlp(self):
+        selecionado = self.selecionado(self.base)
+        selecionado["requested_formats"][1]["url"] = f"{self.base}/nao-existe.wav"
+        with mock.patch.object(downloader, "FFMPEG_DURANTE_DOWNLOAD", True):
+            self.assertFalse(self.downloader.baixar_com_ffmpeg(self.ydl, selecionado))
+        self.assertEqual(os.listdir(self.pasta), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
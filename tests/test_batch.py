@@ -0,0 +1,52 @@
+import unittest
+from unittest import mock
+
+from apoio import api, criar_job
+
+
+class BatchTest(unittest.TestCase):
+    """Lote: os filhos são lidos numa consulta só, não um get por filho"""
+
+    def criar_lote(self, filhos, **campos):
+        return criar_job(kind='batch', status='processing', concurrency=2, children=filhos,
+                         urls=[], **campos)
+
+    def test_status_do_lote(self):
+        lider = criar_job(status='processing', progress=40, message='Baixando...')
+        filhos = [criar_job(progress=100, files=['a.mp4']),
+                  criar_job(status='error', progress=0),
+                  criar_job(status='queued', progress=0, follows=lider),
+                  'expirado']
+        lote = self.criar_lote(filhos)
+
+        with mock.patch.object(api.job_store, 'get', side_effect=AssertionError('get por filho')):
+            status = api.build_status(lote, api.job_store.get_many([lote])[lote])
+
+        self.assertEqual([item['status'] for item in status['items']],
+                         ['completed', 'error', 'processing', 'error'])
+        # O seguidor mostra o progresso do líder, que está fora do lote
+        self.assertEqual(status['items'][2]['progress'], 40)
+        self.assertEqual(status['items'][3]['message'], 'Job expirado')
+        self.assertEqual(status['summary'], {'queued': 0, 'processing': 1, 'completed': 1, 'error': 2})
+        self.assertEqual(status['progress'], (100 + 0 + 40 + 0) // 4)
+
+    def test_posicao_na_fila_dos_filhos(self):
+        filhos = [criar_job(status='queued', progress=0) for _ in range(2)]
+        lote = self.criar_lote(filhos)
+        with mock.patch.object(api.scheduler, 'positions', return_value={filhos[1]: 3}) as positions:
+            status = api.build_status(lote, api.job_store.get(lote))
+        positions.assert_called_once()
+        self.assertEqual(status['summary']['queued'], 2)
+
+    def test_run_batch_conclui_com_filhos_prontos(self):
+        lote = self.criar_lote([criar_job(), criar_job(status='error'), 'expirado'])
+        with mock.patch.object(api.job_store, 'get', wraps=api.job_store.get) as get:
+            api.run_batch(lote)
+        get.assert_called_once_with(lote)
+        lote = api.job_store.get(lote)
+        self.assertEqual(lote['status'], 'completed')
+        self.assertEqual(lote['message'], 'Lote concluído: 1 de 3 item(ns) baixado(s)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dedup_index import DedupIndex, PARTIAL_BYTES
+from janitor import Janitor
+from job_store import MemoryJobStore
+
+
+class DedupIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(self.pasta.cleanup)
+        self.indice = DedupIndex(os.path.join(self.pasta.name, 'dedup.db'))
+        self.addCleanup(self.indice.close)
+
+    def arquivo(self, caminho, dados):
+        caminho = os.path.join(self.pasta.name, caminho)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, 'wb') as f:
+            f.write(dados)
+        return caminho
+
+    def linhas(self):
+        return sorted(row[0] for row in self.indice._execute("SELECT path FROM files").fetchall())
+
+    def test_acha_duplicata_e_liga_por_hardlink(self):
+        dados = os.urandom(3 * PARTIAL_BYTES)
+        original = self.arquivo('job1/a.mp4', dados)
+        self.assertIsNone(self.indice.find_duplicate(original))
+        copia = self.arquivo('job2/b.mp4', dados)
+
+        self.assertEqual(self.indice.find_duplicate(copia), original)
+        self.indice.link_duplicate(copia, original)
+        self.assertTrue(os.path.samefile(copia, original))
+        # Já ligados: a próxima consulta não relê nada
+        self.assertEqual(self.indice.find_duplicate(copia), original)
+
+    def test_mesmo_tamanho_conteudo_diferente(self):
+        inicio, fim = os.urandom(PARTIAL_BYTES), os.urandom(PARTIAL_BYTES)
+        a = self.arquivo('job1/a.mp4', inicio + b'a' * 1000 + fim)
+        b = self.arquivo('job2/b.mp4', inicio + b'b' * 1000 + fim)
+        self.indice.find_duplicate(a)
+        # Mesmo tamanho e mesmo hash parcial: só o hash completo separa os dois
+        self.assertIsNone(self.indice.find_duplicate(b))
+
+    def test_forget_tree_tira_so_a_pasta(self):
+        for caminho in ('job1/a.mp4', 'job1/sub/b.jpg', 'job10/c.mp4', 'job2/d.mp4'):
+            self.indice.register(self.arquivo(caminho, os.urandom(100)))
+        self.assertEqual(self.indice.forget_tree(os.path.join(self.pasta.name, 'job1')), 2)
+        self.assertEqual([os.path.relpath(p, self.pasta.name) for p in self.linhas()],
+                         ['job10/c.mp4', 'job2/d.mp4'])
+
+    def test_janitor_limpa_o_indice_ao_apagar_o_job(self):
+        downloads = os.path.join(self.pasta.name, 'downloads')
+        store = MemoryJobStore()
+        store.create('job1', {'status': 'completed'})
+        store.create('job2', {'status': 'completed'})
+        self.indice.register(self.arquivo('downloads/job1/a.mp4', os.urandom(100)))
+        self.indice.register(self.arquivo('downloads/job2/b.mp4', os.urandom(100)))
+
+        janitor = Janitor(store, downloads, dedup=self.indice)
+        self.assertTrue(janitor.evict('job1', 'ttl'))
+        self.assertEqual([os.path.relpath(p, downloads) for p in self.linhas()], ['job2/b.mp4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import download_cache
+from download_cache import DownloadCache, normalize_url, resolve_url_id
+
+
+class DownloadCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(self.pasta.cleanup)
+        self.cache = DownloadCache(os.path.join(self.pasta.name, 'cache'), max_bytes=2500)
+
+    def arquivo(self, nome, tamanho):
+        origem = os.path.join(self.pasta.name, 'job', nome)
+        os.makedirs(os.path.dirname(origem), exist_ok=True)
+        with open(origem, 'wb') as f:
+            f.write(os.urandom(tamanho))
+        return origem
+
+    def test_store_e_materialize_por_hardlink(self):
+        origem = self.arquivo('video.mp4', 1000)
+        self.assertTrue(self.cache.store('Youtube:abc:fmt', [origem]))
+
+        destino = os.path.join(self.pasta.name, 'outro-job')
+        self.assertEqual(self.cache.materialize('Youtube:abc:fmt', destino), ['video.mp4'])
+        self.assertTrue(os.path.samefile(origem, os.path.join(destino, 'video.mp4')))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertIsNone(self.cache.materialize('Youtube:outro:fmt', destino))
+
+    def test_entrada_sem_arquivos_e_descartada(self):
+        self.cache.store('k', [self.arquivo('a.mp4', 100)])
+        objeto = os.path.join(self.cache.objects_dir, self.cache._hash('k'), 'a.mp4')
+        os.remove(objeto)
+        self.assertIsNone(self.cache.materialize('k', os.path.join(self.pasta.name, 'x')))
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_evict_remove_o_menos_usado_ate_caber(self):
+        self.cache.store('a', [self.arquivo('a.mp4', 1000)])
+        time.sleep(0.01)
+        self.cache.store('b', [self.arquivo('b.mp4', 1000)])
+        time.sleep(0.01)
+        # 'a' foi usado depois de 'b': o terceiro arquivo estoura o orçamento e tira 'b'
+        self.cache.materialize('a', os.path.join(self.pasta.name, 'usa-a'))
+        self.cache.store('c', [self.arquivo('c.mp4', 1000)])
+
+        destino = os.path.join(self.pasta.name, 'depois')
+        self.assertIsNone(self.cache.materialize('b', destino))
+        self.assertEqual(self.cache.materialize('a', destino), ['a.mp4'])
+        self.assertEqual(self.cache.materialize('c', destino), ['c.mp4'])
+        self.assertEqual(self.cache.stats()['bytes'], 2000)
+        self.assertFalse(os.path.exists(os.path.join(self.cache.objects_dir, self.cache._hash('b'))))
+
+
+class ChaveTest(unittest.TestCase):
+
+    def test_normalize_url(self):
+        self.assertEqual(normalize_url('HTTPS://www.Example.com/v/1/?utm_source=x&b=2&a=1#t'),
+                         'https://example.com/v/1?a=1&b=2')
+        self.assertEqual(normalize_url('https://m.example.com'), 'https://example.com/')
+
+    def test_resolve_url_id_e_memo_por_host(self):
+        download_cache._extractors_by_host.clear()
+        self.assertEqual(resolve_url_id('https://youtu.be/dQw4w9WgXcQ'), ('Youtube', 'dQw4w9WgXcQ'))
+        self.assertEqual(resolve_url_id('https://youtu.be/aaaaaaaaaaa?si=x'), ('Youtube', 'aaaaaaaaaaa'))
+        self.assertEqual([ie.ie_key() for ie in download_cache._extractors_by_host['youtu.be']],
+                         ['Youtube'])
+        # Host sem extrator próprio: fica sem chave e não varre de novo
+        self.assertIsNone(resolve_url_id('http://127.0.0.1:8790/video/a.mp4'))
+        self.assertEqual(download_cache._extractors_by_host['127.0.0.1'], [])
+
+    def test_key_for_info_generico_usa_a_url(self):
+        cache = DownloadCache.__new__(DownloadCache)
+        info = {'extractor_key': 'Generic', 'id': 'video', 'webpage_url': 'https://www.site.com/v?utm_x=1'}
+        self.assertEqual(cache.key_for_info(info, 'fmt'), 'Generic:https://site.com/v:fmt')
+        self.assertIsNone(cache.key_for_info({'id': 'x'}, 'fmt'))
+
+
+if __name__ == '__main__':
+    unittest.main()
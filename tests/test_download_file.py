@@ -0,0 +1,66 @@
+import os
+import unittest
+from unittest import mock
+
+from apoio import api, criar_job
+
+DADOS = os.urandom(256 * 1024)
+
+
+class DownloadFileTest(unittest.TestCase):
+    """/api/download/<job>/<arquivo>: Range/206, validadores e 304"""
+
+    def setUp(self):
+        self.client = api.app.test_client()
+        self.job_id = criar_job({'video.mp4': DADOS})
+        self.url = f'/api/download/{self.job_id}/video.mp4'
+
+    def test_arquivo_inteiro(self):
+        resposta = self.client.get(self.url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data, DADOS)
+        self.assertEqual(resposta.headers['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment', resposta.headers['Content-Disposition'])
+        # Enquanto a resposta está aberta o janitor não apaga a pasta
+        self.assertFalse(api.cleanup_job(self.job_id))
+        resposta.close()
+        self.assertTrue(api.cleanup_job(self.job_id))
+
+    def test_range(self):
+        resposta = self.client.get(self.url, headers={'Range': 'bytes=1000-1999'})
+        self.assertEqual(resposta.status_code, 206)
+        self.assertEqual(resposta.headers['Content-Range'], f'bytes 1000-1999/{len(DADOS)}')
+        self.assertEqual(resposta.data, DADOS[1000:2000])
+        resposta.close()
+
+        resposta = self.client.get(self.url, headers={'Range': f'bytes={len(DADOS)}-'})
+        self.assertEqual(resposta.status_code, 416)
+        resposta.close()
+
+    def test_condicionais(self):
+        resposta = self.client.get(self.url)
+        etag, modificado = resposta.headers['ETag'], resposta.headers['Last-Modified']
+        resposta.close()
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.client.get(self.url, headers={'If-Modified-Since': modificado}).status_code, 304)
+        # If-Range com outro validador: arquivo inteiro em vez da faixa
+        resposta = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"outro"'})
+        self.assertEqual(resposta.status_code, 200)
+        resposta.close()
+
+    def test_job_ou_arquivo_inexistente(self):
+        self.assertEqual(self.client.get('/api/download/nao-existe/video.mp4').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/download/{self.job_id}/outro.mp4').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/download/{self.job_id}/..%2Fjobs.db').status_code, 404)
+
+    def test_x_accel(self):
+        with mock.patch.object(api, 'SENDFILE_MODE', 'x-accel'):
+            resposta = self.client.get(self.url)
+        self.assertEqual(resposta.headers['X-Accel-Redirect'],
+                         f'{api.ACCEL_REDIRECT_PREFIX}{self.job_id}/video.mp4')
+        self.assertEqual(resposta.data, b'')
+        resposta.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import unittest
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+from universal_downloader_aac import extrair_imagens_galeria
+from bench_html import pagina_sintetica, extrair_com_beautifulsoup
+
+try:
+    import bs4  # noqa: F401
+except ImportError:
+    bs4 = None
+
+# Casos de borda: entidades, maiúsculas, thumbs, posters e outras galerias
+PAGINA_BORDA = """<html><body>
+<div class="media-group"><img class="lasyload img-front" data-src="https://s1.erome.com/9/Gal1/a.JPG?x=1&amp;y=2">
+<img class="img-back" data-src="https://s1.erome.com/thumbs/Gal1/a.jpg"></div>
+<div data-src="https://s1.erome.com/9/Gal1/a.JPG?x=1&amp;y=2"></div>
+<video data-poster="https://s1.erome.com/9/Gal1/poster.jpg"></video>
+<img class="img-front" data-src="https://s1.erome.com/9/Outra/b.jpg">
+<span data-full="https://s2.erome.com/9/Gal1/c.webp"></span>
+<img class="img-front" src="https://s2.erome.com/9/Gal1/sem-data-src.jpg">
+<img class="img-front" data-src="https://s2.erome.com/9/Gal1/video.mp4">
+<script>var s = '<img class="img-front" data-src="https://s3.erome.com/9/Gal1/script.jpg">';</script>
+</body></html>"""
+
+
+class ExtrairImagensGaleriaTest(unittest.TestCase):
+
+    def test_pagina_de_borda(self):
+        # img-front/img-back entram sempre (como antes); nos outros data-*,
+        # só imagens, sem thumbs e posters
+        self.assertEqual(extrair_imagens_galeria(PAGINA_BORDA, 'Gal1'), [
+            'https://s1.erome.com/9/Gal1/a.JPG?x=1&y=2',
+            'https://s1.erome.com/thumbs/Gal1/a.jpg',
+            'https://s2.erome.com/9/Gal1/video.mp4',
+            'https://s2.erome.com/9/Gal1/c.webp',
+        ])
+
+    @unittest.skipIf(bs4 is None, "beautifulsoup4 não instalado")
+    def test_mesmo_resultado_que_o_beautifulsoup(self):
+        for html, galeria in ((pagina_sintetica('Ab12Cd', imagens=200), 'Ab12Cd'),
+                              (PAGINA_BORDA, 'Gal1'), ('<html></html>', 'Gal1')):
+            with self.subTest(galeria=galeria, tamanho=len(html)):
+                self.assertEqual(extrair_imagens_galeria(html, galeria),
+                                 extrair_com_beautifulsoup(html, galeria))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import janitor as janitor_mod
+from janitor import Janitor
+from job_store import MemoryJobStore
+
+
+class JanitorTest(unittest.TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.downloads = pasta.name
+        self.store = MemoryJobStore()
+        self.janitor = Janitor(self.store, self.downloads, ttl=100, interval=10)
+
+    def criar(self, job_id, dados=b'x' * 1000, **campos):
+        self.store.create(job_id, {'status': 'completed', 'created_at': 0, **campos})
+        os.makedirs(os.path.join(self.downloads, job_id))
+        with open(os.path.join(self.downloads, job_id, 'video.mp4'), 'wb') as f:
+            f.write(dados)
+
+    def existe(self, job_id):
+        return os.path.isdir(os.path.join(self.downloads, job_id)) and self.store.get(job_id) is not None
+
+    def test_lease_protege_a_pasta(self):
+        self.criar('a')
+        liberar = self.janitor.lease('a')
+        self.assertFalse(self.janitor.evict('a', 'ttl'))
+        self.assertTrue(self.existe('a'))
+        self.assertEqual(self.janitor.skipped_in_use, 1)
+        liberar()
+        self.assertTrue(self.janitor.evict('a', 'ttl'))
+        self.assertFalse(self.existe('a'))
+        self.assertEqual(self.janitor.evictions['ttl'], 1)
+        self.assertEqual(self.janitor.bytes_reclaimed, 1000)
+
+    def test_hardlink_compartilhado_nao_conta_como_recuperado(self):
+        self.criar('a')
+        self.criar('b')
+        # O vídeo do b é o mesmo do a (deduplicação)
+        duplicata = os.path.join(self.downloads, 'b', 'video.mp4')
+        os.remove(duplicata)
+        os.link(os.path.join(self.downloads, 'a', 'video.mp4'), duplicata)
+        self.assertTrue(self.janitor.evict('b', 'ttl'))
+        self.assertEqual(self.janitor.bytes_reclaimed, 0)
+
+    def test_expire_pelo_heap(self):
+        self.criar('vencido')
+        self.criar('ativo', status='processing')
+        self.criar('novo')
+        self.janitor.track('vencido', 50)
+        self.janitor.track('ativo', 50)
+        self.janitor.track('novo', 500)
+        self.janitor.expire(now=100)
+        self.assertFalse(self.existe('vencido'))
+        self.assertTrue(self.existe('ativo'))
+        self.assertTrue(self.existe('novo'))
+        # O ativo volta para o heap e é olhado de novo depois do intervalo
+        self.store.update('ativo', status='completed')
+        self.janitor.expire(now=105)
+        self.assertTrue(self.existe('ativo'))
+        self.janitor.expire(now=110)
+        self.assertFalse(self.existe('ativo'))
+
+    def test_lote_apaga_os_itens_junto(self):
+        self.criar('filho1')
+        self.criar('filho2', status='queued')
+        self.criar('lote', kind='batch', children=['filho1', 'filho2'])
+        # Item ainda na fila: o lote espera
+        self.assertFalse(self.janitor.evict('lote', 'ttl'))
+        self.assertTrue(self.existe('lote'))
+        self.store.update('filho2', status='error')
+        self.assertTrue(self.janitor.evict('lote', 'ttl'))
+        for job_id in ('lote', 'filho1', 'filho2'):
+            self.assertFalse(self.existe(job_id))
+
+    def test_enforce_disk_apaga_o_menos_usado(self):
+        self.criar('antigo', last_download=10)
+        self.criar('recente', last_download=30)
+        self.criar('sem_download', created_at=20)
+        self.criar('lote', kind='batch', children=[])
+        def uso(path):
+            # Cada evicção libera 5% do disco
+            return 95.0 - 5 * sum(self.janitor.evictions.values())
+
+        with mock.patch.object(janitor_mod, 'disk_usage_percent', uso):
+            self.janitor.high_water, self.janitor.low_water = 90.0, 85.0
+            self.janitor.enforce_disk()
+        self.assertFalse(self.existe('antigo'))
+        self.assertFalse(self.existe('sem_download'))
+        self.assertTrue(self.existe('recente'))
+        self.assertTrue(self.existe('lote'))
+        self.assertEqual(self.janitor.evictions['disk'], 2)
+
+    def test_resync_agenda_e_apaga_orfaos(self):
+        self.criar('com_job', created_at=time.time())
+        antigo = time.time() - 1000
+        for nome in ('orfao', 'orfao_recente'):
+            os.makedirs(os.path.join(self.downloads, nome))
+        restos = [os.path.join(self.downloads, nome) for nome in (
+            'x.info.json', 'x.info.json.cookies', 'x.info.json.123.456.tmp', 'outro.tmp')]
+        for caminho in restos:
+            with open(caminho, 'w') as f:
+                f.write('{}')
+        for caminho in (os.path.join(self.downloads, 'orfao'), os.path.join(self.downloads, 'com_job'),
+                        *restos):
+            os.utime(caminho, (antigo, antigo))
+
+        self.janitor.resync()
+        # Só os restos de info dict: outros arquivos da pasta ficam
+        self.assertEqual(sorted(os.listdir(self.downloads)), ['com_job', 'orfao_recente', 'outro.tmp'])
+        self.assertEqual(self.janitor.evictions['orphan'], 4)
+        self.assertEqual(self.janitor.stats()['scheduled'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
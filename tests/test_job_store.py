@@ -0,0 +1,137 @@
+import os
+import sys
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from job_store import (MemoryJobStore, SQLiteJobStore, current_owner, owner_is_alive,
+                       process_start_time)
+
+
+class JobStoreMixin:
+    """Comportamento igual nos dois armazenamentos"""
+
+    def test_segundo_pedido_segue_o_lider(self):
+        self.assertIsNone(self.store.create_or_follow('a', {'status': 'queued'}, 'url'))
+        self.assertEqual(self.store.create_or_follow('b', {'status': 'queued'}, 'url'), 'a')
+        # Quem segue nunca vira líder de outro
+        self.assertEqual(self.store.create_or_follow('c', {'status': 'queued'}, 'url'), 'a')
+        self.assertEqual(sorted(job_id for job_id, _ in self.store.followers('a')), ['b', 'c'])
+        self.assertEqual(self.store.get('b')['follows'], 'a')
+
+    def test_lider_concluido_nao_e_seguido(self):
+        self.store.create_or_follow('a', {'status': 'queued'}, 'url')
+        self.store.update('a', status='completed')
+        self.assertIsNone(self.store.create_or_follow('b', {'status': 'queued'}, 'url'))
+        self.assertIsNone(self.store.create_or_follow('c', {'status': 'queued'}, 'outra'))
+
+    def test_finished(self):
+        self.store.create('a', {'status': 'processing'})
+        self.store.create('b', {'status': 'error'})
+        self.assertEqual([job_id for job_id, _ in self.store.finished()], ['b'])
+
+    def test_update_de_job_inexistente(self):
+        self.assertFalse(self.store.update('nada', status='completed'))
+        self.store.create('a', {'status': 'queued', 'progress': 0})
+        self.assertTrue(self.store.update('a', progress=50))
+        self.assertEqual(self.store.get('a'), {'status': 'queued', 'progress': 50})
+
+    def test_get_many(self):
+        self.store.create('a', {'status': 'queued'})
+        self.store.create('b', {'status': 'completed'})
+        self.assertEqual(self.store.get_many(['b', 'nada', 'a']),
+                         {'a': {'status': 'queued'}, 'b': {'status': 'completed'}})
+        self.assertEqual(self.store.get_many([]), {})
+
+    def test_delete_e_count(self):
+        self.store.create('a', {'status': 'queued'})
+        self.store.create('b', {'status': 'queued'})
+        self.store.delete('a')
+        self.assertIsNone(self.store.get('a'))
+        self.assertEqual(self.store.count(), 1)
+
+
+class MemoryJobStoreTest(JobStoreMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryJobStore()
+
+    def test_nao_tem_orfaos(self):
+        self.store.create('a', {'status': 'queued'})
+        self.assertEqual(self.store.claim_orphans(current_owner()), [])
+
+
+class SQLiteJobStoreTest(JobStoreMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.pasta.name, 'jobs.db')
+        self.store = SQLiteJobStore(self.path)
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+    def trocar_dono(self, job_id, owner):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("UPDATE jobs SET owner = ? WHERE job_id = ?", (owner, job_id))
+
+    def test_claim_orphans_assume_so_jobs_ativos_de_dono_morto(self):
+        self.store.create('morto', {'status': 'processing'})
+        self.store.create('vivo', {'status': 'queued'})
+        self.store.create('concluido', {'status': 'completed'})
+        self.trocar_dono('morto', 'outro-host:1:')
+        self.trocar_dono('concluido', 'outro-host:1:')
+
+        claimed = self.store.claim_orphans(current_owner())
+        self.assertEqual([job_id for job_id, _ in claimed], ['morto'])
+        self.assertEqual(claimed[0][1]['status'], 'processing')
+        # Agora o dono é este processo, vivo: um worker novo não retoma de novo
+        self.assertEqual(self.store.claim_orphans('outro-host:2:'), [])
+
+    def test_jobs_sobrevivem_a_outro_processo(self):
+        self.store.create('a', {'status': 'processing', 'progress': 40})
+        # Novo store no mesmo arquivo, como o worker que sobe depois do restart
+        self.assertEqual(SQLiteJobStore(self.path).get('a'), {'status': 'processing', 'progress': 40})
+
+    def test_pedidos_simultaneos_tem_um_lider_so(self):
+        lideres = []
+
+        def pedir(i):
+            lideres.append(self.store.create_or_follow(f'j{i}', {'status': 'queued'}, 'url'))
+
+        threads = [threading.Thread(target=pedir, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(lideres.count(None), 1)
+        self.assertEqual(len(set(lideres) - {None}), 1)
+
+    def test_claim_orphans_ignora_o_proprio_dono(self):
+        self.store.create('a', {'status': 'queued'})
+        self.assertEqual(self.store.claim_orphans(current_owner()), [])
+
+
+class OwnerTest(unittest.TestCase):
+
+    def test_processo_atual_esta_vivo(self):
+        self.assertTrue(owner_is_alive(current_owner()))
+
+    def test_outro_host_ou_formato_invalido(self):
+        self.assertFalse(owner_is_alive(f'outro-host:{os.getpid()}:'))
+        self.assertFalse(owner_is_alive('sem-pid'))
+        self.assertFalse(owner_is_alive(None))
+
+    @unittest.skipUnless(process_start_time(os.getpid()), "sem /proc")
+    def test_pid_reaproveitado_nao_passa_pelo_dono_antigo(self):
+        host, pid, started = current_owner().split(':')
+        self.assertFalse(owner_is_alive(f'{host}:{pid}:{int(started) - 1}'))
+        # Donos antigos (host:pid) continuam valendo
+        self.assertTrue(owner_is_alive(f'{host}:{pid}'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import time
+import queue
+import unittest
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor
+
+from apoio import api
+
+
+class KillExecutorTest(unittest.TestCase):
+    """Job travado no pool: só ele morre, os outros jobs do pool terminam"""
+
+    def setUp(self):
+        self.pool = ProcessPoolExecutor(max_workers=2)
+        self.addCleanup(self.pool.shutdown, wait=False, cancel_futures=True)
+        self.fila = queue.Queue()
+        for nome, valor in (('_executor', self.pool), ('_progress_queue', self.fila)):
+            patch = mock.patch.object(api, nome, valor)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_outros_jobs_do_pool_terminam(self):
+        travado = self.pool.submit(time.sleep, 60)
+        outro = self.pool.submit(time.sleep, 0.5)
+        na_fila = self.pool.submit(pow, 2, 10)
+        processos = list(self.pool._processes.values())
+
+        inicio = time.monotonic()
+        api.kill_executor(self.pool, travado)
+        self.assertLess(time.monotonic() - inicio, 30)
+
+        # Os outros jobs terminam normalmente, sem BrokenProcessPool
+        self.assertIsNone(outro.result(timeout=0))
+        self.assertEqual(na_fila.result(timeout=0), 1024)
+        # O travado morre junto com o pool, e os jobs novos vão para outro pool
+        self.assertTrue(all(not processo.is_alive() for processo in processos))
+        self.assertIsNone(api._executor)
+        self.assertIsNone(self.fila.get_nowait())
+        self.assertEqual(api._retired_executors, {})
+
+    def test_dois_jobs_travados_no_mesmo_pool(self):
+        travados = [self.pool.submit(time.sleep, 60) for _ in range(2)]
+        api.retire_executor(self.pool, travados[1])
+        api.kill_executor(self.pool, travados[0])
+        self.assertIsNone(api._executor)
+        self.assertEqual(api._retired_executors, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
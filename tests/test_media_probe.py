@@ -0,0 +1,95 @@
+import os
+import sys
+import struct
+import tempfile
+import unittest
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+from media_probe import probe_file, media_from_info, is_complete
+from servidor_midia import caixa, caixa_completa, matriz_identidade, trilha, mp4_sintetico
+
+
+def elemento(element_id, conteudo):
+    """Elemento EBML: id (já com o marcador) + tamanho em 8 bytes + conteúdo"""
+    tamanho = (1 << 56) | len(conteudo)
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + tamanho.to_bytes(8, 'big') + conteudo
+
+
+def webm(largura=640, altura=360, duracao_ms=12500.0, escala=1_000_000, tamanho_desconhecido=False):
+    info = elemento(0x2AD7B1, escala.to_bytes(3, 'big')) + elemento(0x4489, struct.pack('>d', duracao_ms))
+    video = elemento(0xAE, elemento(0x83, b'\x01') + elemento(0x86, b'V_VP9')
+                     + elemento(0xE0, elemento(0xB0, largura.to_bytes(2, 'big'))
+                                + elemento(0xBA, altura.to_bytes(2, 'big'))))
+    som = elemento(0xAE, elemento(0x83, b'\x02') + elemento(0x86, b'A_OPUS'))
+    cluster = elemento(0x1F43B675, b'\0' * 64)
+    corpo = elemento(0x1549A966, info) + elemento(0x1654AE6B, video + som) + cluster
+    cabecalho = elemento(0x1A45DFA3, elemento(0x4282, b'webm'))
+    if tamanho_desconhecido:
+        # Segmento ao vivo / gravado em stream: tamanho "desconhecido" (todos os bits em 1)
+        return cabecalho + b'\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff' + corpo
+    return cabecalho + elemento(0x18538067, corpo)
+
+
+def mp4_moov_no_fim(duracao_ms=5000):
+    """ftyp + mdat + moov (o moov só vem depois do payload, como sem faststart)"""
+    mvhd = caixa_completa(b"mvhd", 0, struct.pack(">IIII", 0, 0, 1000, duracao_ms)
+                          + struct.pack(">IH10x", 0x10000, 0x100) + matriz_identidade()
+                          + b"\0" * 24 + struct.pack(">I", 2))
+    moov = caixa(b"moov", mvhd + trilha(1, duracao_ms, 1920, 1080, codec=b"hvc1"))
+    return caixa(b"ftyp", b"isom\0\0\0\0") + caixa(b"mdat", b"\0" * 4096) + moov
+
+
+class ProbeFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(self.pasta.cleanup)
+
+    def probe(self, dados):
+        caminho = os.path.join(self.pasta.name, 'arquivo')
+        with open(caminho, 'wb') as f:
+            f.write(dados)
+        return probe_file(caminho)
+
+    def test_mp4(self):
+        self.assertEqual(self.probe(mp4_sintetico('teste', 64 * 1024)), {
+            'duration': 60.0, 'width': 1280, 'height': 720, 'vcodec': 'avc1', 'acodec': 'mp4a'})
+
+    def test_mp4_com_moov_no_fim(self):
+        self.assertEqual(self.probe(mp4_moov_no_fim()), {
+            'duration': 5.0, 'width': 1920, 'height': 1080, 'vcodec': 'hvc1'})
+
+    def test_mp4_truncado(self):
+        dados = mp4_moov_no_fim()
+        self.assertEqual(self.probe(dados[:-40]), {})
+
+    def test_webm(self):
+        self.assertEqual(self.probe(webm()), {
+            'duration': 12.5, 'width': 640, 'height': 360, 'vcodec': 'vp9', 'acodec': 'opus'})
+
+    def test_webm_com_segmento_de_tamanho_desconhecido(self):
+        media = self.probe(webm(escala=1_000_000, tamanho_desconhecido=True))
+        self.assertEqual(media['vcodec'], 'vp9')
+        self.assertEqual(media['duration'], 12.5)
+
+    def test_formato_desconhecido_ou_ausente(self):
+        self.assertEqual(self.probe(b'GIF89a' + b'\0' * 64), {})
+        self.assertEqual(probe_file(os.path.join(self.pasta.name, 'nao-existe')), {})
+
+
+class MediaFromInfoTest(unittest.TestCase):
+
+    def test_campos_do_yt_dlp(self):
+        media = media_from_info({'width': 1920, 'height': 1080, 'duration': 61.23456,
+                                 'vcodec': 'avc1.640028', 'acodec': 'none', 'ext': 'mp4'})
+        self.assertEqual(media, {'width': 1920, 'height': 1080, 'duration': 61.235,
+                                 'vcodec': 'avc1.640028'})
+        self.assertTrue(is_complete(media))
+        self.assertFalse(is_complete({'width': 1920, 'height': 1080}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from apoio import api
+from metrics import Registry
+from universal_downloader_aac import TemposDeFase, url_da_midia
+
+
+class RegistryTest(unittest.TestCase):
+    """Formato texto do Prometheus"""
+
+    def test_render(self):
+        registry = Registry()
+        jobs = registry.counter('jobs_total', 'Jobs', ('path',))
+        jobs.inc(path='universal')
+        jobs.inc(2, path='universal')
+        jobs.inc(path='a"b\nc')
+        registry.gauge('fila', 'Fila', collect=lambda: 3)
+        registry.counter('evictions_total', 'Evicções', ('reason',), collect=lambda: {('ttl',): 1.5})
+        duracao = registry.histogram('duracao_seconds', 'Duração', buckets=(1, 10))
+        for valor in (0.5, 1, 5, 60):
+            duracao.observe(valor)
+
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP jobs_total Jobs',
+            '# TYPE jobs_total counter',
+            'jobs_total{path="universal"} 3',
+            'jobs_total{path="a\\"b\\nc"} 1',
+            '# HELP fila Fila',
+            '# TYPE fila gauge',
+            'fila 3',
+            '# HELP evictions_total Evicções',
+            '# TYPE evictions_total counter',
+            'evictions_total{reason="ttl"} 1.5',
+            '# HELP duracao_seconds Duração',
+            '# TYPE duracao_seconds histogram',
+            'duracao_seconds_bucket{le="1"} 2',
+            'duracao_seconds_bucket{le="10"} 3',
+            'duracao_seconds_bucket{le="+Inf"} 4',
+            'duracao_seconds_sum 66.5',
+            'duracao_seconds_count 4',
+        ])
+
+
+class BytesPorHostTest(unittest.TestCase):
+
+    def test_host_label(self):
+        self.assertEqual(api.host_label('rr3---sn-abc.googlevideo.com'), 'googlevideo.com')
+        self.assertEqual(api.host_label('X.COM'), 'x.com')
+        self.assertEqual(api.host_label('notx.com'), 'other')
+        self.assertEqual(api.host_label(None), 'other')
+
+    def test_bytes_contam_no_host_da_midia(self):
+        # Merge: a página é do youtube.com, os bytes vêm do CDN do vídeo
+        selecionado = {'requested_formats': [
+            {'url': 'https://rr1---sn-x.googlevideo.com/videoplayback?itag=137'},
+            {'url': 'https://rr1---sn-x.googlevideo.com/videoplayback?itag=140'}]}
+        tempos = TemposDeFase()
+        tempos.transferencia(url_da_midia(selecionado), 1000, 2.0)
+        tempos.transferencia('https://rr1---sn-x.googlevideo.com/outro', 500, 1.0)
+        self.assertEqual(tempos.resumo()[1], {'rr1---sn-x.googlevideo.com': [1500, 3.0]})
+
+    def test_resultado_do_job_vira_metricas(self):
+        antes = dict(api.HOST_BYTES._values)
+        api.observe_job_result({'bytes_per_host': {'rr1---sn-x.googlevideo.com': [1500, 3.0],
+                                                   'cdn.exemplo.net': [100, 1.0]}})
+        depois = api.HOST_BYTES._values
+        self.assertEqual(depois[('googlevideo.com',)] - antes.get(('googlevideo.com',), 0), 1500)
+        self.assertEqual(depois[('other',)] - antes.get(('other',), 0), 100)
+        self.assertIn('videobox_downloaded_bytes_total{host="googlevideo.com"}',
+                      api.app.test_client().get('/api/metrics').get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
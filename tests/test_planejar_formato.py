@@ -0,0 +1,76 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from universal_downloader_aac import planejar_formato
+
+DURACAO = 600
+
+
+def video(format_id, altura, ext, vcodec, vbr, acodec="none", abr=None):
+    formato = {"format_id": format_id, "height": altura, "ext": ext, "vcodec": vcodec,
+               "acodec": acodec, "vbr": vbr, "tbr": vbr + (abr or 0)}
+    if abr:
+        formato["abr"] = abr
+    return formato
+
+
+def audio(format_id, ext, acodec, abr):
+    return {"format_id": format_id, "ext": ext, "vcodec": "none", "acodec": acodec,
+            "abr": abr, "tbr": abr}
+
+
+# Lista no estilo do YouTube: um progressivo em 720p e vídeo/áudio separados
+FORMATOS_YOUTUBE = [
+    video("18", 360, "mp4", "avc1.42001E", 500, "mp4a.40.2", 96),
+    video("22", 720, "mp4", "avc1.64001F", 1500, "mp4a.40.2", 192),
+    video("136", 720, "mp4", "avc1.4d401f", 1500),
+    video("137", 1080, "mp4", "avc1.640028", 4000),
+    video("248", 1080, "webm", "vp9", 2500),
+    video("399", 1080, "mp4", "av01.0.08M.08", 1200),
+    audio("139", "m4a", "mp4a.40.5", 48),
+    audio("140", "m4a", "mp4a.40.2", 128),
+    audio("251", "webm", "opus", 140),
+    {"format_id": "sb0", "ext": "mhtml", "vcodec": "none", "acodec": "none"},
+]
+
+
+class PlanejarFormatoTest(unittest.TestCase):
+
+    def planejar(self, formatos, ffmpeg=True):
+        return planejar_formato({"formats": formatos, "duration": DURACAO}, ffmpeg=ffmpeg)
+
+    def test_melhor_qualidade_de_menor_custo(self):
+        # 399+139 e 248+140 são mais baratos em 1080p, mas bem abaixo em bitrate
+        formato, custo = self.planejar(FORMATOS_YOUTUBE)
+        self.assertEqual(formato, "137+140")
+        self.assertGreater(custo, 0)
+
+    def test_qualidade_equivalente_decide_pelo_custo(self):
+        # 248 está dentro da tolerância do 137 e é menor; o 251 (Opus) pagaria
+        # a conversão para AAC
+        formatos = [f for f in FORMATOS_YOUTUBE if f["format_id"] != "248"]
+        formatos.append(video("248", 1080, "webm", "vp9", 3500))
+        self.assertEqual(self.planejar(formatos)[0], "248+140")
+
+    def test_sem_ffmpeg_fica_com_o_progressivo(self):
+        formato, _ = self.planejar(FORMATOS_YOUTUBE, ffmpeg=False)
+        self.assertEqual(formato, "22")
+
+    def test_progressivo_de_mesma_qualidade_nao_paga_merge(self):
+        formatos = [video("22", 720, "mp4", "avc1", 1500, "mp4a.40.2", 128),
+                    video("136", 720, "mp4", "avc1", 1500), audio("140", "m4a", "mp4a.40.2", 128)]
+        self.assertEqual(self.planejar(formatos)[0], "22")
+
+    def test_sem_formatos_ou_nao_video(self):
+        self.assertIsNone(self.planejar([]))
+        self.assertIsNone(planejar_formato(None))
+        self.assertIsNone(planejar_formato({"_type": "playlist", "formats": FORMATOS_YOUTUBE}))
+        # Acima de 1080p não é candidato
+        self.assertIsNone(self.planejar([video("313", 2160, "webm", "vp9", 12000, "opus", 160)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
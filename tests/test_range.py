@@ -0,0 +1,127 @@
+import os
+import re
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import universal_downloader_aac as downloader
+from universal_downloader_aac import faixa_do_content_range, inicio_do_content_range
+
+ARQUIVO = os.urandom(3 * 1024 * 1024)
+CORTE = 1024 * 1024
+
+
+def resposta(content_range=None):
+    return SimpleNamespace(headers={"Content-Range": content_range} if content_range else {})
+
+
+class ContentRangeTest(unittest.TestCase):
+
+    def test_faixa(self):
+        self.assertEqual(faixa_do_content_range(resposta("bytes 100-199/200")), (100, 199, 200))
+        self.assertEqual(faixa_do_content_range(resposta("bytes 0-99/*")), (0, 99, None))
+        self.assertEqual(inicio_do_content_range(resposta("bytes 100-199/200")), 100)
+
+    def test_416(self):
+        self.assertEqual(faixa_do_content_range(resposta("bytes */200")), (None, None, 200))
+
+    def test_ausente_ou_invalido(self):
+        self.assertIsNone(faixa_do_content_range(resposta()))
+        self.assertIsNone(faixa_do_content_range(resposta("items 0-1/2")))
+        self.assertIsNone(inicio_do_content_range(resposta("bytes x-y/z")))
+
+
+class Servidor(BaseHTTPRequestHandler):
+    """Corta a primeira resposta em CORTE bytes; as seguintes seguem `modo`"""
+    modo = "ok"
+    ranges = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        pedido = self.headers.get("Range")
+        self.ranges.append(pedido)
+        if len(self.ranges) == 1:
+            self.enviar(200, ARQUIVO, len(ARQUIVO), corte=CORTE)
+        elif pedido and self.modo == "206_do_zero":
+            self.enviar(206, ARQUIVO, content_range=f"bytes 0-{len(ARQUIVO) - 1}/{len(ARQUIVO)}")
+        elif pedido and self.modo == "416_outro_total":
+            self.enviar(416, b"", content_range=f"bytes */{len(ARQUIVO)}")
+        elif pedido:
+            inicio = int(re.match(r"bytes=(\d+)-", pedido).group(1))
+            self.enviar(206, ARQUIVO[inicio:],
+                        content_range=f"bytes {inicio}-{len(ARQUIVO) - 1}/{len(ARQUIVO)}")
+        else:
+            self.enviar(200, ARQUIVO)
+
+    def enviar(self, status, corpo, tamanho=None, content_range=None, corte=None):
+        self.send_response(status)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(tamanho if tamanho is not None else len(corpo)))
+        if content_range:
+            self.send_header("Content-Range", content_range)
+        self.end_headers()
+        self.wfile.write(corpo[:corte])
+        if corte:
+            # Conexão cai no meio: o cliente fica com um .part
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(2)
+
+
+class RetomadaTest(unittest.TestCase):
+    """baixar_arquivo_simples contra um servidor local que derruba a 1ª conexão"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Servidor)
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.servidor.server_address[1]}/arquivo.bin"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        # Sem downloader_universal.log na pasta de onde os testes rodam
+        with mock.patch.object(downloader, "ARQUIVO_LOG", ""):
+            self.downloader = downloader.MultiSiteDownloader(self.pasta.name, silencioso=True)
+        Servidor.ranges = []
+        sem_espera = mock.patch.object(downloader, "backoff_com_jitter", return_value=0)
+        sem_espera.start()
+        self.addCleanup(sem_espera.stop)
+
+    def tearDown(self):
+        self.downloader.sessao.close()
+        self.pasta.cleanup()
+
+    def baixar(self, modo):
+        Servidor.modo = modo
+        destino = Path(self.pasta.name) / "arquivo.bin"
+        self.assertTrue(self.downloader.baixar_arquivo_simples(self.url, destino, max_tentativas=4))
+        self.assertEqual(destino.read_bytes(), ARQUIVO)
+        self.assertFalse(destino.with_name("arquivo.bin.part").exists())
+        return Servidor.ranges
+
+    def test_retoma_do_fim_do_parcial(self):
+        self.assertEqual(self.baixar("ok"), [None, f"bytes={CORTE}-"])
+
+    def test_206_de_outra_faixa_recomeca_sem_range(self):
+        self.assertEqual(self.baixar("206_do_zero"), [None, f"bytes={CORTE}-", None])
+
+    def test_416_sem_o_total_do_parcial_recomeca_sem_range(self):
+        self.assertEqual(self.baixar("416_outro_total"), [None, f"bytes={CORTE}-", None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from scheduler import JobScheduler, QueueFullError
+
+
+class SchedulerTest(unittest.TestCase):
+    """Ordem da fila (WFQ por cliente, custo e aging) com um worker preso num job"""
+
+    def setUp(self):
+        self.ordem = []
+        self.liberar = threading.Event()
+
+    def tearDown(self):
+        self.liberar.set()
+
+    def criar(self, **kwargs):
+        """Scheduler de um worker, já ocupado: o que for submetido fica na fila"""
+        scheduler = JobScheduler(max_concurrent=1, max_pending=10, **kwargs)
+        scheduler.submit('trava', lambda job_id: self.liberar.wait(5))
+        fim = time.monotonic() + 5
+        while scheduler.stats()['running'] == 0 and time.monotonic() < fim:
+            time.sleep(0.01)
+        return scheduler
+
+    def registrar(self, job_id):
+        self.ordem.append(job_id)
+
+    def executar(self, scheduler, total):
+        """Solta o worker e espera os `total` jobs da fila rodarem"""
+        self.liberar.set()
+        fim = time.monotonic() + 5
+        while len(self.ordem) < total and time.monotonic() < fim:
+            time.sleep(0.01)
+        return self.ordem
+
+    def test_curto_passa_na_frente_do_longo(self):
+        scheduler = self.criar(aging=0)
+        scheduler.submit('longo', self.registrar, cost=100, client='a')
+        scheduler.submit('curto', self.registrar, cost=1, client='b')
+        self.assertEqual(scheduler.position('curto'), 1)
+        self.assertEqual(scheduler.position('longo'), 2)
+        self.assertEqual(self.executar(scheduler, 2), ['curto', 'longo'])
+
+    def test_divisao_justa_entre_clientes(self):
+        scheduler = self.criar(aging=0)
+        for i in range(3):
+            scheduler.submit(f'a{i}', self.registrar, cost=10, client='a')
+        scheduler.submit('b0', self.registrar, cost=10, client='b')
+        # O job de b não espera a fila inteira de a, só o primeiro
+        self.assertEqual(scheduler.position('b0'), 2)
+        self.assertEqual(self.executar(scheduler, 4), ['a0', 'b0', 'a1', 'a2'])
+
+    def test_aging_favorece_quem_espera_ha_mais_tempo(self):
+        scheduler = self.criar(aging=1000)
+        scheduler.submit('longo', self.registrar, cost=100, client='a')
+        time.sleep(0.2)
+        # 0,2 s de espera valem 200 s de custo: o longo já não perde para o curto
+        scheduler.submit('curto', self.registrar, cost=1, client='b')
+        self.assertEqual(self.executar(scheduler, 2), ['longo', 'curto'])
+
+    def test_set_cost_reordena(self):
+        scheduler = self.criar(aging=0)
+        scheduler.submit('x', self.registrar, client='a')
+        scheduler.submit('y', self.registrar, client='b')
+        self.assertEqual(scheduler.position('x'), 1)
+        self.assertTrue(scheduler.set_cost('x', 1000))
+        self.assertEqual(scheduler.position('y'), 1)
+        self.assertFalse(scheduler.set_cost('inexistente', 1))
+        self.assertEqual(self.executar(scheduler, 2), ['y', 'x'])
+
+    def test_ordem_de_chegada_e_posicao(self):
+        scheduler = self.criar()
+        for job_id in ('x', 'y', 'z'):
+            scheduler.submit(job_id, self.registrar)
+        self.assertEqual([scheduler.position(job_id) for job_id in ('x', 'y', 'z')], [1, 2, 3])
+        self.assertIsNone(scheduler.position('inexistente'))
+        self.assertEqual(self.executar(scheduler, 3), ['x', 'y', 'z'])
+        self.assertIsNone(scheduler.position('x'))
+
+    def test_positions_igual_a_position(self):
+        scheduler = self.criar()
+        for job_id, custo in (('x', 50), ('y', 5), ('z', None), ('w', 5)):
+            scheduler.submit(job_id, self.registrar, cost=custo, client=job_id)
+        ids = ('x', 'y', 'z', 'w', 'inexistente')
+        self.assertEqual(scheduler.positions(ids),
+                         {job_id: scheduler.position(job_id) for job_id in ids[:4]})
+        self.assertEqual(sorted(scheduler.positions(ids).values()), [1, 2, 3, 4])
+
+    def test_fila_cheia(self):
+        scheduler = JobScheduler(max_concurrent=1, max_pending=0, default_duration=30)
+        with self.assertRaises(QueueFullError) as erro:
+            scheduler.submit('x', self.registrar)
+        self.assertEqual(erro.exception.retry_after, 30)
+        self.assertEqual(scheduler.stats()['rejected'], 1)
+
+    def test_eta_por_ondas(self):
+        scheduler = JobScheduler(max_concurrent=2, default_duration=10)
+        self.assertEqual(scheduler.eta(1), 10)
+        self.assertEqual(scheduler.eta(3), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import unittest
+from unittest import mock
+
+from apoio import api, criar_job
+
+DADOS = os.urandom(512 * 1024)
+METADE = len(DADOS) // 2
+
+
+class StreamPartialTest(unittest.TestCase):
+    """/api/download de um arquivo ainda em .part (tail-follow do download)"""
+
+    def setUp(self):
+        for nome, valor in (('STREAM_MIN_BYTES', 1024), ('STREAM_POLL_INTERVAL', 0.01),
+                            ('STREAM_CHUNK_SIZE', 64 * 1024)):
+            patch = mock.patch.object(api, nome, valor)
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = api.app.test_client()
+        self.job_id = criar_job(status='processing', stream={'filename': 'video.mp4'})
+        self.job_dir = os.path.join(api.DOWNLOADS_DIR, self.job_id)
+        self.final = os.path.join(self.job_dir, 'video.mp4')
+        self.parcial = self.final + '.part'
+        with open(self.parcial, 'wb') as f:
+            f.write(DADOS[:METADE])
+        self.progresso(METADE)
+
+    def progresso(self, contiguos, **campos):
+        api.job_store.update(self.job_id, download={'filename': 'video.mp4', 'contiguous_bytes': contiguos,
+                                                    'total_bytes': len(DADOS)}, **campos)
+
+    def abrir(self):
+        """Resposta em streaming e os bytes já recebidos (até a metade gravada)"""
+        resposta = self.client.get(f'/api/download/{self.job_id}/video.mp4', buffered=False)
+        self.addCleanup(resposta.close)
+        self.assertEqual(resposta.status_code, 200)
+        partes = iter(resposta.response)
+        recebido = b''
+        while len(recebido) < METADE:
+            recebido += next(partes)
+        return partes, recebido
+
+    def concluir_download(self):
+        with open(self.parcial, 'ab') as f:
+            f.write(DADOS[METADE:])
+        os.rename(self.parcial, self.final)
+
+    def test_segue_ate_o_rename_do_final(self):
+        partes, recebido = self.abrir()
+        self.concluir_download()
+        self.progresso(len(DADOS), status='completed')
+        self.assertEqual(recebido + b''.join(partes), DADOS)
+
+    def test_troca_pela_deduplicacao_nao_aborta(self):
+        partes, recebido = self.abrir()
+        self.concluir_download()
+        # Outro job já tinha o mesmo arquivo: o final vira um hardlink dele
+        outro = criar_job({'video.mp4': DADOS})
+        os.link(os.path.join(api.DOWNLOADS_DIR, outro, 'video.mp4'), self.final + '.dedup')
+        os.replace(self.final + '.dedup', self.final)
+        # Job ainda rodando (hashes, AAC...): o resto sai do inode já aberto
+        self.progresso(len(DADOS))
+        while len(recebido) < len(DADOS):
+            recebido += next(partes)
+        self.assertEqual(recebido, DADOS)
+        self.progresso(len(DADOS), status='completed')
+        self.assertEqual(b''.join(partes), b'')
+
+    def test_recomeco_em_outro_arquivo_aborta(self):
+        partes, _ = self.abrir()
+        # O fallback apaga o .part e grava outro do zero
+        os.remove(self.parcial)
+        with open(self.parcial, 'wb') as f:
+            f.write(DADOS[:1024])
+        self.progresso(1024)
+        with self.assertRaises(IOError):
+            b''.join(partes)
+
+    def test_erro_no_job_aborta(self):
+        partes, _ = self.abrir()
+        api.job_store.update(self.job_id, status='error')
+        with self.assertRaises(IOError):
+            b''.join(partes)
+
+
+if __name__ == '__main__':
+    unittest.main()
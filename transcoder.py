@@ -0,0 +1,96 @@
+import os
+import shutil
+import subprocess
+import threading
+
+# Áudio que já é AAC (nada a converter)
+AAC_CODECS = ('mp4a', 'aac')
+AAC_BITRATE = '192k'
+# Conexão parada (sem ler nem gravar) por mais que isso derruba a entrada
+RW_TIMEOUT = 30
+
+
+def ffmpeg_path():
+    return shutil.which('ffmpeg')
+
+
+def default_slots():
+    """Conversões simultâneas: o encoder AAC usa ~1 núcleo; metade fica para downloads e API"""
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def needs_aac(acodec):
+    """True se o áudio precisa virar AAC (codec desconhecido ou sem áudio: não)"""
+    if not acodec or acodec == 'none':
+        return False
+    return not acodec.lower().startswith(AAC_CODECS)
+
+
+def _input_args(source, headers=None):
+    args = []
+    if source.startswith(('http://', 'https://')):
+        if headers:
+            args += ['-headers', ''.join(f'{name}: {value}\r\n' for name, value in headers.items())]
+        # Quedas de conexão no meio: o ffmpeg retoma de onde parou; CDN que
+        # para de mandar bytes sem fechar a conexão vira erro (microssegundos)
+        args += ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5',
+                 '-rw_timeout', str(RW_TIMEOUT * 1_000_000)]
+    return args + ['-i', source]
+
+
+def build_command(inputs, output, transcode_audio=True, ffmpeg='ffmpeg'):
+    """ffmpeg que copia o vídeo e converte (ou copia) o áudio para um MP4
+
+    `inputs` é [(url_ou_caminho, headers)]: um arquivo progressivo ou vídeo +
+    áudio separados. Com URLs, o ffmpeg baixa e converte ao mesmo tempo,
+    sem o merge depois dos dois downloads.
+    """
+    command = [ffmpeg, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y']
+    for source, headers in inputs:
+        command += _input_args(source, headers)
+    if len(inputs) == 1:
+        command += ['-map', '0:v:0?', '-map', '0:a:0?']
+    else:
+        command += ['-map', '0:v:0', '-map', '1:a:0']
+    command += ['-c:v', 'copy']
+    command += ['-c:a', 'aac', '-b:a', AAC_BITRATE] if transcode_audio else ['-c:a', 'copy']
+    # Um encoder por conversão: cada uma ocupa uma vaga (~1 núcleo)
+    command += ['-threads', '1', '-f', 'mp4', '-nostats', '-progress', 'pipe:1', str(output)]
+    return command
+
+
+def run(command, on_progress=None, timeout=None):
+    """Roda o ffmpeg repassando os bytes gravados a `on_progress`; erro, ou
+    passar de `timeout` segundos no total, vira RuntimeError"""
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    # O timeout do communicate() só contaria depois do stdout fechar; o timer
+    # mata o ffmpeg travado no meio da leitura do progresso
+    expired = threading.Event()
+    def expire():
+        expired.set()
+        process.kill()
+    timer = threading.Timer(timeout, expire) if timeout else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+    try:
+        written = 0
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            if key == 'total_size' and value.isdigit():
+                written = int(value)
+            elif key == 'progress' and on_progress:
+                on_progress(written)
+        _, errors = process.communicate()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        if timer:
+            timer.cancel()
+    if expired.is_set():
+        raise RuntimeError(f"ffmpeg excedeu {timeout}s e foi interrompido")
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg saiu com código {process.returncode}: {errors.strip()[-500:]}")
+    return written
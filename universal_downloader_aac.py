@@ -1,35 +1,501 @@
 import os
 import re
+import sys
+import copy
+import json
 import time
+import random
+import math
 import logging
+import argparse
+import threading
 import requests
 import yt_dlp
-from bs4 import BeautifulSoup
 from pathlib import Path
-import tkinter as tk
-from tkinter import messagebox
+from contextlib import contextmanager
+from html.parser import HTMLParser
 from urllib.parse import urlparse, urljoin, unquote
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from dedup_index import DedupIndex, new_hasher, hash_file
+from media_probe import media_from_info, is_complete, probe_file
+import transcoder
+
+# LIMITA A 1080p COMO MÁXIMO - configuração simplificada
+FORMATO_1080P = (
+    # 1ª Prioridade: 1080p com melhor áudio (formato já pronto)
+    "best[height<=1080][height>=720][ext=mp4]/"
+    "bestvideo[height<=1080][height>=720]+bestaudio[ext=m4a]/"
+    "bestvideo[height<=1080][height>=720]+bestaudio/"
+    
+    # 2ª Prioridade: Qualquer resolução ≤ 1080p
+    "best[height<=1080][ext=mp4]/"
+    "bestvideo[height<=1080]+bestaudio[ext=m4a]/"
+    "bestvideo[height<=1080]+bestaudio/"
+    
+    # 3ª Prioridade: Melhor disponível como último recurso
+    "best[ext=mp4]/bestvideo+bestaudio/best"
+)
+
+# Planejador de formatos: custo esperado em segundos de download, merge e
+# conversão para AAC (só entre os formatos da melhor resolução ≤ 1080p e de
+# qualidade equivalente à melhor dela)
+BANDA_ESTIMADA = 8 * 1024 * 1024          # bytes/s de download
+VAZAO_FFMPEG = 200 * 1024 * 1024          # bytes/s copiados no merge (disco)
+CUSTO_FFMPEG = 0.5                        # subir o ffmpeg e abrir as entradas
+CUSTO_AAC_POR_SEGUNDO = 0.02              # CPU do encoder AAC por segundo de áudio
+# Bitrate até 25% abaixo do melhor candidato conta como mesma qualidade
+TOLERANCIA_QUALIDADE = 0.25
+
+def tamanho_estimado(formato, duracao):
+    """Tamanho informado ou estimado pelo bitrate (0 se desconhecido)"""
+    tamanho = formato.get("filesize") or formato.get("filesize_approx")
+    if not tamanho and formato.get("tbr") and duracao:
+        tamanho = formato["tbr"] * 125 * duracao
+    return tamanho or 0
+
+def bitrates(formatos):
+    """(kbps do vídeo, kbps do áudio) de um candidato; 0 se desconhecido"""
+    video, audio = formatos[0], formatos[-1]
+    abr = audio.get("abr") or (len(formatos) > 1 and audio.get("tbr")) or 0
+    vbr = video.get("vbr") or max(0, (video.get("tbr") or 0) - (abr if len(formatos) == 1 else 0))
+    return vbr, abr
+
+def custo_dos_formatos(formatos, duracao, ffmpeg):
+    """Custo esperado (s) de ter o arquivo em MP4 + AAC: download, merge e conversão"""
+    tamanho = sum(tamanho_estimado(f, duracao) for f in formatos)
+    custo = tamanho / BANDA_ESTIMADA
+    aac = transcoder.needs_aac(formatos[-1].get("acodec"))
+    if len(formatos) > 1 or aac:
+        if not ffmpeg:
+            # Sem ffmpeg não há merge; o arquivo pronto fica com o áudio original
+            return math.inf if len(formatos) > 1 else custo
+        custo += CUSTO_FFMPEG + tamanho / VAZAO_FFMPEG
+        if aac:
+            custo += (duracao or 0) * CUSTO_AAC_POR_SEGUNDO
+    return custo
+
+def planejar_formato(info, ffmpeg=True):
+    """(format_id ou "video+audio", custo) na melhor resolução ≤ 1080p
+    possível, ou None (fica a seleção padrão do FORMATO_1080P)
+    
+    A qualidade vem primeiro: o candidato de maior bitrate de vídeo (e depois
+    de áudio) da resolução define a referência, e só os candidatos até
+    TOLERANCIA_QUALIDADE abaixo dela, no vídeo e no áudio, disputam pelo
+    custo. Entre esses, arquivos progressivos prontos não pagam merge e áudio
+    que já é AAC não paga conversão. A resolução só cai se nenhum candidato
+    dela for viável (ex.: só vídeo sem áudio e nenhum ffmpeg para o merge).
+    """
+    if not info or info.get("_type", "video") != "video":
+        return None
+    formatos = [f for f in info.get("formats") or [] if f.get("format_id") and f.get("ext") != "mhtml"]
+    videos = [f for f in formatos
+              if f.get("vcodec") != "none" and f.get("height") and f["height"] <= 1080]
+    audios = [f for f in formatos if f.get("vcodec") == "none" and f.get("acodec") != "none"]
+    duracao = info.get("duration")
+    
+    for altura in sorted({f["height"] for f in videos}, reverse=True):
+        candidatos = []
+        for video in videos:
+            if video["height"] != altura:
+                continue
+            if video.get("acodec") != "none":
+                candidatos.append([video])
+            else:
+                candidatos.extend([video, audio] for audio in audios)
+        
+        viaveis = [(custo_dos_formatos(c, duracao, ffmpeg), i, c) for i, c in enumerate(candidatos)]
+        viaveis = [(custo, i, c) for custo, i, c in viaveis if custo != math.inf]
+        if not viaveis:
+            continue
+        
+        video_ref, audio_ref = max(bitrates(c) for _, _, c in viaveis)
+        minimo = 1 - TOLERANCIA_QUALIDADE
+        custos = [(custo, c[0].get("ext") != "mp4", -sum(f.get("tbr") or 0 for f in c), i)
+                  for custo, i, c in viaveis
+                  if bitrates(c)[0] >= video_ref * minimo and bitrates(c)[1] >= audio_ref * minimo]
+        custo, *_, melhor = min(custos)
+        return "+".join(f["format_id"] for f in candidatos[melhor]), custo
+    return None
+
+# Download de imagens: quantas em paralelo e quantas conexões por host
+IMAGENS_PARALELAS = int(os.environ.get("VIDEOBOX_IMAGENS_PARALELAS", "8"))
+CONEXOES_POR_HOST = int(os.environ.get("VIDEOBOX_CONEXOES_POR_HOST", "4"))
+
+def ler_limites_por_host(texto, tipo=int):
+    """'googlevideo.com=4,erome.com=2' -> {'googlevideo.com': 4, 'erome.com': 2}"""
+    limites = {}
+    for item in texto.split(","):
+        if "=" in item:
+            host, valor = item.split("=", 1)
+            limites[host.strip().lower()] = tipo(valor)
+    return limites
+
+# Downloads segmentados: conexões paralelas por arquivo progressivo e
+# fragmentos simultâneos em HLS/DASH (padrão, por host e por job)
+SEGMENTOS_PADRAO = int(os.environ.get("VIDEOBOX_SEGMENTOS", "4"))
+SEGMENTOS_POR_HOST = ler_limites_por_host(os.environ.get("VIDEOBOX_SEGMENTOS_POR_HOST", ""))
+SEGMENTO_MINIMO = 4 * 1024 * 1024  # arquivos menores vão numa conexão só
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Info dict extraído antes do job (estimativa de custo da API): reaproveitado
+# até esta idade, em segundos (as URLs dos formatos expiram)
+INFO_VALIDADE = 1800
+
+# Listas de URLs: inícios por segundo em um mesmo host (token bucket) e rajada
+TAXA_POR_HOST = 0.5
+RAJADA_POR_HOST = 2
+
+class LimitadorPorHost:
+    """Token bucket por host: no máximo `taxa` URLs iniciadas por segundo em
+    cada host, com rajadas de até `rajada`. Hosts diferentes não esperam uns
+    pelos outros (substitui a pausa fixa de 2s entre URLs)."""
+    
+    def __init__(self, taxa=TAXA_POR_HOST, rajada=RAJADA_POR_HOST, limites=None):
+        self.taxa = taxa
+        self.rajada = rajada
+        # Taxas específicas por host/sufixo: {'erome.com': 0.2}
+        self.limites = limites or {}
+        self._baldes = {}
+        self._lock = threading.Lock()
+    
+    def taxa_do_host(self, host):
+        for sufixo, taxa in self.limites.items():
+            if host == sufixo or host.endswith("." + sufixo):
+                return taxa
+        return self.taxa
+    
+    def aguardar(self, url):
+        """Consome uma ficha do host da URL, dormindo o necessário"""
+        host = (urlparse(url).hostname or "").lower()
+        taxa = self.taxa_do_host(host)
+        if taxa <= 0:
+            return 0.0
+        
+        with self._lock:
+            agora = time.monotonic()
+            fichas, ultimo = self._baldes.get(host, (self.rajada, agora))
+            fichas = min(self.rajada, fichas + (agora - ultimo) * taxa) - 1
+            # Saldo negativo = reserva: a espera fica fora do lock
+            self._baldes[host] = (fichas, agora)
+        
+        espera = -fichas / taxa if fichas < 0 else 0.0
+        if espera:
+            time.sleep(espera)
+        return espera
+
+# Orçamento global de conexões de download. A API troca por um semáforo
+# compartilhado entre os processos do pool; um job nunca pega todas.
+MAX_CONEXOES = int(os.environ.get("VIDEOBOX_MAX_CONEXOES", "16"))
+conexoes_globais = threading.BoundedSemaphore(MAX_CONEXOES)
+
+def reservar_conexoes(quantidade):
+    """Reserva até `quantidade` conexões do orçamento global, sem bloquear"""
+    obtidas = 0
+    while obtidas < quantidade and conexoes_globais.acquire(False):
+        obtidas += 1
+    return obtidas
+
+def liberar_conexoes(quantidade):
+    for _ in range(quantidade):
+        conexoes_globais.release()
+
+# Conversões para AAC simultâneas (um ffmpeg, ~1 núcleo, cada). A API troca
+# por um semáforo compartilhado entre os processos do pool
+MAX_TRANSCODIFICACOES = int(os.environ.get("VIDEOBOX_MAX_TRANSCODIFICACOES", str(transcoder.default_slots())))
+transcodificacoes_globais = threading.BoundedSemaphore(MAX_TRANSCODIFICACOES)
+# Tempo máximo de um ffmpeg (download + conversão): a vaga de conversão
+# nunca fica presa num CDN parado. Num job da API vale o que for menor entre
+# isso e o que sobra do prazo do job
+TIMEOUT_FFMPEG = int(os.environ.get("VIDEOBOX_TIMEOUT_FFMPEG", "240"))
+# Prazo de um job na API (segundos desde o despacho, o timeout do pool,
+# zygote e subprocesso) e a folga que fica para o fallback e a resposta
+PRAZO_DO_JOB = 300
+FOLGA_DO_PRAZO = 15
+# Merge e conversão AAC pelo ffmpeg lendo as URLs durante o download: só
+# ligado de propósito; o padrão é o yt-dlp baixar e a conversão vir depois
+FFMPEG_DURANTE_DOWNLOAD = os.environ.get("VIDEOBOX_FFMPEG_DURANTE_DOWNLOAD", "0") == "1"
+
+def url_da_midia(selecionado):
+    """URL que de fato será baixada (a do vídeo, num merge), ou None"""
+    if not selecionado:
+        return None
+    formatos = selecionado.get("requested_formats") or [selecionado]
+    return formatos[0].get("url")
+
+def segmentos_para(url, pedido=None):
+    """Conexões para um download: pedido do job, limitado pelo limite do host"""
+    segmentos = pedido or SEGMENTOS_PADRAO
+    host = (urlparse(url).hostname or "").lower()
+    for sufixo, limite in SEGMENTOS_POR_HOST.items():
+        if host == sufixo or host.endswith("." + sufixo):
+            segmentos = min(segmentos, limite)
+    return max(1, segmentos)
+
+# Extratores do yt-dlp já instanciados, por thread. Reaproveitá-los entre
+# jobs mantém aquecidos os caches internos (player JS, assinaturas, tokens).
+# add_info_extractor aponta o extrator para o YoutubeDL mais recente: com um
+# conjunto por thread, a extração de um job nunca passa pelo YoutubeDL (e
+# pelos cookies) de outro que roda ao mesmo tempo (--paralelos, estimativas).
+_extratores_aquecidos = threading.local()
+
+def criar_youtubedl(ydl_opts):
+    """Cria um YoutubeDL reaproveitando os extratores aquecidos da thread"""
+    ydl = yt_dlp.YoutubeDL(ydl_opts)
+    for ie in getattr(_extratores_aquecidos, "instancias", {}).values():
+        ydl.add_info_extractor(ie)
+    return ydl
+
+def guardar_extratores(ydl):
+    """Guarda os extratores usados pelo YoutubeDL para os próximos jobs da thread"""
+    if not hasattr(_extratores_aquecidos, "instancias"):
+        _extratores_aquecidos.instancias = {}
+    _extratores_aquecidos.instancias.update(ydl._ies_instances)
+
+def backoff_com_jitter(tentativa, base=2.0, maximo=30.0):
+    """Espera exponencial (2s, 4s, 8s... até 30s) com jitter de ±50%"""
+    return min(maximo, base * 2 ** (tentativa - 1)) * random.uniform(0.5, 1.5)
+
+def tamanho_de_chunk(content_length, minimo=64 * 1024, maximo=1024 * 1024):
+    """Chunk de leitura proporcional ao arquivo (~64 leituras), entre 64 KiB e 1 MiB"""
+    try:
+        total = int(content_length)
+    except (TypeError, ValueError):
+        return minimo
+    return max(minimo, min(maximo, total // 64))
+
+def faixa_do_content_range(resposta):
+    """(início, fim, total) do Content-Range; "bytes */N" (416) dá (None, None, N)
+    e total "*" dá None. None se o header faltar ou for inválido."""
+    match = re.fullmatch(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)",
+                         resposta.headers.get("Content-Range", "").strip())
+    if not match:
+        return None
+    return tuple(int(valor) if valor and valor != "*" else None for valor in match.groups())
+
+def inicio_do_content_range(resposta):
+    """Byte inicial do Content-Range de uma resposta 206 (ou None)"""
+    faixa = faixa_do_content_range(resposta)
+    return faixa[0] if faixa else None
+
+EXTENSOES_IMAGEM = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+
+class ExtratorGaleria(HTMLParser):
+    """Lê o HTML numa passada, sem montar árvore, guardando só as imagens da galeria
+    
+    `principais`: data-src das <img class="img-front|img-back">;
+    `atributos`: atributos data-* com imagem da galeria (sem thumbs e posters).
+    """
+    
+    def __init__(self, galeria_id):
+        super().__init__(convert_charrefs=True)
+        self.galeria_id = galeria_id
+        self.principais = []
+        self.atributos = []
+    
+    def handle_starttag(self, tag, attrs):
+        # A maioria das tags não cita a galeria: descarta sem olhar atributo por atributo
+        if not any(valor and self.galeria_id in valor for _, valor in attrs):
+            return
+        attrs = dict(attrs)
+        
+        if tag == "img" and {"img-front", "img-back"}.intersection((attrs.get("class") or "").split()):
+            data_src = attrs.get("data-src")
+            if data_src and self.galeria_id in data_src:
+                self.principais.append(data_src)
+        
+        for attr, valor in attrs.items():
+            if attr.startswith("data-") and valor and self.galeria_id in valor:
+                minusculo = valor.lower()
+                if (any(ext in minusculo for ext in EXTENSOES_IMAGEM) and
+                        "/thumbs/" not in minusculo and  # Evita thumbnails
+                        "poster" not in attr):           # Evita posters/capas de vídeo
+                    self.atributos.append(valor)
+
+def extrair_imagens_galeria(html, galeria_id):
+    """Imagens da galeria (principais primeiro), sem repetição e na ordem da página"""
+    extrator = ExtratorGaleria(galeria_id)
+    extrator.feed(html)
+    extrator.close()
+    # dict.fromkeys: remove duplicatas em O(n) mantendo a ordem
+    return list(dict.fromkeys(filter(None, extrator.principais + extrator.atributos)))
+
+def arquivos_do_resultado(resultado):
+    """Arquivos finais gravados pelo yt-dlp (requested_downloads, inclusive
+    das entradas de playlists), com os campos de mídia de cada um:
+    {caminho: {width, height, duration, vcodec, acodec}}"""
+    arquivos = {}
+    if not isinstance(resultado, dict):
+        return arquivos
+    for download in resultado.get("requested_downloads") or []:
+        caminho = download.get("filepath") or download.get("_filename")
+        if caminho:
+            arquivos[Path(caminho)] = media_from_info(download)
+    for entrada in resultado.get("entries") or []:
+        arquivos.update(arquivos_do_resultado(entrada))
+    return arquivos
+
+class TemposDeFase:
+    """Tempo gasto em cada fase do job e bytes transferidos por host
+    
+    Mede fases inteiras (extração, download, merge, probe...), nunca por
+    chunk; os números voltam no resultado do job para as métricas da API.
+    """
+    
+    def __init__(self):
+        self.segundos = {}
+        self.bytes_por_host = {}
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def medir(self, fase):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.somar(fase, time.perf_counter() - inicio)
+    
+    def somar(self, fase, segundos):
+        with self._lock:
+            self.segundos[fase] = self.segundos.get(fase, 0.0) + segundos
+    
+    def transferencia(self, url, tamanho, segundos):
+        """Registra `tamanho` bytes recebidos de um host em `segundos`"""
+        host = (urlparse(url).hostname or "").lower()
+        with self._lock:
+            total = self.bytes_por_host.setdefault(host, [0, 0.0])
+            total[0] += tamanho
+            total[1] += segundos
+    
+    def resumo(self):
+        with self._lock:
+            return ({fase: round(segundos, 4) for fase, segundos in self.segundos.items()},
+                    {host: [total[0], round(total[1], 4)] for host, total in self.bytes_por_host.items()})
+
+class ReportadorProgresso:
+    """Converte os hooks do yt-dlp em atualizações de progresso (dicts)"""
+    
+    def __init__(self, callback=None, intervalo=0.5, tempos=None):
+        self.callback = callback
+        self.intervalo = intervalo
+        self._ultimo = 0
+        # Tempo de merge/pós-processamento (medido pelos hooks do yt-dlp)
+        self.tempos = tempos
+        self.segundos_pos_processamento = 0.0
+        self._inicio_pos = {}
+    
+    def emitir(self, **campos):
+        """Repassa o progresso ao callback (erros no callback não param o download)"""
+        if self.callback:
+            try:
+                self.callback(campos)
+            except Exception as e:
+                logging.getLogger(__name__).debug(f"Callback de progresso falhou: {e}")
+    
+    def hook_download(self, d):
+        """progress_hook do yt-dlp (limitado a ~2 atualizações por segundo)"""
+        agora = time.time()
+        baixando = d.get("status") == "downloading"
+        if baixando and agora - self._ultimo < self.intervalo:
+            return
+        self._ultimo = agora
+        
+        self.emitir(
+            phase="downloading" if baixando else "downloaded",
+            downloaded_bytes=d.get("downloaded_bytes"),
+            total_bytes=d.get("total_bytes") or d.get("total_bytes_estimate"),
+            speed=d.get("speed"),
+            eta=d.get("eta"),
+            filename=os.path.basename(d.get("filename") or ""),
+            # Bytes já gravados em sequência desde o início do .part
+            contiguous_bytes=d.get("contiguous_bytes", d.get("downloaded_bytes")),
+        )
+    
+    def hook_pos_processamento(self, d):
+        """postprocessor_hook do yt-dlp (merge, conversões)"""
+        nome = d.get("postprocessor") or ""
+        if d.get("status") == "started":
+            self._inicio_pos[nome] = time.perf_counter()
+            self.emitir(phase="merging" if nome == "Merger" else "postprocessing",
+                        postprocessor=nome)
+        elif d.get("status") == "finished" and nome in self._inicio_pos:
+            segundos = time.perf_counter() - self._inicio_pos.pop(nome)
+            self.segundos_pos_processamento += segundos
+            if self.tempos:
+                self.tempos.somar("merge" if nome == "Merger" else "postprocessing", segundos)
+    
+    def opcoes_ytdlp(self):
+        """Hooks para incluir nas opções do YoutubeDL"""
+        return {
+            "progress_hooks": [self.hook_download],
+            "postprocessor_hooks": [self.hook_pos_processamento],
+        }
+
+# Log do downloader na pasta atual ("" = só no stderr)
+ARQUIVO_LOG = os.environ.get("VIDEOBOX_LOG_FILE", "downloader_universal.log")
 
 class MultiSiteDownloader:
-    def __init__(self, pasta_downloads="downloads"):
+    def __init__(self, pasta_downloads="downloads", cache=None, arquivo_info=None, progresso=None,
+                 segmentos=None, dedup=None, silencioso=False, prazo=None):
         self.pasta_downloads = Path(pasta_downloads)
+        # Cache opcional de downloads (download_cache.DownloadCache)
+        self.cache = cache
+        # Onde gravar o info dict extraído (reaproveitado pelo fallback)
+        self.arquivo_info = arquivo_info
+        # Tempo por fase e bytes por host (métricas da API)
+        self.tempos = TemposDeFase()
+        # Callback opcional de progresso: recebe um dict (fase, bytes, velocidade...)
+        self._progresso_padrao = ReportadorProgresso(progresso, tempos=self.tempos)
+        self._progresso_local = threading.local()
+        # Sem a barra de progresso do yt-dlp no stdout (saída JSON da CLI)
+        self.silencioso = silencioso
+        # Conexões por download pedidas pelo job (None = padrão/limite do host)
+        self.segmentos = segmentos
+        # Índice de conteúdo para achar duplicatas (em memória se não for passado)
+        self.dedup = dedup or DedupIndex()
+        # Hash BLAKE2 calculado durante o download, por destino
+        self.hashes = {}
+        # Dimensões, duração e codecs dos vídeos baixados, por nome de arquivo
+        self.midia = {}
+        # ffmpeg para merge e conversão AAC durante o download (None = sem)
+        self.ffmpeg = transcoder.ffmpeg_path()
+        # time.time() em que a API desiste do job (None = sem prazo, na CLI)
+        self.prazo = prazo
+        self.cache_hits = 0
         # Remove pasta separada de imagens - tudo na mesma pasta
         self.pasta_downloads.mkdir(exist_ok=True)
         
+        handlers = [logging.StreamHandler()]
+        if ARQUIVO_LOG:
+            handlers.insert(0, logging.FileHandler(ARQUIVO_LOG, encoding="utf-8"))
         logging.basicConfig(
             level=logging.INFO,
             format="%(asctime)s - %(levelname)s - %(message)s",
-            handlers=[
-                logging.FileHandler("downloader_universal.log", encoding="utf-8"),
-                logging.StreamHandler()
-            ]
+            handlers=handlers
         )
         self.logger = logging.getLogger(__name__)
         
         self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+            "User-Agent": USER_AGENT
         }
         
+        # Sessão HTTP compartilhada (keep-alive, sem novo handshake TLS por imagem).
+        # O pool por host comporta todas as conexões do orçamento (segmentos de
+        # um arquivo), senão as excedentes são fechadas e reabertas a cada faixa
+        self.sessao = requests.Session()
+        self.sessao.headers.update(self.headers)
+        adaptador = HTTPAdapter(pool_connections=IMAGENS_PARALELAS,
+                                pool_maxsize=max(IMAGENS_PARALELAS, MAX_CONEXOES))
+        self.sessao.mount("http://", adaptador)
+        self.sessao.mount("https://", adaptador)
+        self.max_imagens_paralelas = IMAGENS_PARALELAS
+        self.max_por_host = CONEXOES_POR_HOST
+        self._slots_por_host = {}
+        self._slots_lock = threading.Lock()
+        
+        # Contadores atualizados por várias threads quando a lista roda em paralelo
+        self._contadores_lock = threading.Lock()
         self.arquivos_baixados = 0
         self.erros = 0
         self.imagens_baixadas = 0
@@ -53,66 +519,443 @@ class MultiSiteDownloader:
             
             if len(arquivos_existentes) > 3:
                 self.logger.info(f"   ... e mais {len(arquivos_existentes) - 3} arquivo(s)")
+            
+            # Índice em memória: conhece o que já está na pasta (só tamanho,
+            # hashes só se algum arquivo novo colidir)
+            if dedup is None:
+                for arquivo in arquivos_existentes:
+                    if arquivo.is_file():
+                        self.dedup.register(arquivo)
         else:
             self.logger.info("📁 Pasta de downloads vazia - prontos para baixar!")
 
+    @property
+    def progresso(self):
+        """Reportador de progresso da thread atual (cada URL de uma lista tem o seu)"""
+        return getattr(self._progresso_local, "reportador", self._progresso_padrao)
+
+    def slot_do_host(self, url):
+        """Semáforo que limita as conexões simultâneas a um mesmo host"""
+        host = urlparse(url).netloc.lower()
+        with self._slots_lock:
+            if host not in self._slots_por_host:
+                self._slots_por_host[host] = threading.BoundedSemaphore(self.max_por_host)
+            return self._slots_por_host[host]
+
     def baixar_arquivo_simples(self, url, destino, max_tentativas=3):
-        """Download simples com retry"""
+        """Download simples com retry, retomando de onde parou (HTTP Range)
+
+        Baixa para <destino>.part. Numa nova tentativa pede só os bytes que
+        faltam, com If-Range (ETag/Last-Modified) para o servidor mandar o
+        arquivo inteiro se ele mudou no meio do caminho.
+        """
+        parcial = destino.with_name(destino.name + ".part")
+        validador = None
+        inicio = time.perf_counter()
+        
         for tentativa in range(max_tentativas):
             try:
                 if tentativa > 0:
-                    delay = 3 * tentativa
-                    self.logger.info(f"🔄 Tentativa {tentativa + 1}/{max_tentativas} após {delay}s...")
+                    delay = backoff_com_jitter(tentativa)
+                    self.logger.info(f"🔄 Tentativa {tentativa + 1}/{max_tentativas} após {delay:.1f}s...")
                     time.sleep(delay)
                 
                 headers = self.headers.copy()
+                # Sem compressão: os offsets do Range valem para os bytes do arquivo
+                headers["Accept-Encoding"] = "identity"
                 if "erome" in url:
                     headers["Referer"] = "https://www.erome.com/"
                 
-                with requests.get(url, headers=headers, stream=True, timeout=30) as r:
-                    r.raise_for_status()
+                ja_baixado = parcial.stat().st_size if parcial.exists() else 0
+                if ja_baixado and validador:
+                    headers["Range"] = f"bytes={ja_baixado}-"
+                    headers["If-Range"] = validador
+                
+                # O slot do host é liberado antes do sleep do retry, para não
+                # travar os outros downloads do mesmo host
+                with self.slot_do_host(url), \
+                        self.sessao.get(url, headers=headers, stream=True, timeout=30) as r:
+                    if r.status_code == 416 and ja_baixado:
+                        # Range além do fim: o parcial só está completo se o
+                        # tamanho total ("bytes */N") for o que já temos
+                        faixa = faixa_do_content_range(r)
+                        if not faixa or faixa[2] != ja_baixado:
+                            parcial.unlink()
+                            validador = None
+                            raise IOError(f"HTTP 416 sem confirmar o tamanho de {ja_baixado} bytes; "
+                                          "recomeçando do zero")
+                        modo = None
+                    else:
+                        r.raise_for_status()
+                        validador = r.headers.get("ETag") or r.headers.get("Last-Modified") or validador
+                        
+                        if r.status_code == 206:
+                            # Só retoma se a faixa começa no fim do parcial e vai
+                            # até o fim do arquivo; outra faixa gravada como o
+                            # arquivo inteiro o corromperia
+                            inicio_faixa, fim_faixa, total = faixa_do_content_range(r) or (None, None, None)
+                            if inicio_faixa != ja_baixado or (total is not None and fim_faixa != total - 1):
+                                parcial.unlink(missing_ok=True)
+                                validador = None
+                                raise IOError(f"Faixa inesperada ({r.headers.get('Content-Range')}); "
+                                              "recomeçando sem Range")
+                            modo = "ab"
+                            if ja_baixado:
+                                self.logger.info(f"⏩ Retomando {destino.name} a partir de {ja_baixado} bytes")
+                        else:
+                            # 200: servidor ignorou o Range ou o arquivo mudou
+                            modo = "wb"
                     
-                    with open(destino, "wb") as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
+                    hasher = None
+                    if modo:
+                        # Hash do conteúdo enquanto grava (a deduplicação não relê o arquivo)
+                        hasher = hash_file(parcial) if modo == "ab" else new_hasher()
+                        tamanho_chunk = tamanho_de_chunk(r.headers.get("Content-Length"))
+                        with open(parcial, modo) as f:
+                            for chunk in r.iter_content(chunk_size=tamanho_chunk):
+                                if chunk:
+                                    f.write(chunk)
+                                    hasher.update(chunk)
                     
-                    if destino.stat().st_size > 1024:  # Maior que 1KB
+                    if parcial.stat().st_size > 1024:  # Maior que 1KB
+                        parcial.replace(destino)
+                        if hasher:
+                            self.hashes[destino] = hasher.hexdigest()
+                        self.tempos.transferencia(url, destino.stat().st_size, time.perf_counter() - inicio)
                         size_mb = destino.stat().st_size / (1024*1024)
                         self.logger.info(f"✅ Baixado: {destino.name} ({size_mb:.1f}MB)")
                         return True
+                    
+                    # Resposta minúscula (página de erro): não serve para retomar
+                    parcial.unlink()
                         
             except Exception as e:
                 self.logger.warning(f"❌ Erro na tentativa {tentativa + 1}: {e}")
-                if destino.exists():
-                    destino.unlink()
         
+        if parcial.exists():
+            parcial.unlink()
         return False
 
+    def restaurar_do_cache(self, chave):
+        """Traz os arquivos de um download já feito (hardlink); True se achou"""
+        if not self.cache or not chave:
+            return False
+        
+        with self.tempos.medir("cache"):
+            nomes = self.cache.materialize(chave, self.pasta_downloads)
+        if not nomes:
+            return False
+        
+        with self._contadores_lock:
+            self.cache_hits += 1
+        self.logger.info(f"♻️ Cache: {len(nomes)} arquivo(s) reaproveitado(s) sem baixar ({chave})")
+        self.arquivos_baixados = len(list(self.pasta_downloads.glob("*.mp4")))
+        return True
+
+    def selecionar_formato(self, ydl, info):
+        """Info dict com o formato escolhido (sem download, sem rede), ou None"""
+        if not info or info.get("_type", "video") != "video":
+            return None
+        
+        plano = planejar_formato(info, ffmpeg=bool(self.ffmpeg))
+        if plano:
+            formato, custo = plano
+            self.logger.info(f"🧮 Formato planejado: {formato} (custo estimado {custo:.1f}s)")
+            # O seletor padrão fica como alternativa se o plano não casar
+            ydl.format_selector = ydl.build_format_selector(f"{formato}/{FORMATO_1080P}")
+        
+        try:
+            return ydl.process_ie_result(copy.deepcopy(info), download=False)
+        except Exception as e:
+            self.logger.debug(f"Seleção de formato falhou: {e}")
+            return None
+
+    def formato_progressivo(self, selecionado):
+        """O formato selecionado, se for um arquivo progressivo único (sem
+        merge, HTTP direto) que não precisa de conversão; None caso contrário"""
+        if not selecionado or selecionado.get("requested_formats"):
+            return None
+        if selecionado.get("protocol") not in ("http", "https"):
+            return None
+        if self.ffmpeg and transcoder.needs_aac(selecionado.get("acodec")):
+            return None
+        return selecionado
+
+    def headers_do_formato(self, ydl, formato):
+        """Headers HTTP do formato, com os cookies do yt-dlp"""
+        headers = dict(formato.get("http_headers") or {})
+        cookies = ydl.cookiejar.get_cookie_header(formato["url"]) if formato.get("url") else None
+        if cookies:
+            headers["Cookie"] = cookies
+        return headers
+
+    def timeout_ffmpeg(self):
+        """Segundos que um ffmpeg pode rodar agora: TIMEOUT_FFMPEG, limitado
+        pelo que sobra do prazo do job"""
+        if self.prazo is None:
+            return TIMEOUT_FFMPEG
+        return max(0, min(TIMEOUT_FFMPEG, int(self.prazo - time.time())))
+
+    def baixar_com_ffmpeg(self, ydl, selecionado):
+        """Merge e conversão AAC durante o download: o ffmpeg lê as URLs,
+        copia o vídeo e converte o áudio num passo só
+        
+        Só com FFMPEG_DURANTE_DOWNLOAD e uma vaga de conversão livre; sem
+        vaga (ou sem ffmpeg, sem tempo no prazo do job ou protocolo que não
+        é HTTP direto) devolve False e o download segue pelo yt-dlp, com a
+        conversão depois, sem segurar o download. Devolve {caminho: mídia}.
+        """
+        formatos = selecionado.get("requested_formats") or [selecionado]
+        aac = transcoder.needs_aac(formatos[-1].get("acodec"))
+        if not FFMPEG_DURANTE_DOWNLOAD or not self.ffmpeg or not (len(formatos) > 1 or aac):
+            return False
+        if any(f.get("protocol") not in ("http", "https") or not f.get("url") for f in formatos):
+            return False
+        timeout = self.timeout_ffmpeg()
+        if timeout < FOLGA_DO_PRAZO:
+            # Quase sem tempo: um merge cortado no meio não serviria para nada
+            return False
+        if not transcodificacoes_globais.acquire(False):
+            return False
+        
+        destino = Path(ydl.prepare_filename(selecionado)).with_suffix(".mp4")
+        parcial = destino.with_name(destino.name + ".part")
+        total = sum(f.get("filesize") or f.get("filesize_approx") or 0 for f in formatos) or None
+        try:
+            self.logger.info(f"🎛️ ffmpeg durante o download: {destino.name} "
+                             f"(vídeo copiado, áudio {'→ AAC' if aac else 'copiado'})")
+            comando = transcoder.build_command(
+                [(f["url"], self.headers_do_formato(ydl, f)) for f in formatos],
+                parcial, transcode_audio=aac, ffmpeg=self.ffmpeg)
+            gravados = transcoder.run(comando, on_progress=lambda gravados: self.progresso.hook_download(
+                {"status": "downloading", "downloaded_bytes": gravados, "total_bytes": total,
+                 "filename": str(destino)}), timeout=timeout)
+            parcial.replace(destino)
+        except Exception as e:
+            self.logger.warning(f"⚠️ ffmpeg durante o download falhou, seguindo pelo yt-dlp: {e}")
+            parcial.unlink(missing_ok=True)
+            return False
+        finally:
+            transcodificacoes_globais.release()
+        
+        self.progresso.hook_download({"status": "finished", "downloaded_bytes": gravados,
+                                      "total_bytes": gravados, "filename": str(destino)})
+        midia = media_from_info(selecionado)
+        if aac:
+            midia["acodec"] = "mp4a"
+        return {destino: midia}
+
+    def garantir_aac(self, baixados):
+        """Converte para AAC (vídeo copiado) os arquivos baixados com outro
+        áudio, esperando uma vaga de conversão; devolve {caminho: mídia}"""
+        convertidos = {}
+        for arquivo, midia in baixados.items():
+            if arquivo.exists() and not midia.get("acodec"):
+                midia = {**probe_file(arquivo), **midia}
+            if not (self.ffmpeg and arquivo.exists() and transcoder.needs_aac(midia.get("acodec"))):
+                convertidos[arquivo] = midia
+                continue
+            
+            destino = arquivo.with_suffix(".mp4")
+            parcial = destino.with_name(destino.name + ".aac.part")
+            self.progresso.emitir(phase="postprocessing", postprocessor="AAC")
+            try:
+                with self.tempos.medir("transcode"), transcodificacoes_globais:
+                    # O prazo conta a partir daqui: a espera pela vaga já gastou parte dele
+                    timeout = self.timeout_ffmpeg()
+                    if not timeout:
+                        raise RuntimeError("sem tempo no prazo do job")
+                    transcoder.run(transcoder.build_command([(str(arquivo), None)], parcial,
+                                                            ffmpeg=self.ffmpeg),
+                                   timeout=timeout)
+                parcial.replace(destino)
+                if destino != arquivo:
+                    arquivo.unlink()
+                self.logger.info(f"🎵 Áudio convertido para AAC: {destino.name}")
+                convertidos[destino] = {**midia, "acodec": "mp4a"}
+            except Exception as e:
+                self.logger.warning(f"⚠️ Conversão AAC falhou, mantendo o áudio original: {e}")
+                parcial.unlink(missing_ok=True)
+                convertidos[arquivo] = midia
+        return convertidos
+
+    def anunciar_stream(self, ydl, escolhido):
+        """Avisa a API que o arquivo pode ser servido enquanto é baixado"""
+        self.progresso.emitir(
+            phase="stream",
+            filename=Path(ydl.prepare_filename(escolhido)).name,
+            total_bytes=escolhido.get("filesize") or escolhido.get("filesize_approx"),
+        )
+
+    def tentar_download_segmentado(self, ydl, escolhido, conexoes):
+        """Baixa o formato progressivo escolhido com várias conexões Range.
+        Devolve False para seguir pelo yt-dlp."""
+        if conexoes < 2:
+            return False
+        
+        url_formato = escolhido.get("url")
+        headers = self.headers_do_formato(ydl, escolhido)
+        
+        total = self.sondar_tamanho(url_formato, headers)
+        if not total or total < SEGMENTO_MINIMO:
+            return False
+        
+        destino = Path(ydl.prepare_filename(escolhido))
+        self.logger.info(f"🔀 Download segmentado: {destino.name} em {conexoes} conexões")
+        return destino if self.baixar_segmentado(url_formato, destino, total, conexoes, headers) else False
+
+    def sondar_tamanho(self, url, headers):
+        """Tamanho total se o servidor aceita Range (resposta 206), senão None"""
+        try:
+            with self.sessao.get(url, headers={**headers, "Range": "bytes=0-0",
+                                               "Accept-Encoding": "identity"},
+                                 stream=True, timeout=30) as r:
+                if r.status_code != 206:
+                    return None
+                match = re.match(r"bytes 0-0/(\d+)", r.headers.get("Content-Range", ""))
+                return int(match.group(1)) if match else None
+        except Exception:
+            return None
+
+    def baixar_segmentado(self, url, destino, total, conexoes, headers, max_tentativas=3):
+        """N requisições Range em paralelo escrevendo no mesmo arquivo .part"""
+        parcial = destino.with_name(destino.name + ".part")
+        with open(parcial, "wb") as f:
+            f.truncate(total)
+        
+        tamanho = -(-total // conexoes)
+        faixas = [(inicio, min(inicio + tamanho, total) - 1) for inicio in range(0, total, tamanho)]
+        tamanho_chunk = tamanho_de_chunk(tamanho)
+        baixados = [0]
+        # As threads das faixas reportam pelo reportador da thread que pediu o download
+        progresso = self.progresso
+        # Posição atual de cada faixa (para saber quanto do início já está contíguo)
+        posicoes = [inicio for inicio, _ in faixas]
+        lock = threading.Lock()
+        inicio_download = time.time()
+        
+        def contiguos():
+            for (_, fim), posicao in zip(faixas, posicoes):
+                if posicao <= fim:
+                    return posicao
+            return total
+        
+        def baixar_faixa(indice, inicio, fim):
+            posicao = inicio
+            for tentativa in range(max_tentativas):
+                try:
+                    if tentativa > 0:
+                        time.sleep(backoff_com_jitter(tentativa))
+                    cabecalhos = {**headers, "Range": f"bytes={posicao}-{fim}",
+                                  "Accept-Encoding": "identity"}
+                    with self.sessao.get(url, headers=cabecalhos, stream=True, timeout=30) as r:
+                        if r.status_code != 206 or inicio_do_content_range(r) != posicao:
+                            raise IOError(f"Resposta inesperada ao Range: HTTP {r.status_code}")
+                        with open(parcial, "r+b") as f:
+                            f.seek(posicao)
+                            for chunk in r.iter_content(chunk_size=tamanho_chunk):
+                                if not chunk:
+                                    continue
+                                f.write(chunk)
+                                posicao += len(chunk)
+                                with lock:
+                                    baixados[0] += len(chunk)
+                                    posicoes[indice] = posicao
+                                    feito, sequencia = baixados[0], contiguos()
+                                decorrido = max(time.time() - inicio_download, 1e-6)
+                                velocidade = feito / decorrido
+                                progresso.hook_download({
+                                    "status": "downloading", "downloaded_bytes": feito,
+                                    "total_bytes": total, "speed": velocidade,
+                                    "eta": (total - feito) / velocidade, "filename": str(destino),
+                                    "contiguous_bytes": sequencia,
+                                })
+                    if posicao > fim:
+                        return True
+                except Exception as e:
+                    self.logger.warning(f"❌ Segmento {inicio}-{fim} (tentativa {tentativa + 1}): {e}")
+            return False
+        
+        with ThreadPoolExecutor(max_workers=conexoes) as pool:
+            resultados = list(pool.map(lambda item: baixar_faixa(item[0], *item[1]), enumerate(faixas)))
+        
+        if not all(resultados):
+            parcial.unlink()
+            return False
+        
+        parcial.replace(destino)
+        progresso.hook_download({"status": "finished", "downloaded_bytes": total,
+                                      "total_bytes": total, "filename": str(destino)})
+        return True
+
+    def salvar_info(self, ydl, info):
+        """Grava o info dict extraído para o fallback não extrair de novo"""
+        try:
+            salvar_info_extraida(ydl, info, self.arquivo_info)
+        except Exception as e:
+            self.logger.warning(f"⚠️ Não foi possível salvar o info dict: {e}")
+
+    def carregar_info(self, ydl):
+        """Info dict já extraído para este job (pela estimativa de custo da
+        API), se ainda for recente, com os cookies da extração já no `ydl`;
+        None caso contrário"""
+        if not self.arquivo_info:
+            return None
+        try:
+            if time.time() - os.path.getmtime(self.arquivo_info) > INFO_VALIDADE:
+                return None
+            with open(self.arquivo_info, encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        carregar_cookies_da_extracao(ydl, self.arquivo_info)
+        self.logger.info("♻️ Extração reaproveitada (feita na estimativa do job)")
+        return info
+
+    def registrar_info(self, info):
+        """Loga título, duração e resoluções disponíveis (≤ 1080p)"""
+        try:
+            if info:
+                title = info.get('title', 'Vídeo')
+                duration = int(info.get('duration') or 0)
+                
+                # Analisa formatos disponíveis e encontra o melhor ≤ 1080p
+                formats = info.get('formats', [])
+                if formats:
+                    best_height = 0
+                    available_heights = []
+                    
+                    for fmt in formats:
+                        height = fmt.get('height', 0)
+                        if height:
+                            available_heights.append(height)
+                            # Encontra a melhor resolução ≤ 1080p
+                            if height <= 1080 and height > best_height:
+                                best_height = height
+                    
+                    available_heights = sorted(set(available_heights), reverse=True)
+                    
+                    self.logger.info(f"📺 Título: {title}")
+                    self.logger.info(f"⏱️ Duração: {duration//60}:{duration%60:02d}")
+                    self.logger.info(f"📊 Resoluções disponíveis: {available_heights}")
+                    self.logger.info(f"🎯 Selecionando: {best_height}p (máximo 1080p)")
+                
+        except Exception as e:
+            self.logger.warning(f"⚠️ Não foi possível obter info prévia: {e}")
+
     def baixar_videos_ytdlp(self, url):
         """Baixa vídeos com yt-dlp em 1080p MÁXIMO e remove duplicatas"""
-        arquivos_antes = set(p.name for p in self.pasta_downloads.glob("*.mp4"))
+        # Cache pela URL (sem rede): links curtos, hosts móveis, rastreamento
+        chave_cache = self.cache.key_for_url(url, FORMATO_1080P) if self.cache else None
+        if self.restaurar_do_cache(chave_cache):
+            return True
         
         try:
             self.logger.info(f"🎯 Baixando vídeos em 1080p MÁXIMO com yt-dlp: {url}")
             
             # Configuração OTIMIZADA para 1080p MÁXIMO (mais rápida)
             ydl_opts = {
-                # LIMITA A 1080p COMO MÁXIMO - configuração simplificada
-                "format": (
-                    # 1ª Prioridade: 1080p com melhor áudio (formato já pronto)
-                    "best[height<=1080][height>=720][ext=mp4]/"
-                    "bestvideo[height<=1080][height>=720]+bestaudio[ext=m4a]/"
-                    "bestvideo[height<=1080][height>=720]+bestaudio/"
-                    
-                    # 2ª Prioridade: Qualquer resolução ≤ 1080p
-                    "best[height<=1080][ext=mp4]/"
-                    "bestvideo[height<=1080]+bestaudio[ext=m4a]/"
-                    "bestvideo[height<=1080]+bestaudio/"
-                    
-                    # 3ª Prioridade: Melhor disponível como último recurso
-                    "best[ext=mp4]/bestvideo+bestaudio/best"
-                ),
+                "format": FORMATO_1080P,
                 "outtmpl": str(self.pasta_downloads / "%(title)s.%(ext)s"),
                 "merge_output_format": "mp4",
                 
@@ -126,49 +969,80 @@ class MultiSiteDownloader:
                 "retries": 2,
                 "fragment_retries": 2,
                 "http_chunk_size": 8388608,  # 8MB chunks (menor para ser mais rápido)
+                "concurrent_fragment_downloads": 1,  # ajustado após a seleção (HLS/DASH)
+                
+                # Progresso em tempo real (repassado à API)
+                **self.progresso.opcoes_ytdlp(),
                 
-                # SEM pós-processamento FFmpeg pesado (mais rápido)
-                # O yt-dlp fará apenas o merge básico
+                # SEM pós-processamento do yt-dlp: merge e AAC durante o
+                # download (baixar_com_ffmpeg) ou conversão só do áudio depois
+                
+                "quiet": self.silencioso,
+                "noprogress": self.silencioso,
             }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Verifica informações do vídeo antes do download
+            conexoes = 0
+            with criar_youtubedl(ydl_opts) as ydl:
                 try:
-                    info = ydl.extract_info(url, download=False)
-                    if info:
-                        title = info.get('title', 'Vídeo')
-                        duration = info.get('duration', 0)
-                        
-                        # Analisa formatos disponíveis e encontra o melhor ≤ 1080p
-                        formats = info.get('formats', [])
-                        if formats:
-                            best_height = 0
-                            available_heights = []
-                            
-                            for fmt in formats:
-                                height = fmt.get('height', 0)
-                                if height:
-                                    available_heights.append(height)
-                                    # Encontra a melhor resolução ≤ 1080p
-                                    if height <= 1080 and height > best_height:
-                                        best_height = height
-                            
-                            available_heights = sorted(set(available_heights), reverse=True)
-                            
-                            self.logger.info(f"📺 Título: {title}")
-                            self.logger.info(f"⏱️ Duração: {duration//60}:{duration%60:02d}")
-                            self.logger.info(f"📊 Resoluções disponíveis: {available_heights}")
-                            self.logger.info(f"🎯 Selecionando: {best_height}p (máximo 1080p)")
-                        
-                except Exception as e:
-                    self.logger.warning(f"⚠️ Não foi possível obter info prévia: {e}")
-                
-                # Faz o download
-                ydl.download([url])
+                    # Extração ÚNICA: o mesmo info dict serve para log, cache e download
+                    self.progresso.emitir(phase="extracting")
+                    with self.tempos.medir("extraction"):
+                        info = self.carregar_info(ydl) or ydl.extract_info(url, download=False, process=False)
+                    
+                    if info and self.cache:
+                        # Cache pelo id que o extrator resolveu
+                        chave_info = self.cache.key_for_info(info, FORMATO_1080P)
+                        if chave_info and chave_info != chave_cache:
+                            chave_cache = chave_info
+                            if self.restaurar_do_cache(chave_cache):
+                                return True
+                    
+                    self.salvar_info(ydl, info)
+                    self.registrar_info(info)
+                    
+                    # Formato planejado; arquivo progressivo único pode ser
+                    # servido enquanto baixa e baixado em segmentos
+                    selecionado = self.selecionar_formato(ydl, info)
+                    escolhido = self.formato_progressivo(selecionado)
+                    url_midia = url_da_midia(selecionado) or url
+                    
+                    # Conexões deste job: fragmentos HLS/DASH em paralelo ou
+                    # segmentos Range de arquivos progressivos, dentro do
+                    # orçamento global; o limite é o do host da mídia (CDN),
+                    # não o da página
+                    conexoes = reservar_conexoes(segmentos_para(url_midia, self.segmentos))
+                    ydl.params["concurrent_fragment_downloads"] = max(1, conexoes)
+                    if escolhido:
+                        self.anunciar_stream(ydl, escolhido)
+                    
+                    # Faz o download reaproveitando a extração (o merge é
+                    # medido à parte, pelos hooks de pós-processamento)
+                    inicio = time.perf_counter()
+                    pos_antes = self.progresso.segundos_pos_processamento
+                    baixados = selecionado and self.baixar_com_ffmpeg(ydl, selecionado)
+                    if not baixados:
+                        destino = escolhido and self.tentar_download_segmentado(ydl, escolhido, conexoes)
+                        if destino:
+                            baixados = {destino: media_from_info(escolhido)}
+                        else:
+                            baixados = arquivos_do_resultado(ydl.process_ie_result(info, download=True))
+                    segundos = (time.perf_counter() - inicio
+                                - (self.progresso.segundos_pos_processamento - pos_antes))
+                    self.tempos.somar("download", segundos)
+                    # Bytes do host que serviu a mídia (o CDN), não o da página
+                    self.tempos.transferencia(
+                        url_midia, sum(p.stat().st_size for p in baixados if p.exists()), segundos)
+                finally:
+                    guardar_extratores(ydl)
+                    liberar_conexoes(conexoes)
             
-            # Verifica arquivos baixados
-            arquivos_depois = set(p.name for p in self.pasta_downloads.glob("*.mp4"))
-            novos_arquivos = arquivos_depois - arquivos_antes
+            # Áudio que ainda não é AAC (sem vaga de conversão durante o
+            # download): converte agora, já sem ocupar conexões
+            baixados = self.garantir_aac(baixados)
+            
+            # Arquivos gravados por ESTE download (outras URLs da lista podem
+            # estar baixando na mesma pasta ao mesmo tempo)
+            novos_arquivos = {p.name: midia for p, midia in baixados.items() if p.exists()}
             
             if novos_arquivos:
                 self.logger.info(f"📥 {len(novos_arquivos)} arquivo(s) baixado(s) em resolução ≤ 1080p")
@@ -179,31 +1053,26 @@ class MultiSiteDownloader:
                     tamanho_mb = arquivo_path.stat().st_size / (1024*1024)
                     self.logger.info(f"   📁 {arquivo} ({tamanho_mb:.1f}MB)")
                     
-                    # Tenta obter resolução real do arquivo
-                    try:
-                        import subprocess
-                        result = subprocess.run([
-                            'ffprobe', '-v', 'quiet', '-show_entries', 
-                            'stream=width,height', '-of', 'csv=p=0', 
-                            str(arquivo_path)
-                        ], capture_output=True, text=True, timeout=10)
+                    # Resolução real: do info dict do yt-dlp ou do cabeçalho do arquivo
+                    midia = self.inspecionar_midia(arquivo_path, novos_arquivos[arquivo])
+                    if midia.get("height"):
+                        self.logger.info(f"   ✅ Resolução final: {midia.get('width')}x{midia['height']}")
                         
-                        if result.returncode == 0 and result.stdout.strip():
-                            dimensions = result.stdout.strip().split(',')
-                            if len(dimensions) >= 2:
-                                width, height = dimensions[0], dimensions[1]
-                                self.logger.info(f"   ✅ Resolução final: {width}x{height}")
-                                
-                                # Verifica se respeitou o limite de 1080p
-                                if int(height) <= 1080:
-                                    self.logger.info(f"   ✅ Limite de 1080p respeitado")
-                                else:
-                                    self.logger.warning(f"   ⚠️ Resolução acima de 1080p: {height}p")
-                    except:
-                        pass
+                        # Verifica se respeitou o limite de 1080p
+                        if midia["height"] <= 1080:
+                            self.logger.info(f"   ✅ Limite de 1080p respeitado")
+                        else:
+                            self.logger.warning(f"   ⚠️ Resolução acima de 1080p: {midia['height']}p")
+                
+                # REMOVE DUPLICATAS IMEDIATAMENTE (mesmo conteúdo, não só tamanho)
+                self.deduplicar([self.pasta_downloads / a for a in sorted(novos_arquivos)])
+                self.arquivos_baixados = len(list(self.pasta_downloads.glob("*.mp4")))
                 
-                # REMOVE DUPLICATAS IMEDIATAMENTE
-                self.remover_duplicatas()
+                # Guarda no cache para as próximas vezes
+                if self.cache and chave_cache:
+                    novos = [self.pasta_downloads / a for a in sorted(novos_arquivos)]
+                    with self.tempos.medir("cache"):
+                        self.cache.store(chave_cache, [p for p in novos if p.exists()])
                 
                 return True
             else:
@@ -214,41 +1083,52 @@ class MultiSiteDownloader:
             self.logger.error(f"❌ Erro no yt-dlp: {e}")
             return False
 
-    def remover_duplicatas(self):
-        """Remove duplicatas baseado no tamanho do arquivo"""
-        arquivos = list(self.pasta_downloads.glob("*.mp4"))
-        if len(arquivos) < 2:
-            return
+    def inspecionar_midia(self, arquivo, midia):
+        """Completa os campos de mídia do yt-dlp lendo o cabeçalho MP4/WebM
+        (sem ffprobe: nenhum processo a mais por arquivo)"""
+        if not is_complete(midia):
+            with self.tempos.medir("probe"):
+                midia = {**probe_file(arquivo), **midia}
+        if midia:
+            self.midia[arquivo.name] = midia
+        return midia
+
+    def deduplicar(self, arquivos, remover_repetidos=True):
+        """Confere os arquivos novos no índice de conteúdo
         
-        self.logger.info(f"🔍 Verificando duplicatas em {len(arquivos)} arquivo(s)...")
+        Duplicata na mesma pasta é removida (se `remover_repetidos`); em outra
+        pasta (outro job), o arquivo vira um hardlink dela e o conteúdo fica
+        gravado uma vez só no disco.
+        """
+        with self.tempos.medir("dedup"):
+            removidas, ligadas = self._deduplicar(arquivos, remover_repetidos)
         
-        # Agrupa por tamanho
-        por_tamanho = {}
+        if removidas:
+            self.logger.info(f"🎉 {removidas} duplicata(s) removida(s)!")
+        if ligadas:
+            self.logger.info(f"🔗 {ligadas} arquivo(s) já existente(s) em outro job, ligado(s) por hardlink")
+
+    def _deduplicar(self, arquivos, remover_repetidos):
+        removidas = ligadas = 0
         for arquivo in arquivos:
-            tamanho = arquivo.stat().st_size
-            if tamanho not in por_tamanho:
-                por_tamanho[tamanho] = []
-            por_tamanho[tamanho].append(arquivo)
-        
-        # Remove duplicatas
-        removidas = 0
-        for tamanho, grupo in por_tamanho.items():
-            if len(grupo) > 1:
-                # Mantém o primeiro, remove os outros
-                manter = grupo[0]
-                for remover in grupo[1:]:
-                    self.logger.info(f"🗑️ Removendo duplicata: {remover.name}")
-                    remover.unlink()
-                    removidas += 1
+            if not arquivo.exists():
+                continue
+            try:
+                original = self.dedup.find_duplicate(arquivo, self.hashes.pop(arquivo, None))
+                if not original or os.path.samefile(original, arquivo):
+                    continue
                 
-                self.logger.info(f"✅ Mantido: {manter.name}")
-        
-        if removidas > 0:
-            self.logger.info(f"🎉 {removidas} duplicata(s) removida(s)!")
-        
-        # Atualiza contador
-        arquivos_finais = list(self.pasta_downloads.glob("*.mp4"))
-        self.arquivos_baixados = len(arquivos_finais)
+                if remover_repetidos and os.path.dirname(original) == os.path.abspath(arquivo.parent):
+                    self.logger.info(f"🗑️ Removendo duplicata: {arquivo.name} (igual a {Path(original).name})")
+                    self.dedup.forget(arquivo)
+                    arquivo.unlink()
+                    removidas += 1
+                else:
+                    self.dedup.link_duplicate(arquivo, original)
+                    ligadas += 1
+            except OSError as e:
+                self.logger.debug(f"Deduplicação de {arquivo.name} ignorada: {e}")
+        return removidas, ligadas
 
     def baixar_imagens_da_pagina(self, url):
         """Baixa imagens APENAS do erome.com (galeria atual)"""
@@ -265,11 +1145,10 @@ class MultiSiteDownloader:
             headers["Referer"] = url
             headers["Accept"] = "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8"
             
-            r = requests.get(url, headers=headers, timeout=15)
+            with self.tempos.medir("gallery_page"):
+                r = self.sessao.get(url, headers=headers, timeout=15)
             r.raise_for_status()
             
-            soup = BeautifulSoup(r.text, "html.parser")
-            
             # Extrai ID da galeria da URL
             import re
             galeria_id = re.search(r'/a/([^/?]+)', url)
@@ -280,39 +1159,11 @@ class MultiSiteDownloader:
             galeria_id = galeria_id.group(1)
             self.logger.info(f"🆔 ID da galeria erome: {galeria_id}")
             
-            # Busca imagens específicas da galeria atual (SEM posters/capas)
-            imagens_galeria = []
-            
-            # MÉTODO 1: Imagens principais da galeria (img-front, img-back)
-            self.logger.info("🔍 Buscando imagens principais da galeria...")
-            for img in soup.find_all("img", class_=["img-front", "img-back"]):
-                data_src = img.get("data-src")
-                if data_src and galeria_id in data_src:
-                    imagens_galeria.append(data_src)
-                    self.logger.info(f"   ✅ Imagem principal: {os.path.basename(data_src)}")
-            
-            # MÉTODO 2: Data attributes da galeria atual (SEM thumbnails e SEM posters)
-            self.logger.info("🔍 Buscando data attributes da galeria...")
-            for element in soup.find_all():
-                for attr, value in element.attrs.items():
-                    if (attr.startswith("data-") and isinstance(value, str) and
-                        galeria_id in value and 
-                        any(ext in value.lower() for ext in [".jpg", ".jpeg", ".png", ".gif", ".webp"]) and
-                        "/thumbs/" not in value.lower() and  # Evita thumbnails
-                        "poster" not in attr.lower()):      # Evita posters/capas de vídeo
-                        
-                        imagens_galeria.append(value)
-                        self.logger.info(f"   ✅ Data attr: {os.path.basename(value)}")
-            
-            # MÉTODO 3 REMOVIDO: Não busca mais posters de vídeo
-            # (Comentado para mostrar que foi removido intencionalmente)
-            # self.logger.info("🚫 Posters de vídeo ignorados (não baixa capas)")
-            
-            # Remove duplicatas mantendo ordem
-            imagens_unicas = []
-            for img in imagens_galeria:
-                if img and img not in imagens_unicas:
-                    imagens_unicas.append(img)
+            # Busca imagens específicas da galeria atual (SEM posters/capas):
+            # imagens principais (img-front, img-back) e data attributes
+            # (SEM thumbnails e SEM posters), numa única passada pelo HTML
+            self.logger.info("🔍 Buscando imagens da galeria...")
+            imagens_unicas = extrair_imagens_galeria(r.text, galeria_id)
             
             self.logger.info(f"🎯 Total de imagens da galeria (SEM capas): {len(imagens_unicas)}")
             
@@ -324,48 +1175,68 @@ class MultiSiteDownloader:
             for i, src in enumerate(imagens_unicas, 1):
                 self.logger.info(f"   📋 {i}. {os.path.basename(src)}")
             
-            # Baixa as imagens da galeria
-            baixadas = 0
+            # Define nomes e destinos antes de paralelizar (o "evita sobrescrever"
+            # não pode correr entre threads)
+            tarefas = []
+            reservados = set()
             for i, src in enumerate(imagens_unicas, 1):
-                try:
-                    from urllib.parse import urljoin, urlparse, unquote
-                    full_url = urljoin(url, src)
-                    nome = os.path.basename(urlparse(full_url).path)
-                    nome = unquote(nome or f"erome_{galeria_id}_{i}.jpg")
-                    
-                    # Garante extensão
-                    if not any(ext in nome.lower() for ext in [".jpg", ".jpeg", ".png", ".gif", ".webp"]):
-                        if "jpeg" in full_url.lower():
-                            nome += ".jpg"
-                        elif "png" in full_url.lower():
-                            nome += ".png"
-                        elif "webp" in full_url.lower():
-                            nome += ".webp"
-                        else:
-                            nome += ".jpg"
-                    
-                    destino = self.pasta_downloads / nome
-                    
-                    # Evita sobrescrever
-                    contador = 1
-                    nome_original = destino.stem
-                    extensao = destino.suffix
-                    while destino.exists():
-                        destino = self.pasta_downloads / f"{nome_original}_{contador}{extensao}"
-                        contador += 1
-                    
-                    self.logger.info(f"📥 Baixando imagem {i}/{len(imagens_unicas)}: {nome}")
-                    
-                    if self.baixar_arquivo_simples(full_url, destino):
-                        baixadas += 1
-                        self.logger.info(f"   ✅ Sucesso: {nome}")
+                full_url = urljoin(url, src)
+                nome = os.path.basename(urlparse(full_url).path)
+                nome = unquote(nome or f"erome_{galeria_id}_{i}.jpg")
+                
+                # Garante extensão
+                if not any(ext in nome.lower() for ext in [".jpg", ".jpeg", ".png", ".gif", ".webp"]):
+                    if "jpeg" in full_url.lower():
+                        nome += ".jpg"
+                    elif "png" in full_url.lower():
+                        nome += ".png"
+                    elif "webp" in full_url.lower():
+                        nome += ".webp"
                     else:
-                        self.logger.warning(f"   ❌ Falha: {nome}")
+                        nome += ".jpg"
+                
+                destino = self.pasta_downloads / nome
+                
+                # Evita sobrescrever
+                contador = 1
+                nome_original = destino.stem
+                extensao = destino.suffix
+                while destino.exists() or destino in reservados:
+                    destino = self.pasta_downloads / f"{nome_original}_{contador}{extensao}"
+                    contador += 1
+                
+                reservados.add(destino)
+                tarefas.append((i, full_url, nome, destino))
+            
+            # Baixa as imagens da galeria em paralelo (sessão compartilhada,
+            # limite de conexões por host em baixar_arquivo_simples)
+            self.logger.info(f"📥 Baixando {len(tarefas)} imagem(ns) com até {self.max_imagens_paralelas} em paralelo")
+            self.progresso.emitir(phase="images", images_done=0, images_total=len(tarefas))
+            baixadas = 0
+            concluidas = 0
+            with self.tempos.medir("images"), ThreadPoolExecutor(max_workers=self.max_imagens_paralelas) as pool:
+                futuros = {
+                    pool.submit(self.baixar_arquivo_simples, full_url, destino): (i, nome)
+                    for i, full_url, nome, destino in tarefas
+                }
+                # Contadores só são atualizados aqui, na thread principal
+                for futuro in as_completed(futuros):
+                    i, nome = futuros[futuro]
+                    concluidas += 1
+                    try:
+                        if futuro.result():
+                            baixadas += 1
+                            self.logger.info(f"   ✅ Sucesso {i}/{len(tarefas)}: {nome}")
+                        else:
+                            self.logger.warning(f"   ❌ Falha {i}/{len(tarefas)}: {nome}")
+                    except Exception as e:
+                        self.logger.error(f"   💥 Erro em {nome}: {e}")
                     
-                except Exception as e:
-                    self.logger.error(f"   💥 Erro: {e}")
+                    self.progresso.emitir(phase="images", images_done=concluidas, images_total=len(tarefas))
             
-            self.imagens_baixadas += baixadas
+            with self._contadores_lock:
+                self.imagens_baixadas += baixadas
+            self.deduplicar([destino for _, _, _, destino in tarefas], remover_repetidos=False)
             
             if baixadas > 0:
                 self.logger.info(f"🎉 EROME: {baixadas}/{len(imagens_unicas)} imagem(ns) de conteúdo baixada(s) (SEM capas)!")
@@ -396,28 +1267,58 @@ class MultiSiteDownloader:
         # Resultado
         if video_success or (image_success and "erome.com" in url.lower()):
             self.logger.info(f"✅ URL processada com sucesso!")
+            return True
         else:
             self.logger.warning(f"❌ Falha ao processar URL")
-            self.erros += 1
+            with self._contadores_lock:
+                self.erros += 1
+            return False
 
-    def processar_lista(self, arquivo_urls):
-        """Processa lista de URLs"""
+    def processar_lista(self, arquivo_urls, paralelos=1, limitador=None, ao_evento=None):
+        """Processa lista de URLs, até `paralelos` ao mesmo tempo
+        
+        `limitador` (LimitadorPorHost) espaça os inícios em um mesmo host e
+        `ao_evento` recebe um dict por evento: início, progresso e fim de
+        cada URL. Devolve a lista de resultados (True/False) na ordem do arquivo.
+        """
         try:
             with open(arquivo_urls, "r", encoding="utf-8") as f:
                 urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
             
             self.logger.info(f"📋 Encontradas {len(urls)} URL(s) para processar")
+            limitador = limitador or LimitadorPorHost()
             
-            for i, url in enumerate(urls, 1):
+            def processar(indice, url):
+                limitador.aguardar(url)
                 self.logger.info(f"\n{'='*60}")
-                self.logger.info(f"🔄 Processando {i}/{len(urls)}: {url}")
+                self.logger.info(f"🔄 Processando {indice}/{len(urls)}: {url}")
                 self.logger.info(f"{'='*60}")
                 
-                self.processar_url(url)
+                evento = {"index": indice, "total": len(urls), "url": url}
+                if ao_evento:
+                    ao_evento({"event": "start", **evento})
+                    self._progresso_local.reportador = ReportadorProgresso(
+                        lambda campos: ao_evento({"event": "progress", **evento, **campos}),
+                        tempos=self.tempos)
                 
-                # Pausa entre URLs
-                if i < len(urls):
-                    time.sleep(2)
+                inicio = time.time()
+                try:
+                    sucesso = self.processar_url(url)
+                except Exception as e:
+                    self.logger.error(f"❌ Erro em {url}: {e}")
+                    with self._contadores_lock:
+                        self.erros += 1
+                    sucesso = False
+                finally:
+                    self._progresso_local.reportador = self._progresso_padrao
+                
+                if ao_evento:
+                    ao_evento({"event": "done", **evento, "success": sucesso,
+                               "duration_s": round(time.time() - inicio, 1)})
+                return sucesso
+            
+            with ThreadPoolExecutor(max_workers=max(1, paralelos)) as pool:
+                return list(pool.map(processar, range(1, len(urls) + 1), urls))
                     
         except FileNotFoundError:
             self.logger.error("❌ Arquivo 'lista.txt' não encontrado!")
@@ -456,7 +1357,264 @@ class MultiSiteDownloader:
         print(f"🎯 Estratégia: Limite 1080p + Imagens (só erome)")
         print("=" * 60)
 
+def abrir_cache(cache_config):
+    """Abre o cache de downloads a partir de (pasta, orçamento_bytes) ou None"""
+    if not cache_config or not cache_config[0] or cache_config[1] <= 0:
+        return None
+    from download_cache import DownloadCache
+    return DownloadCache(cache_config[0], cache_config[1])
+
+def executar_job(url, pasta, enviado_em=None, cache_config=None, arquivo_info=None, progresso=None,
+                 segmentos=None, indice_dedup=None):
+    """Processa uma URL numa pasta de job (usado pela API, em pool ou subprocesso)
+
+    `enviado_em` é o time.time() de quando a API despachou o job; a diferença
+    até aqui é a latência de inicialização do job, e o prazo dos ffmpegs
+    (PRAZO_DO_JOB) conta a partir dele. `cache_config` é
+    (pasta_do_cache, orçamento_em_bytes) do cache de downloads,
+    `arquivo_info` recebe o info dict extraído, para o fallback reaproveitar,
+    `progresso` é chamado com as atualizações dos hooks do yt-dlp,
+    `segmentos` é o número de conexões pedido pelo job e `indice_dedup` é o
+    SQLite do índice de conteúdo compartilhado entre os jobs.
+    """
+    inicio = time.time()
+    startup_ms = round((inicio - enviado_em) * 1000, 1) if enviado_em else None
+    
+    downloader = MultiSiteDownloader(pasta, cache=abrir_cache(cache_config),
+                                     arquivo_info=arquivo_info, progresso=progresso,
+                                     segmentos=segmentos,
+                                     dedup=DedupIndex(indice_dedup) if indice_dedup else None,
+                                     prazo=(enviado_em or inicio) + PRAZO_DO_JOB - FOLGA_DO_PRAZO)
+    try:
+        success = downloader.processar_url(url)
+    finally:
+        downloader.sessao.close()
+        downloader.dedup.close()
+    
+    timings, bytes_per_host = downloader.tempos.resumo()
+    return {
+        "success": bool(success),
+        "cache_hit": downloader.cache_hits > 0,
+        "startup_ms": startup_ms,
+        "duration_ms": round((time.time() - inicio) * 1000, 1),
+        # Segundos por fase e [bytes, segundos] por host (métricas da API)
+        "timings": timings,
+        "bytes_per_host": bytes_per_host,
+        # Dimensões, duração e codecs por arquivo (os removidos pela deduplicação ficam de fora)
+        "media": {nome: midia for nome, midia in downloader.midia.items()
+                  if (downloader.pasta_downloads / nome).exists()},
+    }
+
+def arquivo_cookies(arquivo_info):
+    return f"{arquivo_info}.cookies"
+
+def salvar_info_extraida(ydl, info, arquivo_info):
+    """Grava o info dict (só vídeos) de forma atômica: quem lê nunca vê meio arquivo
+    
+    Os cookies que a extração recebeu (sessão, tokens que o CDN exige) vão
+    num arquivo ao lado, gravado antes: quem baixa com outro YoutubeDL
+    precisa deles (ver carregar_cookies_da_extracao).
+    """
+    if not arquivo_info or not info or info.get('_type', 'video') != 'video':
+        return
+    temporario = f"{arquivo_info}.{os.getpid()}.{threading.get_ident()}.tmp"
+    ydl.cookiejar.save(temporario)
+    os.replace(temporario, arquivo_cookies(arquivo_info))
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(ydl.sanitize_info(info), f)
+    os.replace(temporario, arquivo_info)
+
+def carregar_cookies_da_extracao(ydl, arquivo_info):
+    """Põe no YoutubeDL os cookies gravados junto do info dict, se houver"""
+    try:
+        ydl.cookiejar.load(arquivo_cookies(arquivo_info))
+    except OSError:
+        pass
+
+def estimar_job(url, arquivo_info=None, timeout=15):
+    """Tamanho esperado de um job sem baixar nada: {bytes, duration, images,
+    entries} (só os campos conhecidos)
+    
+    Galerias do erome: imagens contadas na página. Vídeos: tamanho do formato
+    que o planejador escolheria, pelo info dict do yt-dlp, que fica gravado
+    em `arquivo_info` para o job não extrair de novo.
+    """
+    if "erome.com" in url.lower():
+        galeria_id = re.search(r'/a/([^/?]+)', url)
+        if not galeria_id:
+            return {}
+        r = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=timeout)
+        r.raise_for_status()
+        return {"images": len(extrair_imagens_galeria(r.text, galeria_id.group(1)))}
+    
+    ydl_opts = {"quiet": True, "no_warnings": True, "socket_timeout": timeout}
+    with criar_youtubedl(ydl_opts) as ydl:
+        try:
+            info = ydl.extract_info(url, download=False, process=False)
+        finally:
+            guardar_extratores(ydl)
+        if not info:
+            return {}
+        if info.get("_type") == "playlist" and isinstance(info.get("entries"), list):
+            return {"entries": len(info["entries"])}
+        if info.get("_type", "video") != "video":
+            return {}
+        salvar_info_extraida(ydl, info, arquivo_info)
+    
+    estimativa = {"duration": info.get("duration")}
+    plano = planejar_formato(info, ffmpeg=bool(transcoder.ffmpeg_path()))
+    if plano:
+        ids = plano[0].split("+")
+        formatos = [f for f in info.get("formats") or [] if f.get("format_id") in ids]
+        estimativa["bytes"] = sum(tamanho_estimado(f, info.get("duration")) for f in formatos)
+    else:
+        estimativa["bytes"] = tamanho_estimado(info, info.get("duration"))
+    
+    formatos = info.get("formats") or [info]
+    if not estimativa["bytes"] and len(formatos) == 1 and formatos[0].get("url", "").startswith("http"):
+        # Link direto (extrator genérico): tamanho pelo Content-Length
+        try:
+            r = requests.head(formatos[0]["url"], headers={"User-Agent": USER_AGENT,
+                                                           **(formatos[0].get("http_headers") or {})},
+                              allow_redirects=True, timeout=timeout)
+            estimativa["bytes"] = int(r.headers.get("Content-Length") or 0) if r.ok else 0
+        except (requests.RequestException, ValueError):
+            pass
+    return {campo: valor for campo, valor in estimativa.items() if valor}
+
+def expandir_playlist(url):
+    """URLs dos itens de uma playlist/canal, sem extrair cada vídeo (a própria
+    URL se não for playlist)"""
+    ydl_opts = {"extract_flat": "in_playlist", "quiet": True, "no_warnings": True}
+    with criar_youtubedl(ydl_opts) as ydl:
+        try:
+            info = ydl.extract_info(url, download=False)
+        except Exception as e:
+            # O item falha depois, no próprio job, com a mensagem completa
+            logging.getLogger(__name__).warning(f"⚠️ Não foi possível expandir {url}: {e}")
+            return [url]
+        finally:
+            guardar_extratores(ydl)
+    
+    if not info or info.get("_type") != "playlist":
+        return [url]
+    urls = [entrada.get("webpage_url") or entrada.get("url")
+            for entrada in info.get("entries") or [] if entrada]
+    return [item for item in urls if item] or [url]
+
+def executar_ytdlp(url, pasta, enviado_em=None, arquivo_info=None, progresso=None):
+    """Fallback da API: yt-dlp puro (melhor formato ≤ 1080p, sem playlist)
+
+    Se o script universal já extraiu a URL, usa o info dict gravado em
+    `arquivo_info` em vez de extrair de novo.
+    """
+    inicio = time.time()
+    startup_ms = round((inicio - enviado_em) * 1000, 1) if enviado_em else None
+    
+    ydl_opts = {
+        "format": "best[height<=1080]",
+        **ReportadorProgresso(progresso).opcoes_ytdlp(),
+        "outtmpl": os.path.join(pasta, "%(title)s.%(ext)s"),
+        "noplaylist": True,
+        "quiet": True,
+        "no_warnings": True,
+    }
+    
+    with criar_youtubedl(ydl_opts) as ydl:
+        try:
+            if arquivo_info and os.path.exists(arquivo_info):
+                carregar_cookies_da_extracao(ydl, arquivo_info)
+                retcode = ydl.download_with_info_file(arquivo_info)
+            else:
+                retcode = ydl.download([url])
+        finally:
+            guardar_extratores(ydl)
+    
+    duracao = time.time() - inicio
+    return {
+        "success": retcode == 0,
+        "startup_ms": startup_ms,
+        "duration_ms": round(duracao * 1000, 1),
+        "timings": {"download": round(duracao, 4)},
+    }
+
+def interface_grafica_disponivel():
+    """tkinter instalado e uma tela para abrir janelas"""
+    if sys.platform not in ("win32", "darwin") and not os.environ.get("DISPLAY"):
+        return False
+    try:
+        import tkinter  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        description="Universal Downloader HD: vídeos até 1080p (yt-dlp) e imagens do erome.com",
+        epilog="Sem argumentos abre a interface gráfica (se houver tela). "
+               "Modo API: universal_downloader_aac.py <url> <pasta_do_job>",
+    )
+    parser.add_argument("--lista", default="lista.txt", help="arquivo com uma URL por linha (padrão: lista.txt)")
+    parser.add_argument("--pasta", default="meus_downloads", help="pasta de destino (padrão: meus_downloads)")
+    parser.add_argument("--paralelos", type=int, default=4, help="URLs processadas ao mesmo tempo (padrão: 4)")
+    parser.add_argument("--taxa-por-host", type=float, default=TAXA_POR_HOST,
+                        help=f"URLs iniciadas por segundo em cada host (padrão: {TAXA_POR_HOST}; 0 = sem limite)")
+    parser.add_argument("--rajada", type=int, default=RAJADA_POR_HOST,
+                        help=f"inícios seguidos permitidos por host antes de limitar (padrão: {RAJADA_POR_HOST})")
+    parser.add_argument("--limites-por-host", default="",
+                        help="taxas específicas, ex.: 'erome.com=0.2,youtube.com=1'")
+    parser.add_argument("--json", action="store_true",
+                        help="progresso em JSON (uma linha por evento) no stdout; logs vão para o stderr")
+    parser.add_argument("--gui", action="store_true", help="usa a interface gráfica (tkinter)")
+    return parser
+
+def main_cli(argv):
+    """Entrada de linha de comando; sem tkinter a menos que a GUI seja pedida"""
+    args = criar_parser().parse_args(argv)
+    if args.gui or (not argv and interface_grafica_disponivel()):
+        main()
+        return 0
+    
+    saida_lock = threading.Lock()
+    def emitir_json(evento):
+        with saida_lock:
+            sys.stdout.write(json.dumps(evento, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+    
+    downloader = MultiSiteDownloader(args.pasta, silencioso=args.json)
+    limitador = LimitadorPorHost(args.taxa_por_host, max(1, args.rajada),
+                                 ler_limites_por_host(args.limites_por_host, float))
+    inicio = time.time()
+    try:
+        resultados = downloader.processar_lista(args.lista, args.paralelos, limitador,
+                                                emitir_json if args.json else None)
+    except FileNotFoundError:
+        if args.json:
+            emitir_json({"event": "error", "message": f"Arquivo não encontrado: {args.lista}"})
+        return 2
+    finally:
+        downloader.sessao.close()
+    
+    if args.json:
+        emitir_json({
+            "event": "summary",
+            "urls": len(resultados),
+            "succeeded": sum(resultados),
+            "failed": len(resultados) - sum(resultados),
+            "videos": downloader.arquivos_baixados,
+            "images": downloader.imagens_baixadas,
+            "duration_s": round(time.time() - inicio, 1),
+            "folder": str(downloader.pasta_downloads.absolute()),
+        })
+    else:
+        downloader.relatorio_final()
+    return 0 if all(resultados) else 1
+
 def main():
+    """Interface gráfica original (caixas de diálogo do tkinter)"""
+    import tkinter as tk
+    from tkinter import messagebox
+    
     # Oculta janela principal do tkinter
     root = tk.Tk()
     root.withdraw()
@@ -511,4 +1669,15 @@ def main():
         messagebox.showerror("Erro", f"❌ Erro: {str(e)}")
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) >= 3 and not sys.argv[1].startswith("-"):
+        # Modo API: universal_downloader_aac.py <url> <pasta_do_job>
+        enviado_em = os.environ.get("VIDEOBOX_DISPATCH_TS")
+        cache_config = (os.environ.get("VIDEOBOX_CACHE_DIR"), int(os.environ.get("VIDEOBOX_CACHE_BYTES", "0")))
+        segmentos = os.environ.get("VIDEOBOX_JOB_SEGMENTOS")
+        resultado = executar_job(sys.argv[1], sys.argv[2], float(enviado_em) if enviado_em else None,
+                                 cache_config, os.environ.get("VIDEOBOX_INFO_FILE"),
+                                 segmentos=int(segmentos) if segmentos else None,
+                                 indice_dedup=os.environ.get("VIDEOBOX_DEDUP_DB"))
+        print(json.dumps(resultado))
+        sys.exit(0 if resultado["success"] else 1)
+    sys.exit(main_cli(sys.argv[1:]))
@@ -0,0 +1,219 @@
+import os
+import sys
+import socket
+import itertools
+import threading
+import subprocess
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing.connection import Connection, Pipe, wait
+
+
+class ZygoteError(Exception):
+    """O filho do job morreu sem devolver resultado, ou o zygote caiu"""
+
+
+class Zygote:
+    """Processo pré-aquecido que faz fork de um filho por job (lado da API)
+
+    O zygote importa o downloader (yt_dlp, requests) uma vez; cada job roda
+    num filho criado por fork(), com memória copy-on-write e o isolamento de
+    um subprocesso. O zygote é iniciado com subprocess (interpretador novo,
+    sem as threads da API) e não cria threads, então o fork é seguro. Os
+    filhos falam com o zygote por um pipe próprio e o zygote repassa tudo à
+    API por um único socket.
+    """
+
+    def __init__(self, script_path, on_progress=None):
+        self.script_path = script_path
+        self.on_progress = on_progress
+        self.jobs = 0
+        self.crashes = 0
+        self._tokens = itertools.count(1)
+        self._pending = {}
+        self._pids = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._conn = None
+        self._process = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                return
+            api_side, zygote_side = socket.socketpair()
+            self._process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), str(zygote_side.fileno()),
+                 os.path.dirname(os.path.abspath(self.script_path))],
+                pass_fds=(zygote_side.fileno(),)
+            )
+            zygote_side.close()
+            self._conn = Connection(api_side.detach())
+            threading.Thread(target=self._read_loop, args=(self._conn,), daemon=True).start()
+
+    def start(self):
+        """Sobe o zygote antes do primeiro job (senão sobe no primeiro run)"""
+        self._ensure_started()
+        return self
+
+    def _read_loop(self, conn):
+        """Recebe progresso, resultados e saídas dos filhos"""
+        while True:
+            try:
+                # poll() antes do recv(): espera num select, cooperativo no gevent
+                conn.poll(None)
+                kind, token, payload = conn.recv()
+            except (EOFError, OSError):
+                break
+
+            if kind == "progress":
+                if self.on_progress:
+                    try:
+                        self.on_progress(*payload)
+                    except Exception as e:
+                        print(f"Erro ao aplicar progresso: {e}")
+                continue
+
+            with self._lock:
+                future = self._pending.get(token)
+                if kind == "started":
+                    self._pids[token] = payload
+                    continue
+                if kind in ("result", "error", "exited"):
+                    self._pending.pop(token, None)
+                    self._pids.pop(token, None)
+            if future is None or future.done():
+                continue
+            if kind == "result":
+                future.set_result(payload)
+            elif kind == "error":
+                future.set_exception(ZygoteError(payload))
+            else:
+                self.crashes += 1
+                future.set_exception(ZygoteError(f"Processo do job saiu sem resultado (código {payload})"))
+
+        # Zygote caiu: os jobs em andamento falham, o próximo run sobe outro
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pids.clear()
+        for future in pending.values():
+            future.set_exception(ZygoteError("Zygote encerrado"))
+
+    def run(self, job_id, func_name, args, kwargs=None, timeout=300):
+        """Roda universal_downloader_aac.<func_name>(*args, **kwargs) num filho"""
+        self._ensure_started()
+        token = next(self._tokens)
+        future = Future()
+        with self._lock:
+            self._pending[token] = future
+            conn = self._conn
+        with self._send_lock:
+            conn.send((token, job_id, func_name, args, kwargs or {}))
+        self.jobs += 1
+
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Diferente do pool, o job pode ser interrompido de verdade
+            self.kill(token)
+            raise ZygoteError(f"Job excedeu {timeout}s e foi interrompido")
+
+    def kill(self, token):
+        with self._lock:
+            pid = self._pids.get(token)
+        if pid:
+            try:
+                os.kill(pid, 9)
+            except ProcessLookupError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            alive = self._process is not None and self._process.poll() is None
+            return {
+                "pid": self._process.pid if alive else None,
+                "running": len(self._pending),
+                "jobs": self.jobs,
+                "crashes": self.crashes,
+            }
+
+
+def _run_child(writer, token, job_id, func_name, args, kwargs):
+    """Dentro do filho: executa o job e manda o resultado pelo pipe"""
+    import universal_downloader_aac
+
+    # Threads de segmentos também reportam progresso: um envio por vez
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            writer.send(message)
+
+    if job_id is not None:
+        kwargs["progresso"] = lambda fields: send(("progress", token, (job_id, fields)))
+    try:
+        func = getattr(universal_downloader_aac, func_name)
+        send(("result", token, func(*args, **kwargs)))
+        return 0
+    except BaseException as e:
+        send(("error", token, f"{type(e).__name__}: {e}"))
+        return 1
+
+
+def serve(fd, script_dir):
+    """Laço do zygote: um fork por pedido, repassando as mensagens dos filhos"""
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+    import multiprocessing
+    import universal_downloader_aac  # (yt_dlp, requests)
+    from yt_dlp.extractor import gen_extractor_classes
+    gen_extractor_classes()
+    # Vagas de conversão AAC herdadas pelos filhos do fork (limite entre jobs)
+    universal_downloader_aac.transcodificacoes_globais = multiprocessing.BoundedSemaphore(
+        universal_downloader_aac.MAX_TRANSCODIFICACOES)
+
+    api = Connection(fd)
+    children = {}
+    while True:
+        for ready in wait([api, *children]):
+            if ready is api:
+                try:
+                    request = api.recv()
+                except (EOFError, OSError):
+                    # API encerrada: os filhos em andamento terminam sozinhos
+                    return
+                token, job_id, func_name, args, kwargs = request
+                reader, writer = Pipe(duplex=False)
+                pid = os.fork()
+                if pid == 0:
+                    api.close()
+                    reader.close()
+                    for other in children:
+                        other.close()
+                    code = 1
+                    try:
+                        code = _run_child(writer, token, job_id, func_name, args, kwargs)
+                    finally:
+                        writer.close()
+                        os._exit(code)
+                writer.close()
+                children[reader] = (token, pid)
+                api.send(("started", token, pid))
+                continue
+
+            token, pid = children[ready]
+            try:
+                api.send(ready.recv())
+            except EOFError:
+                # Pipe fechado: o filho terminou (ou morreu)
+                del children[ready]
+                ready.close()
+                _, status = os.waitpid(pid, 0)
+                api.send(("exited", token, os.waitstatus_to_exitcode(status)))
+
+
+if __name__ == "__main__":
+    try:
+        serve(int(sys.argv[1]), sys.argv[2])
+    except (BrokenPipeError, ConnectionResetError):
+        # API encerrada no meio de um envio
+        pass